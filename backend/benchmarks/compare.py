@@ -0,0 +1,82 @@
+"""
+Compare two benchmark result files written by suite.py.
+
+Steps are matched on (rows, step). A step regresses when its median wall
+time or its RSS growth exceeds the baseline by more than the threshold, or
+when it runs more SQL queries. The exit status is 1 if anything regressed,
+so the script can gate a release:
+
+    cd backend
+    python benchmarks/compare.py baseline.json results.json [--threshold 0.2]
+"""
+import argparse
+import json
+import sys
+
+
+# Differences below these are noise whatever the ratio
+MIN_SECONDS = 0.005
+MIN_RSS_MB = 5.0
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    return data['meta'], {(result['rows'], result['step']): result for result in data['results']}
+
+
+def change(before, after):
+    return (after - before) / before if before else 0.0
+
+
+def compare(baseline, current, threshold):
+    """Return one row per step present in both runs and whether it regressed"""
+    rows = []
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        seconds = (before['seconds']['median'], after['seconds']['median'])
+        rss = (before['rss_growth_mb'], after['rss_growth_mb'])
+        queries = (before['queries'], after['queries'])
+        regressions = []
+        if seconds[1] - seconds[0] > MIN_SECONDS and change(*seconds) > threshold:
+            regressions.append('time')
+        if rss[1] - rss[0] > MIN_RSS_MB and change(*rss) > threshold:
+            regressions.append('memory')
+        if queries[1] > queries[0]:
+            regressions.append('queries')
+        rows.append((key, seconds, rss, queries, regressions))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative increase of time and RSS growth')
+    args = parser.parse_args()
+
+    baseline_meta, baseline = load(args.baseline)
+    current_meta, current = load(args.current)
+    print(f'baseline {baseline_meta.get("git_commit") or args.baseline}')
+    print(f'current  {current_meta.get("git_commit") or args.current}\n')
+
+    rows = compare(baseline, current, args.threshold)
+    print(f'{"rows":>10} {"step":<22} {"seconds":>19} {"change":>8} {"+MB":>15} {"queries":>11}')
+    for (size, step), seconds, rss, queries, regressions in rows:
+        print(f'{size:>10} {step:<22} {seconds[0]:>9.3f} {seconds[1]:>9.3f} '
+              f'{change(*seconds):>+8.1%} {rss[0]:>7.1f} {rss[1]:>7.1f} '
+              f'{queries[0]:>5} {queries[1]:>5}'
+              + (f'  REGRESSED ({", ".join(regressions)})' if regressions else ''))
+
+    missing = sorted(baseline.keys() - current.keys())
+    if missing:
+        print(f'\nNot in current run: {", ".join(f"{size}/{step}" for size, step in missing)}')
+
+    regressed = sum(1 for row in rows if row[4])
+    print(f'\n{regressed} of {len(rows)} steps regressed')
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Generate synthetic equipment CSV files for benchmarking.
+
+Rows are produced in chunks, so even multi-million row files are written
+with bounded memory. The same arguments and seed always give the same file.
+
+    cd backend
+    python benchmarks/generate.py out.csv --rows 1000000 --types 20 --null-rate 0.02
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+BASE_TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+
+
+def type_names(count):
+    """``count`` equipment type names, starting with the sample data's types"""
+    extra = [f'Type{i}' for i in range(len(BASE_TYPES), count)]
+    return (BASE_TYPES + extra)[:count]
+
+
+def generate_frame(start, rows, types, null_rate, rng):
+    """One chunk of synthetic rows, numbered from ``start``"""
+    names = np.array(type_names(types), dtype=object)
+    codes = rng.integers(0, types, rows)
+    # Every type gets its own operating point so per-type statistics differ
+    centers = np.random.default_rng(types).uniform([80, 3, 90], [180, 10, 150], size=(types, 3))
+    values = rng.normal(centers[codes], centers[codes] * 0.1)
+
+    frame = pd.DataFrame({
+        'Equipment Name': pd.Series(names[codes]) + '-' + pd.Series(np.arange(start, start + rows)).astype(str),
+        'Type': names[codes],
+        'Flowrate': values[:, 0].round(2),
+        'Pressure': values[:, 1].round(2),
+        'Temperature': values[:, 2].round(2),
+    })
+    if null_rate:
+        for column in ['Type', 'Flowrate', 'Pressure', 'Temperature']:
+            frame.loc[rng.random(rows) < null_rate, column] = None
+    return frame
+
+
+def generate_csv(path, rows, types=6, null_rate=0.01, seed=0, chunk_rows=500000):
+    """Write ``rows`` synthetic rows to ``path`` and return the path"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_rows) or [0]:
+        count = min(chunk_rows, rows - start)
+        frame = generate_frame(start, count, types, null_rate, rng)
+        frame.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--types', type=int, default=6, help='number of distinct equipment types')
+    parser.add_argument('--null-rate', type=float, default=0.01,
+                        help='fraction of missing Type/Flowrate/Pressure/Temperature values')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_csv(args.path, args.rows, args.types, args.null_rate, args.seed)
+
+
+if __name__ == '__main__':
+    main()
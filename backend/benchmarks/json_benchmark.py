@@ -0,0 +1,109 @@
+"""
+Compare DRF's stdlib JSON renderer/parser with equipment.fastjson.
+
+Encodes and decodes a 100k-row dataset response shaped like
+/api/dataset/<id>/ and reports the best of several runs:
+
+    cd backend
+    python benchmarks/json_benchmark.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from equipment import fastjson  # noqa: E402
+from equipment.parsers import FastJSONParser  # noqa: E402
+from equipment.renderers import FastJSONRenderer  # noqa: E402
+
+
+TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+
+
+def make_response(rows, seed=0):
+    """A dataset response body with ``rows`` rows, about 1% missing values"""
+    rng = np.random.default_rng(seed)
+    values = rng.normal([120.0, 6.0, 110.0], [30.0, 1.5, 20.0], size=(rows, 3)).round(2)
+    missing = rng.random((rows, 3)) < 0.01
+    types = rng.integers(0, len(TYPES), rows)
+    raw_data = []
+    for i in range(rows):
+        row = {'Equipment Name': f'{TYPES[types[i]]}-{i}', 'Type': TYPES[types[i]]}
+        for column, value, is_missing in zip(('Flowrate', 'Pressure', 'Temperature'),
+                                             values[i].tolist(), missing[i].tolist()):
+            row[column] = None if is_missing else value
+        raw_data.append(row)
+    return {
+        'id': 1,
+        'filename': 'benchmark.csv',
+        'uploaded_at': '2024-01-01T00:00:00Z',
+        'total_count': rows,
+        'equipment_type_distribution': {name: int((types == i).sum()) for i, name in enumerate(TYPES)},
+        'raw_data': raw_data,
+    }
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def report(name, baseline, fast):
+    print(f'{name:<28} {baseline * 1000:>10.1f} ms {fast * 1000:>10.1f} ms {baseline / fast:>8.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_response(args.rows)
+    print(f'JSON backend: {fastjson.backend()}, rows: {args.rows}')
+    print(f'{"":<28} {"DRF/stdlib":>13} {"fastjson":>13} {"speedup":>9}')
+
+    drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    body = drf_renderer.render(data)
+    assert fastjson.loads(fast_renderer.render(data)) == fastjson.loads(body)
+    report('render response',
+           best_of(lambda: drf_renderer.render(data), args.repeat),
+           best_of(lambda: fast_renderer.render(data), args.repeat))
+
+    drf_parser, fast_parser = JSONParser(), FastJSONParser()
+    report('parse request body',
+           best_of(lambda: drf_parser.parse(io.BytesIO(body)), args.repeat),
+           best_of(lambda: fast_parser.parse(io.BytesIO(body)), args.repeat))
+
+    # The stored JSON columns of EquipmentDataset (type distribution and
+    # extended statistics) are small; time many decodes of a typical one
+    statistics = fastjson.dumps({
+        'by_type': {name: {column: {'count': 1, 'mean': 1.0, 'std': 0.5, 'p50': 1.0}
+                           for column in ('Flowrate', 'Pressure', 'Temperature')}
+                    for name in TYPES}}).decode()
+    report('decode stored statistics x1000',
+           best_of(lambda: [json.loads(statistics) for _ in range(1000)], args.repeat),
+           best_of(lambda: [fastjson.loads(statistics) for _ in range(1000)], args.repeat))
+
+    if fastjson.backend() == 'json':
+        print('orjson is not in use; install it to see the speedup')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+End-to-end benchmark of the equipment API.
+
+For every dataset size a synthetic CSV is generated (see generate.py) and
+sent through Django's test client to:
+
+    upload    POST /api/upload/ (processed inline)
+    summary   GET  /api/summary/<id>/
+    dataset   GET  /api/dataset/<id>/
+    report    GET  /api/dataset/<id>/pdf/?mode=<mode>
+
+Read endpoints are measured cold (response and report caches cleared) and
+warm. Each step records wall time, the peak resident set size reached while
+it ran (and how far above its starting RSS that was), the number of SQL
+queries from every thread, response size and the Server-Timing stages. The
+run works on a throwaway database and MEDIA_ROOT and writes its results as
+JSON; compare two result files with compare.py.
+
+    cd backend
+    python benchmarks/suite.py --rows 10000 100000 1000000 --output results.json
+"""
+import argparse
+import datetime
+import logging
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart  # noqa: E402
+
+from equipment import fastjson  # noqa: E402
+from equipment.cache import invalidate_user  # noqa: E402
+from equipment.reports import REPORT_MODES, delete_reports  # noqa: E402
+
+from generate import generate_csv  # noqa: E402
+
+
+STEPS = ['upload', 'summary', 'dataset', 'report']
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class BenchmarkError(Exception):
+    """Raised when an endpoint does not answer as expected"""
+
+
+class QueryCounter:
+    """Count SQL queries on every database connection, from any thread"""
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        # Report and upload workers open their own connections later on
+        connection_created.connect(self._connection_created, weak=False)
+        for conn in connections.all():
+            conn.execute_wrappers.append(self)
+
+    def _connection_created(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # Without procfs only the lifetime peak is available (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RSSSampler:
+    """Track the peak RSS of the process while a block runs"""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def measure(counter, request):
+    """Run ``request`` and return (response, body, measurements)"""
+    queries = counter.count
+    with RSSSampler() as rss:
+        start = time.perf_counter()
+        response = request()
+        if response.streaming:
+            body = b''.join(response.streaming_content)
+        else:
+            body = response.content
+        seconds = time.perf_counter() - start
+    response.close()
+    return response, body, {
+        'seconds': seconds,
+        'peak_rss_mb': rss.peak / 2 ** 20,
+        'rss_growth_mb': (rss.peak - rss.start) / 2 ** 20,
+        'queries': counter.count - queries,
+        'status': response.status_code,
+        'response_bytes': len(body),
+        'server_timing': response.get('Server-Timing', ''),
+    }
+
+
+def check(response, body, step, expected=200):
+    if response.status_code != expected:
+        raise BenchmarkError(f'{step} returned {response.status_code}: {body[:500]!r}')
+
+
+def run_size(client, counter, rows, args):
+    """Benchmark every step for one dataset size; returns {step: [measurements]}"""
+    path = os.path.join(args.workdir, f'equipment_{rows}.csv')
+    generate_csv(path, rows, args.types, args.null_rate, args.seed)
+    csv_bytes = os.path.getsize(path)
+    runs = {}
+
+    for repeat in range(args.repeat):
+        # A fresh user per upload keeps retention from pruning earlier runs mid-step
+        user = User.objects.create_user(f'bench-{rows}-{repeat}')
+        client.force_login(user)
+
+        # Encoding the request happens before timing, so only server work is measured
+        with open(path, 'rb') as f:
+            body = encode_multipart(BOUNDARY, {'file': f})
+        response, content, result = measure(counter, lambda: client.generic(
+            'POST', '/api/upload/', body, content_type=MULTIPART_CONTENT))
+        del body
+        check(response, content, 'upload', expected=202)
+        job = fastjson.loads(content)
+        if job['status'] != 'completed':
+            raise BenchmarkError(f'upload did not complete: {job}')
+        result['csv_bytes'] = csv_bytes
+        runs.setdefault('upload', []).append(result)
+        dataset_id = job['dataset_id']
+
+        reads = [
+            ('summary', f'/api/summary/{dataset_id}/'),
+            ('dataset', f'/api/dataset/{dataset_id}/'),
+        ] + [(f'report_{mode}', f'/api/dataset/{dataset_id}/pdf/?mode={mode}')
+             for mode in args.report_modes]
+        for step, url in reads:
+            if step.split('_')[0] not in args.steps:
+                continue
+            invalidate_user(user.id)
+            delete_reports(dataset_id)
+            for phase in ('cold', 'warm'):
+                response, content, result = measure(counter, lambda: client.get(url))
+                check(response, content, step)
+                runs.setdefault(f'{step}_{phase}', []).append(result)
+
+        client.logout()
+
+    os.remove(path)
+    return runs
+
+
+def aggregate(rows, step, results):
+    """Fold the repeats of one step into a single result"""
+    seconds = [result['seconds'] for result in results]
+    last = results[-1]
+    summary = {
+        'rows': rows,
+        'step': step,
+        'repeat': len(results),
+        'seconds': {
+            'min': min(seconds),
+            'median': statistics.median(seconds),
+            'max': max(seconds),
+        },
+        'peak_rss_mb': max(result['peak_rss_mb'] for result in results),
+        'rss_growth_mb': max(result['rss_growth_mb'] for result in results),
+        'queries': max(result['queries'] for result in results),
+        'status': last['status'],
+        'response_bytes': last['response_bytes'],
+        'server_timing': last['server_timing'],
+    }
+    if 'csv_bytes' in last:
+        summary['csv_bytes'] = last['csv_bytes']
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args):
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'database': connection.vendor,
+        'json_backend': fastjson.backend(),
+        'arguments': {
+            'rows': args.rows,
+            'types': args.types,
+            'null_rate': args.null_rate,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'steps': args.steps,
+            'report_modes': args.report_modes,
+        },
+    }
+
+
+def configure(workdir):
+    """Point the database and media storage at ``workdir`` and migrate
+
+    Returns a function that drops the benchmark database again.
+    """
+    media = os.path.join(workdir, 'media')
+    settings.DEBUG = False
+    # Server-Timing stages are kept with the results instead of logged per request
+    logging.getLogger('equipment.timing').setLevel(logging.WARNING)
+    settings.MEDIA_ROOT = media
+    settings.EQUIPMENT_UPLOAD_DIR = os.path.join(media, 'uploads')
+    settings.EQUIPMENT_REPORT_DIR = os.path.join(media, 'reports')
+    settings.EQUIPMENT_ASYNC_UPLOADS = False
+    # Every repeat uploads the same CSV, which must be parsed each time
+    settings.EQUIPMENT_DEDUPLICATE_UPLOADS = False
+    # Large reports must finish inside the request instead of answering 202
+    settings.EQUIPMENT_REPORT_WAIT_SECONDS = None
+    if connection.vendor == 'sqlite':
+        connection.close()
+        connection.settings_dict['NAME'] = os.path.join(workdir, 'db.sqlite3')
+        call_command('migrate', verbosity=0)
+        return connection.close
+    # Other backends get Django's usual (migrated) test database
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    return lambda: connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def print_results(results):
+    print(f'{"rows":>10} {"step":<22} {"median s":>10} {"peak MB":>9} {"+MB":>8} {"queries":>8}')
+    for result in results:
+        print(f'{result["rows"]:>10} {result["step"]:<22} {result["seconds"]["median"]:>10.3f} '
+              f'{result["peak_rss_mb"]:>9.1f} {result["rss_growth_mb"]:>8.1f} {result["queries"]:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--types', type=int, default=6, help='number of distinct equipment types')
+    parser.add_argument('--null-rate', type=float, default=0.01,
+                        help='fraction of missing Type/Flowrate/Pressure/Temperature values')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=STEPS,
+                        help='steps to run; the upload always runs')
+    parser.add_argument('--report-modes', nargs='+', default=['summary'],
+                        choices=REPORT_MODES)
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    args.workdir = tempfile.mkdtemp(prefix='equipment-bench-')
+    teardown = connection.close
+    try:
+        teardown = configure(args.workdir)
+        counter = QueryCounter()
+        counter.install()
+        client = Client()
+
+        meta = metadata(args)
+        results = []
+        for rows in args.rows:
+            runs = run_size(client, counter, rows, args)
+            results.extend(aggregate(rows, step, step_runs) for step, step_runs in runs.items())
+    finally:
+        teardown()
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    with open(args.output, 'wb') as f:
+        f.write(fastjson.dumps({'meta': meta, 'results': results}, indent=True))
+    print_results(results)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
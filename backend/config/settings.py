@@ -5,6 +5,8 @@ Django settings for config project.
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'equipment.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -71,11 +74,100 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE selects the backend. 'sqlite' (the default) suits single-node
+# installs and is tuned with EQUIPMENT_SQLITE_PRAGMAS on every connection.
+# 'postgresql' is for production: connections stay open for DB_CONN_MAX_AGE
+# seconds and are health-checked before reuse. To pool connections across
+# processes point DB_HOST/DB_PORT at PgBouncer, and set
+# DB_DISABLE_SERVER_SIDE_CURSORS=1 if it runs in transaction pooling mode.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'equipment'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+            'OPTIONS': {
+                # Seconds a connection waits for another writer's lock
+                'timeout': 20,
+            },
+        }
     }
+else:
+    raise ImproperlyConfigured(f"DB_ENGINE must be 'sqlite' or 'postgresql', not {DB_ENGINE!r}")
+
+# `manage.py test` runs the tests again on PostgreSQL when DATABASE_URL points
+# at a reachable server, see config/test_runner.py
+TEST_RUNNER = 'config.test_runner.EquipmentTestRunner'
+
+# Applied to each new SQLite connection (see equipment/signals.py): WAL lets
+# readers run alongside a writer, busy_timeout (ms) makes writers wait for the
+# lock instead of failing with "database is locked", synchronous=NORMAL is
+# durable under WAL except against power loss, and mmap_size (bytes) reads the
+# database through a memory map
+EQUIPMENT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 20000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The 'equipment' cache holds API responses (see equipment/cache.py); LocMemCache
+# evicts least recently used entries once MAX_ENTRIES is reached. Each process
+# has its own entries, and their keys carry the user's data version from the
+# database, so none is served after another process changed the datasets.
+# Point it at a shared backend (e.g. Redis) to share entries between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'equipment': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'equipment-api',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+        },
+    },
+}
+
+
+# Structured timing lines from equipment.instrumentation go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'equipment.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -131,8 +223,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'equipment.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'equipment.parsers.FastJSONParser',
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
     ],
@@ -147,5 +243,91 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Instrumentation: per-stage Server-Timing headers on API responses, and the
+# client addresses allowed to scrape /api/metrics/ (staff users always may)
+EQUIPMENT_SERVER_TIMING = True
+EQUIPMENT_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Equipment data ingestion
+# JSON backend for API responses and stored statistics: 'orjson' (used when
+# installed) or 'json' to force the standard library
+EQUIPMENT_JSON_BACKEND = 'orjson'
+# Number of CSV rows parsed per chunk; bounds peak memory during uploads
+EQUIPMENT_UPLOAD_CHUNK_SIZE = 50000
+# Default and maximum rows per page on /api/dataset/<id>/rows/
+EQUIPMENT_ROWS_PAGE_SIZE = 100
+EQUIPMENT_ROWS_MAX_PAGE_SIZE = 1000
+# Uploads are spooled here and parsed by a background thread pool
+EQUIPMENT_UPLOAD_DIR = MEDIA_ROOT / 'uploads'
+EQUIPMENT_UPLOAD_WORKERS = 2
+# Batch uploads parse their files in this many processes (0 parses in the
+# batch's worker thread) and accept at most EQUIPMENT_BATCH_MAX_FILES CSVs
+EQUIPMENT_PARSE_PROCESSES = min(4, os.cpu_count() or 1)
+EQUIPMENT_BATCH_MAX_FILES = 100
+# Upper bound on the uncompressed size of zip archives in a batch upload
+EQUIPMENT_BATCH_MAX_UNCOMPRESSED_BYTES = 2 * 1024 * 1024 * 1024
+# Columnar dataset payloads are stored here, relative to MEDIA_ROOT
+EQUIPMENT_PAYLOAD_DIR = 'datasets'
+# Set to False to process uploads inside the request (e.g. for debugging)
+EQUIPMENT_ASYNC_UPLOADS = True
+# Every process refreshes the heartbeat of its queued and running jobs this
+# often. Jobs whose heartbeat is older than EQUIPMENT_JOB_STALE_SECONDS lost
+# their process (e.g. to a restart) and are failed when polled or by the
+# fail_stale_jobs management command
+EQUIPMENT_JOB_HEARTBEAT_SECONDS = 60
+EQUIPMENT_JOB_STALE_SECONDS = 5 * 60
+# Uploads are hashed while spooled: a file the user already uploaded returns
+# that dataset, and one another user uploaded shares its stored payload
+# instead of being parsed again. False stores every upload on its own
+EQUIPMENT_DEDUPLICATE_UPLOADS = True
+# PDF reports are cached here and built by a separate worker pool; a request
+# waits up to EQUIPMENT_REPORT_WAIT_SECONDS before answering 202 + Retry-After
+EQUIPMENT_REPORT_DIR = MEDIA_ROOT / 'reports'
+EQUIPMENT_REPORT_WORKERS = 1
+EQUIPMENT_REPORT_WAIT_SECONDS = 30
+EQUIPMENT_REPORT_RETRY_AFTER = 5
+EQUIPMENT_REPORT_HISTOGRAM_BINS = 20
+# Rows per table slice and the row cap of the 'full' report's data table
+EQUIPMENT_REPORT_TABLE_PAGE_ROWS = 500
+EQUIPMENT_REPORT_MAX_TABLE_ROWS = 50000
+# Flagged rows listed by the 'detailed' and 'full' reports
+EQUIPMENT_REPORT_MAX_ANOMALY_ROWS = 200
+# Rows encoded per slice by the streaming CSV/NDJSON export endpoints
+EQUIPMENT_EXPORT_CHUNK_ROWS = 10000
+# Default and maximum points per series on /api/dataset/<id>/chart/, and the
+# default and maximum number of histogram bins
+EQUIPMENT_CHART_POINTS = 1000
+EQUIPMENT_CHART_MAX_POINTS = 10000
+EQUIPMENT_CHART_HISTOGRAM_BINS = 20
+EQUIPMENT_CHART_MAX_HISTOGRAM_BINS = 200
+# Uploads with a timestamp_column are rolled up per equipment at these
+# resolutions (name -> seconds, finest first, each a multiple of the last);
+# default and maximum points per column on /api/dataset/<id>/timeseries/
+EQUIPMENT_TIMESERIES_ROLLUPS = {'1m': 60, '1h': 3600, '1d': 86400}
+EQUIPMENT_TIMESERIES_POINTS = 1000
+EQUIPMENT_TIMESERIES_MAX_POINTS = 10000
+# Rows further than EQUIPMENT_ANOMALY_ZSCORE standard deviations from their
+# type's mean, or outside [Q1 - k*IQR, Q3 + k*IQR] with k =
+# EQUIPMENT_ANOMALY_IQR_FACTOR, are flagged at ingest; so are rows outside
+# their type's operating envelope, given as {type: {column: (min, max)}} with
+# None for an open side, e.g. {'Pump': {'Pressure': (2.0, 8.0)}}
+EQUIPMENT_ANOMALY_ZSCORE = 3.0
+EQUIPMENT_ANOMALY_IQR_FACTOR = 1.5
+EQUIPMENT_OPERATING_ENVELOPES = {}
+# /api/compare/ accepts up to EQUIPMENT_COMPARE_MAX_DATASETS datasets and
+# returns at most `limit` equipment deltas per comparison
+EQUIPMENT_COMPARE_MAX_DATASETS = 5
+EQUIPMENT_COMPARE_PAGE_SIZE = 1000
+EQUIPMENT_COMPARE_MAX_PAGE_SIZE = 100000
+# Retention: keep the newest KEEP_PER_USER datasets of each user and drop
+# datasets older than MAX_AGE_DAYS; None disables either limit
+EQUIPMENT_RETENTION = {
+    'KEEP_PER_USER': 5,
+    'MAX_AGE_DAYS': None,
+}
+# Cache alias for API responses and the largest pickled payload it may store
+EQUIPMENT_CACHE_ALIAS = 'equipment'
+EQUIPMENT_CACHE_MAX_ITEM_BYTES = 1024 * 1024
+
 
 
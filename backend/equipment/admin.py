@@ -1,21 +1,31 @@
 from django.contrib import admin
-from .models import EquipmentDataset
+from .models import EquipmentDataset, EquipmentRecord, UploadJob, UploadBatch
 
 
 @admin.register(EquipmentDataset)
 class EquipmentDatasetAdmin(admin.ModelAdmin):
-    list_display = ['filename', 'user', 'uploaded_at', 'total_count']
+    list_display = ['filename', 'user', 'uploaded_at', 'total_count', 'is_ready']
     list_filter = ['uploaded_at', 'user']
     search_fields = ['filename']
 
 
+@admin.register(EquipmentRecord)
+class EquipmentRecordAdmin(admin.ModelAdmin):
+    list_display = ['equipment_name', 'equipment_type', 'dataset', 'row_index']
+    list_filter = ['equipment_type']
+    search_fields = ['equipment_name']
+    raw_id_fields = ['dataset']
 
 
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'user', 'status', 'phase', 'rows_processed', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['filename']
+    raw_id_fields = ['dataset', 'batch']
 
 
-
-
-
-
-
-
+@admin.register(UploadBatch)
+class UploadBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'merge', 'created_at']
+    list_filter = ['merge', 'created_at']
@@ -0,0 +1,203 @@
+"""
+Outlier and operating-envelope checks for equipment datasets.
+
+Every row with a Type is scored at ingest, column by column, against the
+other rows of its type:
+
+    zscore    further than EQUIPMENT_ANOMALY_ZSCORE standard deviations from
+              the type's mean
+    iqr       outside [Q1 - k * IQR, Q3 + k * IQR] of the type, with
+              k = EQUIPMENT_ANOMALY_IQR_FACTOR
+    envelope  outside the type's operating envelope in
+              EQUIPMENT_OPERATING_ENVELOPES, e.g. {'Pump': {'Pressure': (2, 8)}}
+
+The per-type means, deviations and quartiles are those already computed for
+the extended statistics (see statistics.py), so scoring needs no extra sort:
+it is a few vectorized comparisons per column. Flagged rows are kept in the
+payload directory next to the columns:
+
+    anomalies.rows.i8   int64 row index of every flagged row, ascending
+    anomalies.flags.u2  uint16 reasons of every flagged row, one bit per
+                        (rule, column), see ``flag_bit``
+
+Counts per rule, column and type are stored with the dataset. Envelopes are
+applied when a dataset is uploaded; changing them does not rescore datasets.
+Rows appended to a dataset are scored against its updated statistics; the
+flags of the rows already there are kept.
+"""
+import os
+
+import numpy as np
+from django.conf import settings
+
+from .storage import NUMERIC_FILES
+
+
+RULES = ('zscore', 'iqr', 'envelope')
+COLUMNS = tuple(NUMERIC_FILES)
+ROWS_FILE = 'anomalies.rows.i8'
+FLAGS_FILE = 'anomalies.flags.u2'
+
+
+def flag_bit(rule, column):
+    """Bit marking a row as flagged by ``rule`` on ``column``"""
+    return 1 << (RULES.index(rule) * len(COLUMNS) + COLUMNS.index(column))
+
+
+def flag_mask(rules=None, columns=None):
+    """Bits of every (rule, column) pair, all rules or columns when not given"""
+    mask = 0
+    for rule in rules or RULES:
+        for column in columns or COLUMNS:
+            mask |= flag_bit(rule, column)
+    return mask
+
+
+def reasons(flags):
+    """Decode one row's flags into {column: [rule, ...]}"""
+    found = {}
+    for rule in RULES:
+        for column in COLUMNS:
+            if flags & flag_bit(rule, column):
+                found.setdefault(column, []).append(rule)
+    return found
+
+
+def envelope_bounds(type_names, column):
+    """Lower and upper envelope bound of ``column`` for every type, open where unset"""
+    lower = np.full(len(type_names), -np.inf)
+    upper = np.full(len(type_names), np.inf)
+    index = {name: i for i, name in enumerate(type_names)}
+    for type_name, limits in settings.EQUIPMENT_OPERATING_ENVELOPES.items():
+        if type_name in index and column in limits:
+            low, high = limits[column]
+            lower[index[type_name]] = -np.inf if low is None else low
+            upper[index[type_name]] = np.inf if high is None else high
+    return lower, upper
+
+
+def type_statistic(statistics, type_names, column, name):
+    """One statistic of ``column`` for every type as a float array, NaN where unknown"""
+    by_type = statistics['by_type']
+    values = [by_type[type_name][column][name] for type_name in type_names]
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def score_column(values, codes, statistics, type_names, column):
+    """Boolean (rule, flags) pairs of one column; NaN is never flagged"""
+    mean, std, q1, q3 = (type_statistic(statistics, type_names, column, name)
+                         for name in ('mean', 'std', 'p25', 'p75'))
+    spread = (q3 - q1) * settings.EQUIPMENT_ANOMALY_IQR_FACTOR
+    lower, upper = envelope_bounds(type_names, column)
+
+    # Comparisons with NaN are False, so types with too few values flag nothing
+    with np.errstate(invalid='ignore'):
+        zscore = np.abs(values - mean[codes]) > settings.EQUIPMENT_ANOMALY_ZSCORE * std[codes]
+        iqr = (values < (q1 - spread)[codes]) | (values > (q3 + spread)[codes])
+        envelope = (values < lower[codes]) | (values > upper[codes])
+    return [('zscore', zscore), ('iqr', iqr), ('envelope', envelope)]
+
+
+def detect_anomalies(payload, columns, type_codes, statistics, start=0):
+    """Score rows [start:] of ``payload``, save the flagged ones and return their counts
+
+    ``columns`` and ``type_codes`` hold the rows to score. ``statistics`` are
+    the payload's extended statistics (see statistics.py), whose per-type
+    means, deviations and quartiles the rows are scored against. With
+    ``start`` the flagged rows are added to those saved for earlier rows.
+    """
+    type_names = list(payload.type_names)
+    n_types = len(type_names)
+    type_codes = np.asarray(type_codes)
+    has_type = type_codes >= 0
+    codes = type_codes[has_type].astype(np.int64)
+
+    flags = np.zeros(len(codes), dtype=np.uint16)
+    counts = {rule: {} for rule in RULES}
+    type_counts = np.zeros((n_types, len(RULES), len(COLUMNS)), dtype=np.int64)
+    for j, column in enumerate(COLUMNS):
+        values = np.asarray(columns[column], dtype=np.float64)[has_type]
+        for rule, flagged in score_column(values, codes, statistics, type_names, column):
+            flags[flagged] |= np.uint16(flag_bit(rule, column))
+            type_counts[:, RULES.index(rule), j] = np.bincount(codes[flagged], minlength=n_types)
+            counts[rule][column] = int(type_counts[:, RULES.index(rule), j].sum())
+
+    flagged = np.flatnonzero(flags)
+    rows = (start + np.flatnonzero(has_type)[flagged]).astype('<i8')
+    mode = 'ab' if start else 'wb'
+    with open(os.path.join(payload.directory, ROWS_FILE), mode) as f:
+        rows.tofile(f)
+    with open(os.path.join(payload.directory, FLAGS_FILE), mode) as f:
+        flags[flagged].astype('<u2').tofile(f)
+
+    flagged_per_type = np.bincount(codes[flagged], minlength=n_types)
+    return {
+        'zscore': settings.EQUIPMENT_ANOMALY_ZSCORE,
+        'iqr_factor': settings.EQUIPMENT_ANOMALY_IQR_FACTOR,
+        'envelopes': {name: {column: list(limits) for column, limits in envelope.items()}
+                      for name, envelope in settings.EQUIPMENT_OPERATING_ENVELOPES.items()},
+        'flagged_rows': len(rows),
+        'counts': counts,
+        'by_type': {
+            type_names[i]: {
+                'flagged_rows': int(flagged_per_type[i]),
+                'counts': {rule: {column: int(type_counts[i, r, j])
+                                  for j, column in enumerate(COLUMNS)}
+                           for r, rule in enumerate(RULES)},
+            }
+            for i in np.flatnonzero(flagged_per_type)
+        },
+    }
+
+
+def merge_anomalies(old, new):
+    """Counts of two consecutive runs of ``detect_anomalies`` taken together"""
+    def add(a, b):
+        return {rule: {column: a.get(rule, {}).get(column, 0) + b.get(rule, {}).get(column, 0)
+                       for column in COLUMNS}
+                for rule in RULES}
+
+    by_type = dict(old['by_type'])
+    for name, type_anomalies in new['by_type'].items():
+        previous = by_type.get(name, {'flagged_rows': 0, 'counts': {}})
+        by_type[name] = {
+            'flagged_rows': previous['flagged_rows'] + type_anomalies['flagged_rows'],
+            'counts': add(previous['counts'], type_anomalies['counts']),
+        }
+    # The thresholds in use when the new rows were scored
+    return {**new, 'flagged_rows': old['flagged_rows'] + new['flagged_rows'],
+            'counts': add(old['counts'], new['counts']), 'by_type': by_type}
+
+
+def truncate_anomalies(payload, flagged_rows):
+    """Drop flagged rows saved after the first ``flagged_rows``, e.g. by a failed append"""
+    os.truncate(os.path.join(payload.directory, ROWS_FILE), flagged_rows * 8)
+    os.truncate(os.path.join(payload.directory, FLAGS_FILE), flagged_rows * 2)
+
+
+def load_anomalies(payload):
+    """Memory-mapped (rows, flags) of a payload, or None if it was never scored"""
+    path = os.path.join(payload.directory, ROWS_FILE)
+    if not os.path.exists(path):
+        return None
+    if not os.path.getsize(path):
+        return np.empty(0, dtype='<i8'), np.empty(0, dtype='<u2')
+    return (np.memmap(path, dtype='<i8', mode='r'),
+            np.memmap(os.path.join(payload.directory, FLAGS_FILE), dtype='<u2', mode='r'))
+
+
+def select_anomalies(payload, rules=None, columns=None, types=None):
+    """Flagged row indices and flags matching any of the rules on any of the columns
+
+    ``types`` limits the rows to those Type names. Returns None when the
+    payload was never scored.
+    """
+    anomalies = load_anomalies(payload)
+    if anomalies is None:
+        return None
+    rows, flags = anomalies
+    keep = (flags & np.uint16(flag_mask(rules, columns))) != 0
+    if types:
+        wanted = [i for i, name in enumerate(payload.type_names) if name in set(types)]
+        keep &= np.isin(payload.type_codes[rows], wanted)
+    return np.asarray(rows[keep]), np.asarray(flags[keep])
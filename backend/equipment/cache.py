@@ -0,0 +1,105 @@
+"""
+Response caching for the read-only equipment endpoints.
+
+Entries are keyed by (user, endpoint, dataset id) and stored in the cache
+named by EQUIPMENT_CACHE_ALIAS. Each user's keys embed a generation token;
+invalidating a user replaces the token, which orphans all of their entries
+at once and leaves them to the backend's LRU eviction.
+
+The token only changes in the cache of the process that invalidated it,
+and each server process has its own LocMemCache by default. Keys therefore
+also embed the user's data version (``data_version``), read from the
+database on every lookup, so no process serves an entry written before an
+upload, append or prune, whichever process handled it. Payloads larger than
+EQUIPMENT_CACHE_MAX_ITEM_BYTES are never stored, so the cache holds at most
+MAX_ENTRIES x EQUIPMENT_CACHE_MAX_ITEM_BYTES bytes.
+
+Every entry carries an ETag and Last-Modified value so unchanged responses
+can be answered with 304 Not Modified.
+"""
+import hashlib
+import pickle
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import EquipmentDataset
+
+
+def get_cache():
+    return caches[settings.EQUIPMENT_CACHE_ALIAS]
+
+
+def _generation(user_id):
+    """Return the current cache generation token for a user"""
+    key = f'equipment:generation:{user_id}'
+    token = get_cache().get(key)
+    if token is None:
+        # A missing token (first use or evicted) starts a fresh generation,
+        # so entries written under an older token can never be served
+        token = uuid.uuid4().hex
+        get_cache().set(key, token, timeout=None)
+    return token
+
+
+def data_version(user_id):
+    """Version of a user's ready datasets, from one aggregate query
+
+    An upload changes the count and the newest id, an append the latest
+    updated_at, and a deletion the count, so every change that can alter
+    a cached response changes the version.
+    """
+    state = EquipmentDataset.objects.ready().filter(user_id=user_id).aggregate(
+        count=Count('id'), newest=Max('id'), updated=Max('updated_at'))
+    updated = state['updated'].timestamp() if state['updated'] else 0
+    return f'{state["count"]}-{state["newest"] or 0}-{updated}'
+
+
+def cache_key(user, endpoint, dataset_id=None):
+    """Build the cache key for one endpoint response of a user"""
+    return (f'equipment:{user.id}:{_generation(user.id)}:{data_version(user.id)}:'
+            f'{endpoint}:{dataset_id or "latest"}')
+
+
+def invalidate_user(user_id):
+    """Drop every cached response of a user"""
+    get_cache().set(f'equipment:generation:{user_id}', uuid.uuid4().hex, timeout=None)
+
+
+def cache_get(key):
+    return get_cache().get(key)
+
+
+def cache_set(key, data, last_modified=None):
+    """Build a cache entry for ``data`` and store it if it fits the budget"""
+    payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    entry = {
+        'data': data,
+        'etag': '"%s"' % hashlib.sha1(payload).hexdigest(),
+        'last_modified': last_modified.timestamp() if last_modified else None,
+    }
+    if len(payload) <= settings.EQUIPMENT_CACHE_MAX_ITEM_BYTES:
+        get_cache().set(key, entry)
+    return entry
+
+
+def conditional_response(request, entry):
+    """Return the cached data, or 304 if the client's copy is current"""
+    last_modified = entry['last_modified']
+    last_modified = int(last_modified) if last_modified is not None else None
+
+    not_modified = get_conditional_response(
+        request, etag=entry['etag'], last_modified=last_modified)
+    response = Response(status=not_modified.status_code) if not_modified else Response(entry['data'])
+
+    response['ETag'] = entry['etag']
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Entries are per user, so shared caches must key on the credentials
+    patch_vary_headers(response, ['Authorization'])
+    return response
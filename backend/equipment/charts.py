@@ -0,0 +1,129 @@
+"""
+Downsampled chart series and histograms.
+
+Charts do not need every row to look right: a line of a few hundred points
+drawn across a chart is indistinguishable from one with millions, as long
+as the points are picked to keep the shape. Two pickers are offered:
+
+    lttb    Largest-Triangle-Three-Buckets; one point per bucket, chosen to
+            keep the visual shape of the line
+    minmax  the lowest and highest point of every bucket, so no spike is
+            ever lost
+
+Series are indexed by row number and skip missing values. Histograms are
+binned over the finite values of a column.
+"""
+import numpy as np
+
+from .ingest import NUMERIC_COLUMNS
+from .models import RECORD_FIELDS
+
+
+CHART_METHODS = ['lttb', 'minmax']
+
+
+def column_values(dataset, column):
+    """Float array of one numeric column, NaN where missing"""
+    payload = dataset.get_payload()
+    if payload is not None:
+        return payload.column(column)
+    values = dataset.records.order_by('row_index').values_list(RECORD_FIELDS[column], flat=True)
+    return np.array([np.nan if v is None else v for v in values.iterator(chunk_size=5000)],
+                    dtype=np.float64)
+
+
+def lttb(x, y, threshold):
+    """Indices of ``threshold`` points of (x, y) picked by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept; the points in between are
+    split into ``threshold - 2`` buckets and each bucket keeps the point
+    forming the largest triangle with the point kept from the previous
+    bucket and the average of the next one.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # Average point of every bucket, and of the last point on its own as the
+    # "next bucket" of the final bucket
+    sizes = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, edges) / sizes
+    avg_y = np.add.reduceat(y, edges) / sizes
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        bx, by = x[start:stop], y[start:stop]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, buckets):
+    """Indices of the lowest and highest value of each of ``buckets`` equal buckets of ``y``"""
+    n = len(y)
+    if buckets * 2 >= n or buckets < 1:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    full = n // size
+    # Whole buckets are a reshaped view; a shorter last bucket is handled apart
+    blocks = y[:full * size].reshape(full, size)
+    offsets = np.arange(full) * size
+    lows = [offsets + blocks.argmin(axis=1)]
+    highs = [offsets + blocks.argmax(axis=1)]
+    if full * size < n:
+        tail = y[full * size:]
+        lows.append([full * size + int(tail.argmin())])
+        highs.append([full * size + int(tail.argmax())])
+    # Buckets are in row order, so sorting the pairs keeps every index in order
+    return np.unique(np.concatenate(lows + highs))
+
+
+def downsample(values, points, method='lttb'):
+    """Row indices and values of at most ``points`` points of a column"""
+    rows = np.flatnonzero(~np.isnan(values))
+    y = np.asarray(values[rows], dtype=np.float64)
+    if method == 'lttb':
+        keep = lttb(rows.astype(np.float64), y, points)
+    else:
+        keep = minmax(y, points // 2)
+    return rows[keep], y[keep]
+
+
+def histogram_counts(values, bins):
+    """Counts and bin edges of the finite values, with zero counts for an empty column"""
+    values = np.asarray(values)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return np.zeros(bins, dtype=np.int64), np.arange(bins + 1, dtype=np.float64)
+    return np.histogram(values, bins=bins)
+
+
+def chart_data(dataset, columns=None, points=1000, method='lttb', bins=20):
+    """Downsampled series and histograms of the dataset's numeric columns"""
+    series = {}
+    histograms = {}
+    for column in columns or NUMERIC_COLUMNS:
+        values = column_values(dataset, column)
+        x, y = downsample(values, points, method)
+        series[column] = {'count': int(len(values) - np.isnan(values).sum()), 'x': x, 'y': y}
+        counts, edges = histogram_counts(values, bins)
+        histograms[column] = {
+            'edges': edges,
+            'counts': counts,
+            'null_count': int(np.isnan(values).sum()),
+        }
+    return {
+        'dataset_id': dataset.id,
+        'total_count': dataset.total_count,
+        'method': method,
+        'points': points,
+        'series': series,
+        'histograms': histograms,
+    }
@@ -0,0 +1,153 @@
+"""
+Comparison of a user's datasets.
+
+Datasets are joined on Equipment Name with a hash lookup of one name index
+in the other, and every delta and drift figure is computed on whole
+columns. Equipment names that appear more than once in a dataset are
+collapsed to the mean of their readings before joining, so each name maps
+to exactly one row on each side.
+"""
+import numpy as np
+import pandas as pd
+
+from .ingest import NUMERIC_COLUMNS
+
+
+COMPARE_SORTS = ['name'] + NUMERIC_COLUMNS
+
+
+def dataset_frame(dataset):
+    """One row per equipment name with its type and mean readings"""
+    columns = ['Equipment Name', 'Type'] + NUMERIC_COLUMNS
+    payload = dataset.get_payload()
+    if payload is not None:
+        frame = payload.frame(columns=columns)
+    else:
+        frame = pd.DataFrame(dataset.get_raw_data(), columns=columns)
+        frame[NUMERIC_COLUMNS] = frame[NUMERIC_COLUMNS].astype(np.float64)
+
+    frame = frame[frame['Equipment Name'].notna()]
+    grouped = frame.groupby('Equipment Name', sort=False)
+    collapsed = grouped[NUMERIC_COLUMNS].mean()
+    collapsed.insert(0, 'Type', grouped['Type'].first())
+    return collapsed
+
+
+def _nullable(values):
+    """Object array of floats with NaN replaced by None"""
+    values = np.asarray(values, dtype=np.float64)
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result
+
+
+def drift_statistics(baseline, current):
+    """Aggregate drift of one numeric column over the matched equipment"""
+    valid = ~(np.isnan(baseline) | np.isnan(current))
+    before, after = baseline[valid], current[valid]
+    deltas = after - before
+    if not valid.any():
+        return {'matched_count': 0, 'changed_count': 0, 'baseline_mean': None, 'mean': None,
+                'mean_delta': None, 'mean_abs_delta': None, 'max_abs_delta': None,
+                'rms_delta': None}
+    abs_deltas = np.abs(deltas)
+    return {
+        'matched_count': int(valid.sum()),
+        'changed_count': int(np.count_nonzero(deltas)),
+        'baseline_mean': float(before.mean()),
+        'mean': float(after.mean()),
+        'mean_delta': float(deltas.mean()),
+        'mean_abs_delta': float(abs_deltas.mean()),
+        'max_abs_delta': float(abs_deltas.max()),
+        'rms_delta': float(np.sqrt((deltas ** 2).mean())),
+    }
+
+
+def compare_frames(baseline, current, sort='name', limit=None):
+    """Compare two frames from ``dataset_frame``
+
+    Returns added/removed equipment names, per-column drift and the
+    per-equipment deltas, the latter sorted by ``sort`` (name, or the
+    largest absolute change of a numeric column first) and cut to ``limit``.
+    """
+    # Hash join on the (unique) name indexes: position of every baseline
+    # name in the current frame, -1 where it was removed
+    positions = current.index.get_indexer(baseline.index)
+    left = np.flatnonzero(positions >= 0)
+    right = positions[left]
+    is_added = np.ones(len(current), dtype=bool)
+    is_added[right] = False
+    removed = baseline.index[positions < 0]
+    added = current.index[is_added]
+
+    before_values = {column: baseline[column].to_numpy(dtype=np.float64)[left]
+                     for column in NUMERIC_COLUMNS}
+    after_values = {column: current[column].to_numpy(dtype=np.float64)[right]
+                    for column in NUMERIC_COLUMNS}
+    deltas = {}
+    drift = {}
+    for column in NUMERIC_COLUMNS:
+        deltas[column] = after_values[column] - before_values[column]
+        drift[column] = drift_statistics(before_values[column], after_values[column])
+
+    matched_names = current.index.to_numpy(dtype=object)[right]
+    if sort == 'name':
+        order = np.argsort(matched_names.astype(str), kind='stable')
+    else:
+        # Largest absolute change first, missing deltas last
+        magnitude = np.abs(deltas[sort])
+        order = np.argsort(np.where(np.isnan(magnitude), -np.inf, -magnitude), kind='stable')
+    if limit is not None:
+        order = order[:limit]
+
+    names = matched_names[order].tolist()
+    types = current['Type'].to_numpy(dtype=object)[right][order].tolist()
+    values = []
+    for column in NUMERIC_COLUMNS:
+        before = _nullable(before_values[column][order])
+        after = _nullable(after_values[column][order])
+        delta = _nullable(deltas[column][order])
+        values.append([{'baseline': b, 'value': a, 'delta': d}
+                       for b, a, d in zip(before.tolist(), after.tolist(), delta.tolist())])
+
+    equipment = [
+        {'Equipment Name': name, 'Type': eq_type, **dict(zip(NUMERIC_COLUMNS, readings))}
+        for name, eq_type, *readings in zip(names, types, *values)
+    ]
+
+    added_names = sorted(added.tolist())
+    removed_names = sorted(removed.tolist())
+    return {
+        'matched_count': len(left),
+        'added_count': len(added_names),
+        'removed_count': len(removed_names),
+        'added': added_names[:limit],
+        'removed': removed_names[:limit],
+        'drift': drift,
+        'equipment': equipment,
+    }
+
+
+def compare_datasets(datasets, sort='name', limit=None):
+    """Compare every dataset in ``datasets`` against the first one"""
+    baseline, *others = datasets
+    baseline_frame = dataset_frame(baseline)
+
+    comparisons = []
+    for dataset in others:
+        comparison = compare_frames(baseline_frame, dataset_frame(dataset), sort=sort, limit=limit)
+        comparisons.append(dict(dataset_id=dataset.id, **comparison))
+
+    return {
+        'baseline_id': baseline.id,
+        'datasets': [
+            {
+                'id': dataset.id,
+                'filename': dataset.filename,
+                'uploaded_at': dataset.uploaded_at,
+                'total_count': dataset.total_count,
+            }
+            for dataset in datasets
+        ],
+        'comparisons': comparisons,
+    }
@@ -0,0 +1,89 @@
+"""
+Streaming CSV and NDJSON export of datasets.
+
+Rows are read from the dataset payload one slice of EQUIPMENT_EXPORT_CHUNK_ROWS
+at a time and encoded slice by slice, so memory use does not depend on the
+size of the dataset and clients receive the first rows immediately. With gzip
+enabled the encoded slices are fed through a single streaming compressor.
+"""
+import zlib
+
+import pandas as pd
+from django.conf import settings
+
+from . import fastjson
+from .ingest import REQUIRED_COLUMNS
+from .models import RECORD_FIELDS
+from .pagination import InvalidQueryError
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def parse_columns(value):
+    """Return the export columns for a comma-separated ``columns`` parameter"""
+    if not value:
+        return list(REQUIRED_COLUMNS)
+    columns = [column.strip() for column in value.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in REQUIRED_COLUMNS]
+    if unknown or not columns:
+        raise InvalidQueryError(
+            f'Invalid columns {", ".join(unknown)}. Choose from: {", ".join(REQUIRED_COLUMNS)}')
+    # Keep the requested order but drop repeats
+    return list(dict.fromkeys(columns))
+
+
+def iter_frames(dataset, columns, chunk_size=None):
+    """Yield the dataset's rows as DataFrame slices of ``columns``"""
+    chunk_size = chunk_size or settings.EQUIPMENT_EXPORT_CHUNK_ROWS
+    payload = dataset.get_payload()
+    if payload is not None:
+        yield from payload.iter_frames(chunk_size, columns=columns)
+        return
+
+    # Datasets without a payload are read from their records instead
+    fields = [RECORD_FIELDS[column] for column in columns]
+    rows = dataset.records.order_by('row_index').values_list(*fields)
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch, columns=columns)
+
+
+def iter_csv(frames, columns):
+    """Encode DataFrame slices as CSV, header first"""
+    yield (','.join(columns) + '\n').encode('utf-8')
+    for frame in frames:
+        yield frame.to_csv(index=False, header=False, lineterminator='\n').encode('utf-8')
+
+
+def iter_ndjson(frames, columns):
+    """Encode DataFrame slices as one JSON object per line, NaN as null"""
+    for frame in frames:
+        values = [frame[column].tolist() for column in columns]
+        yield b''.join(fastjson.dumps(dict(zip(columns, row))) + b'\n'
+                       for row in zip(*values))
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset, export_format, columns, gzip=False):
+    """Byte chunks of a dataset export in ``export_format``"""
+    encode = iter_csv if export_format == 'csv' else iter_ndjson
+    stream = encode(iter_frames(dataset, columns), columns)
+    return gzip_stream(stream) if gzip else stream
@@ -0,0 +1,117 @@
+"""
+Fast JSON encoding and decoding.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise; both backends produce the same documents:
+
+    - NumPy scalars and arrays are encoded as plain numbers and lists
+    - NaN and infinite floats are encoded as null
+    - datetimes use ISO 8601 with 'Z' for UTC, as DRF's encoder does
+    - Decimal, UUID, lazy strings, sets and querysets follow DRF's encoder
+
+Set EQUIPMENT_JSON_BACKEND to 'json' to force the standard library.
+"""
+import datetime
+import decimal
+import json
+import math
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z if orjson is not None else 0
+
+
+def backend():
+    """Name of the JSON backend in use, 'orjson' or 'json'"""
+    if orjson is None or getattr(settings, 'EQUIPMENT_JSON_BACKEND', 'orjson') == 'json':
+        return 'json'
+    return 'orjson'
+
+
+def _default(obj):
+    """Encode the types neither backend handles natively"""
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__iter__'):
+        return tuple(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class _StdlibEncoder(json.JSONEncoder):
+    """Standard library fallback matching the orjson output"""
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            value = obj.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        if isinstance(obj, (datetime.date, datetime.time)):
+            return obj.isoformat()
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        return _sanitize(_default(obj))
+
+    def iterencode(self, obj, _one_shot=False):
+        return super().iterencode(_sanitize(obj), _one_shot)
+
+
+def _sanitize(obj):
+    """Replace non-finite floats with None and NumPy scalars with Python ones"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _sanitize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sanitize(value) for value in obj]
+    if isinstance(obj, np.generic):
+        return _sanitize(obj.item())
+    if isinstance(obj, np.ndarray):
+        return _sanitize(obj.tolist())
+    return obj
+
+
+def dumps(obj, indent=False):
+    """Encode ``obj`` as UTF-8 JSON bytes"""
+    if backend() == 'orjson':
+        options = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+        try:
+            return orjson.dumps(obj, default=_default, option=options)
+        except orjson.JSONEncodeError:
+            # Non-string dict keys are rare and make orjson slower, so only
+            # retry with them enabled when the fast path rejects the data
+            return orjson.dumps(obj, default=_default, option=options | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, cls=_StdlibEncoder, ensure_ascii=False, allow_nan=False,
+                      indent=2 if indent else None,
+                      separators=None if indent else (',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Decode JSON from bytes or str"""
+    if backend() == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,307 @@
+"""
+Streaming CSV ingestion for equipment datasets.
+
+Uploads are read in bounded chunks so that peak memory depends on the chunk
+size rather than on the size of the file.
+
+Ingestion runs in two steps. ``parse_csv`` turns a CSV file into a columnar
+payload and summarizes it; it does not touch the database, so batch uploads
+run it in worker processes. ``create_dataset`` then stores the parsed payload
+as a dataset. The payload is the only copy of the rows; the database holds
+the dataset's summary, and EquipmentRecord rows are only read for datasets
+stored before payloads existed.
+
+Uploads carry the SHA-256 of their content (see jobs.spool_upload). An
+upload whose content is already stored as another dataset, of any user, is
+not parsed again: the new dataset shares that dataset's payload and summary
+(see sharing.py).
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import fastjson
+from .anomalies import detect_anomalies, load_anomalies, merge_anomalies, truncate_anomalies
+from .instrumentation import timed
+from .models import EquipmentDataset
+from .sharing import acquire_payload, publish_payload, release_payload, take_payload
+from .statistics import compute_statistics, update_statistics
+from .storage import (PayloadWriter, ColumnarPayload, content_payload_name, copy_payload,
+                      delete_payload, new_payload_name)
+from .timeseries import build_timeseries, parse_timestamps
+
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+
+class MissingColumnsError(ValueError):
+    """Raised when an upload does not contain all required columns"""
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f'Missing required columns: {", ".join(missing)}')
+
+    def __reduce__(self):
+        # Rebuild from the column list when sent back from a worker process
+        return (MissingColumnsError, (self.missing,))
+
+
+def iter_chunks(file, chunksize=None, timestamp_column=None):
+    """Yield validated DataFrame chunks of an uploaded CSV file
+
+    With ``timestamp_column`` that column is required too and is parsed
+    into a UTC 'Timestamp' column.
+    """
+    required = REQUIRED_COLUMNS + ([timestamp_column] if timestamp_column else [])
+    chunksize = chunksize or settings.EQUIPMENT_UPLOAD_CHUNK_SIZE
+    reader = pd.read_csv(file, chunksize=chunksize)
+    with reader:
+        first = True
+        while True:
+            with timed('csv_read') as stage:
+                chunk = next(reader, None)
+                if chunk is None:
+                    break
+                if first:
+                    missing = [col for col in required if col not in chunk.columns]
+                    if missing:
+                        raise MissingColumnsError(missing)
+                    first = False
+                for col in NUMERIC_COLUMNS:
+                    chunk[col] = pd.to_numeric(chunk[col])
+                if timestamp_column:
+                    chunk['Timestamp'] = parse_timestamps(chunk[timestamp_column])
+                stage.rows = len(chunk)
+            yield chunk
+
+
+def type_distribution(counts, type_names):
+    """Rows per type, most common first; ties keep the order the types first appeared"""
+    return {type_names[i]: int(counts[i]) for i in np.argsort(-counts, kind='stable') if counts[i]}
+
+
+def summarize_payload(payload):
+    """Summary fields, extended statistics and anomalies of a payload, from its memory maps
+
+    Flagged rows are written into the payload directory, see anomalies.py.
+    """
+    columns = {col: payload.column(col) for col in NUMERIC_COLUMNS}
+    codes = np.asarray(payload.type_codes)
+
+    with timed('statistics', rows=payload.rows):
+        means = {}
+        for col, values in columns.items():
+            valid = values[~np.isnan(values)]
+            means[col] = float(valid.mean()) if len(valid) else None
+
+        counts = np.bincount(codes[codes >= 0], minlength=len(payload.type_names))
+        distribution = type_distribution(counts, payload.type_names)
+        statistics = compute_statistics(columns, codes, payload.type_names)
+
+    with timed('anomalies', rows=payload.rows):
+        anomalies = detect_anomalies(payload, columns, codes, statistics)
+
+    return {
+        'payload': payload.name,
+        'total_count': payload.rows,
+        'avg_flowrate': means['Flowrate'],
+        'avg_pressure': means['Pressure'],
+        'avg_temperature': means['Temperature'],
+        'equipment_type_distribution': distribution,
+        'extended_statistics': statistics,
+        'anomalies': anomalies,
+        'is_timeseries': payload.has_timestamps,
+    }
+
+
+def parse_csv(file, progress=None, timestamp_column=None):
+    """Parse a CSV into a new payload and return its summary
+
+    Only the payload files are written, never the database, so this can run
+    in a separate process. ``progress`` is called with the number of rows
+    parsed so far. With ``timestamp_column`` the readings are stored as a
+    time series, see timeseries.py.
+    """
+    writer = PayloadWriter(new_payload_name(), timestamps=bool(timestamp_column))
+    try:
+        for chunk in iter_chunks(file, timestamp_column=timestamp_column):
+            with timed('payload_write', rows=len(chunk)):
+                writer.append(chunk)
+            if progress:
+                progress(writer.rows, 'parsing')
+        writer.close()
+        payload = ColumnarPayload(writer.name)
+        if timestamp_column:
+            if progress:
+                progress(writer.rows, 'rollups')
+            with timed('timeseries', rows=writer.rows):
+                payload = build_timeseries(payload)
+        return summarize_payload(payload)
+    except Exception:
+        writer.abort()
+        raise
+
+
+def merge_payloads(names):
+    """Concatenate payloads into a new one and return its summary"""
+    writer = PayloadWriter(new_payload_name())
+    try:
+        for name in names:
+            for frame in ColumnarPayload(name).iter_frames():
+                writer.append(frame)
+        writer.close()
+        return summarize_payload(ColumnarPayload(writer.name))
+    except Exception:
+        writer.abort()
+        raise
+
+
+def stored_summary(content_hash):
+    """Summary of a stored dataset with this content, in the form ``parse_csv`` returns
+
+    The caller holds a reference to the summary's shared payload, which it
+    hands to ``create_dataset``. Returns None if no ready dataset shares a
+    payload with the content, or that payload is being deleted.
+    """
+    dataset = EquipmentDataset.objects.ready().filter(
+        content_hash=content_hash, payload=content_payload_name(content_hash)).first()
+    if dataset is None or not acquire_payload(dataset.payload):
+        return None
+    return {
+        'payload': dataset.payload,
+        'total_count': dataset.total_count,
+        'avg_flowrate': dataset.avg_flowrate,
+        'avg_pressure': dataset.avg_pressure,
+        'avg_temperature': dataset.avg_temperature,
+        'equipment_type_distribution': dataset.get_equipment_type_distribution(),
+        'extended_statistics': dataset.get_extended_statistics(),
+        'anomalies': dataset.get_anomalies(),
+        'is_timeseries': dataset.is_timeseries,
+    }
+
+
+def create_dataset(user, filename, parsed, content_hash=''):
+    """Store a payload summarized by ``parse_csv`` as a dataset
+
+    The dataset takes over the caller's reference to a shared payload (see
+    ``stored_summary``). With ``content_hash`` a newly parsed payload is
+    shared under it first, see sharing.py.
+    """
+    try:
+        if content_hash and parsed['payload'] != content_payload_name(content_hash):
+            parsed['payload'] = publish_payload(parsed['payload'], content_hash)
+        with timed('db_save'):
+            return EquipmentDataset.objects.create(
+                user=user,
+                filename=filename,
+                total_count=parsed['total_count'],
+                avg_flowrate=parsed['avg_flowrate'],
+                avg_pressure=parsed['avg_pressure'],
+                avg_temperature=parsed['avg_temperature'],
+                equipment_type_distribution=fastjson.dumps(
+                    parsed['equipment_type_distribution']).decode(),
+                extended_statistics=fastjson.dumps(parsed['extended_statistics']).decode(),
+                anomalies=fastjson.dumps(parsed['anomalies']).decode(),
+                is_timeseries=parsed.get('is_timeseries', False),
+                payload=parsed['payload'],
+                content_hash=content_hash,
+            )
+    except Exception:
+        release_payload(parsed['payload'])
+        raise
+
+
+def append_csv(dataset, file, progress=None):
+    """Append the rows of a CSV file to a dataset and update its summary incrementally
+
+    The new rows are added to the dataset's payload. Counts,
+    averages, the type distribution, extended statistics and anomaly counts
+    are merged with those of the new rows instead of being recomputed.
+    Percentiles are kept exact, so they are recomputed from the whole
+    memory-mapped columns (see statistics.py). ``progress`` is called with
+    the number of rows appended so far.
+
+    A payload stored under a content hash may be shared, and the dataset
+    loses its hash. If it holds the payload's only reference it takes the
+    payload over; otherwise the rows are appended to a private copy.
+    """
+    if dataset.is_timeseries or not dataset.payload:
+        raise ValueError('Rows can only be appended to non-time-series datasets with a payload')
+
+    shared, content_hash = None, dataset.content_hash
+    if content_hash:
+        private = take_payload(dataset.payload)
+        if private is None:
+            shared = dataset.payload
+            with timed('payload_copy', rows=dataset.total_count):
+                private = copy_payload(shared)
+        dataset.payload, dataset.content_hash = private, ''
+        if shared is None:
+            # The shared payload was renamed, so the dataset must follow it at once
+            dataset.save(update_fields=['payload', 'content_hash'])
+
+    writer = PayloadWriter(dataset.payload, append=True)
+    start = writer.rows
+    anomalies = dataset.get_anomalies()
+    scored = load_anomalies(dataset.get_payload()) is not None
+    try:
+        for chunk in iter_chunks(file):
+            with timed('payload_write', rows=len(chunk)):
+                writer.append(chunk)
+            if progress:
+                progress(writer.rows - start, 'appending')
+        writer.close()
+
+        payload = ColumnarPayload(dataset.payload)
+        columns = {col: payload.column(col) for col in NUMERIC_COLUMNS}
+        new_columns = {col: values[start:] for col, values in columns.items()}
+        new_codes = np.asarray(payload.type_codes[start:])
+        with timed('statistics', rows=payload.rows - start):
+            statistics = update_statistics(dataset.get_extended_statistics(), columns,
+                                           payload.type_codes, payload.type_names, start)
+            counts = np.bincount(new_codes[new_codes >= 0], minlength=len(payload.type_names))
+            for type_name, count in dataset.get_equipment_type_distribution().items():
+                counts[payload.type_names.index(type_name)] += count
+        if scored:
+            with timed('anomalies', rows=payload.rows - start):
+                added = detect_anomalies(payload, new_columns, new_codes, statistics, start=start)
+
+        with timed('db_save'):
+            dataset.total_count = payload.rows
+            dataset.avg_flowrate = statistics['columns']['Flowrate']['mean']
+            dataset.avg_pressure = statistics['columns']['Pressure']['mean']
+            dataset.avg_temperature = statistics['columns']['Temperature']['mean']
+            dataset.equipment_type_distribution = fastjson.dumps(
+                type_distribution(counts, payload.type_names)).decode()
+            dataset.extended_statistics = fastjson.dumps(statistics).decode()
+            if scored:
+                dataset.anomalies = fastjson.dumps(merge_anomalies(anomalies, added)).decode()
+            # Only the summary; the append claim belongs to the caller
+            dataset.save(update_fields=[
+                'total_count', 'avg_flowrate', 'avg_pressure', 'avg_temperature',
+                'equipment_type_distribution', 'extended_statistics', 'anomalies',
+                'payload', 'content_hash', 'updated_at'])
+    except Exception:
+        writer.abort()
+        if shared:
+            delete_payload(dataset.payload)
+            dataset.payload, dataset.content_hash = shared, content_hash
+        elif scored:
+            truncate_anomalies(dataset.get_payload(), anomalies['flagged_rows'])
+        raise
+
+    if shared:
+        release_payload(shared)
+    return dataset
+
+
+def ingest_csv(file, user, filename, progress=None, timestamp_column=None, content_hash=''):
+    """Parse an uploaded CSV chunk by chunk and store it as a dataset
+
+    With ``content_hash`` a stored payload of the same content is reused
+    instead of parsing the file.
+    """
+    parsed = stored_summary(content_hash) if content_hash else None
+    if parsed is None:
+        parsed = parse_csv(file, progress, timestamp_column)
+    return create_dataset(user, filename, parsed, content_hash=content_hash)
@@ -0,0 +1,243 @@
+"""
+Lightweight timing instrumentation and metrics.
+
+Code wraps its expensive stages in ``timed``:
+
+    with timed('payload_write', rows=len(chunk)) as stage:
+        ...
+        stage.bytes = ...
+
+Each stage is recorded in two places:
+
+    - into the active ``Timings`` of the request or background job, which
+      ServerTimingMiddleware turns into a Server-Timing header and every
+      collector writes as one structured log line when it finishes
+    - into the process-wide metrics registry, exposed in the Prometheus
+      text format on /api/metrics/
+
+Metrics are kept in memory per process; with several server processes
+each one reports its own counters.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import logging
+import threading
+import time
+
+from . import fastjson
+
+
+logger = logging.getLogger('equipment.timing')
+
+_current = contextvars.ContextVar('equipment_timings', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative histogram with labels and fixed upper bounds"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((f'{self.name}_bucket', key + (('le', le),), cumulative))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, cumulative))
+        return samples
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Registry:
+    """The set of metrics exposed by this process"""
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in metric.samples():
+                labels = []
+                for i, item in enumerate(key):
+                    label, label_value = item if isinstance(item, tuple) else (metric.labelnames[i], item)
+                    labels.append(f'{label}="{_escape(label_value)}"')
+                label_text = '{%s}' % ','.join(labels) if labels else ''
+                lines.append(f'{name}{label_text} {value!r}' if isinstance(value, float)
+                             else f'{name}{label_text} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'equipment_http_requests_total', 'HTTP requests handled, by route and status',
+    ['method', 'route', 'status']))
+REQUEST_DURATION = registry.register(Histogram(
+    'equipment_http_request_duration_seconds', 'Time spent handling HTTP requests',
+    ['method', 'route']))
+STAGE_DURATION = registry.register(Histogram(
+    'equipment_stage_duration_seconds', 'Time spent in instrumented stages', ['stage']))
+STAGE_ROWS = registry.register(Counter(
+    'equipment_stage_rows_total', 'Rows processed by instrumented stages', ['stage']))
+STAGE_BYTES = registry.register(Counter(
+    'equipment_stage_bytes_total', 'Bytes processed by instrumented stages', ['stage']))
+
+
+class Stage:
+    """One timed stage; ``rows`` and ``bytes`` may be set while it runs"""
+    def __init__(self, name, rows=None, bytes=None):
+        self.name = name
+        self.rows = rows
+        self.bytes = bytes
+        self.duration = 0.0
+
+
+class Timings:
+    """Per-request (or per-job) stage timings, aggregated by stage name"""
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage):
+        entry = self.stages.setdefault(stage.name, {'duration': 0.0, 'count': 0})
+        entry['duration'] += stage.duration
+        entry['count'] += 1
+        for field in ('rows', 'bytes'):
+            value = getattr(stage, field)
+            if value is not None:
+                entry[field] = entry.get(field, 0) + value
+
+    def merge(self, other):
+        """Fold the stages of a nested Timings into this one"""
+        for name, entry in other.stages.items():
+            mine = self.stages.setdefault(name, {'duration': 0.0, 'count': 0})
+            for field, value in entry.items():
+                mine[field] = mine.get(field, 0) + value
+
+    def server_timing(self, total=None):
+        """Format the stages as a Server-Timing header value"""
+        metrics = []
+        for name, entry in self.stages.items():
+            details = ' '.join(f'{field}={entry[field]}' for field in ('rows', 'bytes', 'count')
+                               if field in entry and (field != 'count' or entry[field] > 1))
+            metric = f'{name};dur={entry["duration"] * 1000:.1f}'
+            metrics.append(f'{metric};desc="{details}"' if details else metric)
+        if total is not None:
+            metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        result = {}
+        for name, entry in self.stages.items():
+            result[name] = {field: value for field, value in entry.items() if field != 'duration'}
+            result[name]['duration_ms'] = round(entry['duration'] * 1000, 3)
+        return result
+
+
+@contextmanager
+def timed(name, rows=None, bytes=None):
+    """Time a block as stage ``name``, recording it in the active Timings and metrics"""
+    stage = Stage(name, rows=rows, bytes=bytes)
+    start = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        stage.duration = time.perf_counter() - start
+        timings = _current.get()
+        if timings is not None:
+            timings.add(stage)
+        STAGE_DURATION.observe(stage.duration, stage=name)
+        if stage.rows is not None:
+            STAGE_ROWS.inc(stage.rows, stage=name)
+        if stage.bytes is not None:
+            STAGE_BYTES.inc(stage.bytes, stage=name)
+
+
+def start_timings():
+    """Make a fresh Timings active for the current thread or task; returns a reset token"""
+    timings = Timings()
+    return timings, _current.set(timings)
+
+
+def stop_timings(token):
+    _current.reset(token)
+
+
+def log_timings(event, timings, **fields):
+    """Write the stages of a request or job as one structured log line"""
+    if logger.isEnabledFor(logging.INFO):
+        fields.update(event=event, stages=timings.as_dict())
+        logger.info(fastjson.dumps(fields).decode())
+
+
+@contextmanager
+def collect_timings(event, **fields):
+    """Collect the stages run inside the block and log them when it ends
+
+    When another collector is active (a job run inline by a request), the
+    stages are passed on to it as well.
+    """
+    parent = _current.get()
+    timings, token = start_timings()
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        stop_timings(token)
+        if parent is not None:
+            parent.merge(timings)
+        log_timings(event, timings, duration_ms=round((time.perf_counter() - start) * 1000, 3),
+                    **fields)
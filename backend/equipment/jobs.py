@@ -0,0 +1,549 @@
+"""
+Background processing of uploaded CSV files.
+
+Uploads are spooled to disk by the request and then parsed and stored by a
+small in-process thread pool, so no external broker is needed. Progress is
+written to the UploadJob row, which clients poll through /api/jobs/<id>/.
+
+Batch uploads parse their files in parallel in a process pool, since CSV
+parsing is CPU bound and threads would serialize on the GIL. Parsing only
+writes payload files; the datasets are stored by the batch's thread.
+
+Appends add the rows of an upload to an existing dataset. They run in the
+same pool, one at a time per dataset: an append first claims the dataset
+in the database, so appends handled by different server processes wait
+for each other too.
+
+Jobs live in memory only, so a restart loses the ones queued or running.
+Each process therefore keeps a heartbeat on the jobs it owns, from the
+moment they are queued until they finish: a thread refreshes their
+heartbeat_at every EQUIPMENT_JOB_HEARTBEAT_SECONDS, however long they wait
+in the queue, parse in another process or sit in one phase. A queued or
+processing job whose heartbeat is older than EQUIPMENT_JOB_STALE_SECONDS
+has lost its process; ``fail_stale_jobs`` marks it failed and deletes its
+spooled file. Polling a job checks it, and the fail_stale_jobs management
+command checks them all.
+
+Uploads are hashed while they are spooled. A user uploading a file they
+already uploaded gets their existing dataset back at once, and a file some
+other user already uploaded is stored from that upload's payload without
+being parsed (see ingest.py).
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .instrumentation import collect_timings
+from .ingest import (ingest_csv, parse_csv, merge_payloads, create_dataset, append_csv,
+                     stored_summary)
+from .models import EquipmentDataset, UploadJob, UploadBatch
+from .retention import prune_datasets
+from .storage import delete_payload
+from .worker import init_parse_worker
+
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_executor_lock = threading.Lock()
+_process_pool = None
+
+# Ids of the queued or running jobs of this process, kept alive by the heartbeat
+_owned_jobs = set()
+_owned_lock = threading.Lock()
+_heartbeat = None
+
+# Settings a parsing process needs to write payloads where this process
+# reads them
+PARSE_WORKER_SETTINGS = ['MEDIA_ROOT', 'EQUIPMENT_PAYLOAD_DIR', 'EQUIPMENT_UPLOAD_CHUNK_SIZE']
+
+# Seconds between attempts to claim a dataset another append is writing to
+APPEND_CLAIM_POLL_SECONDS = 0.5
+
+# Bytes read at a time when spooling a file that is not an UploadedFile
+SPOOL_READ_SIZE = 1024 * 1024
+
+
+class BatchUploadError(ValueError):
+    """Raised when a batch upload is empty or exceeds the batch limits"""
+
+
+def get_executor(name='upload', max_workers=None):
+    """Return the named worker pool, creating it on first use"""
+    with _executor_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers or settings.EQUIPMENT_UPLOAD_WORKERS,
+                thread_name_prefix=f'equipment-{name}'
+            )
+        return _executors[name]
+
+
+def get_process_pool(reset=False):
+    """Return the parsing process pool, or None if EQUIPMENT_PARSE_PROCESSES is 0"""
+    global _process_pool
+    with _executor_lock:
+        if reset and _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+        if _process_pool is None and settings.EQUIPMENT_PARSE_PROCESSES:
+            # 'spawn' avoids forking a process that is running other threads
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.EQUIPMENT_PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_parse_worker,
+                initargs=({name: getattr(settings, name) for name in PARSE_WORKER_SETTINGS},)
+            )
+        return _process_pool
+
+
+def submit_parse(path, content_hash=''):
+    """Parse a spooled file in the process pool and return a Future of its summary
+
+    With ``content_hash`` a stored payload of the same content is reused
+    instead of parsing the file.
+    """
+    shared = stored_summary(content_hash) if content_hash else None
+    if shared is not None:
+        future = Future()
+        future.set_result(shared)
+        return future
+
+    pool = get_process_pool()
+    if pool is not None:
+        try:
+            return pool.submit(parse_csv, path)
+        except BrokenProcessPool:
+            # A parsing process died; start a fresh pool for later files
+            return get_process_pool(reset=True).submit(parse_csv, path)
+
+    future = Future()
+    try:
+        future.set_result(parse_csv(path))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def own_jobs(job_ids):
+    """Keep the heartbeat of jobs this process has queued until they are disowned"""
+    global _heartbeat
+    with _owned_lock:
+        _owned_jobs.update(job_ids)
+        if _heartbeat is None or not _heartbeat.is_alive():
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name='equipment-heartbeat',
+                                          daemon=True)
+            _heartbeat.start()
+
+
+def disown_jobs(job_ids):
+    """Stop the heartbeat of jobs that finished"""
+    with _owned_lock:
+        _owned_jobs.difference_update(job_ids)
+
+
+def beat_jobs():
+    """Refresh the heartbeat of the unfinished jobs this process owns
+
+    Returns the number of jobs refreshed.
+    """
+    with _owned_lock:
+        job_ids = list(_owned_jobs)
+    if not job_ids:
+        return 0
+    return UploadJob.objects.filter(
+        id__in=job_ids, status__in=[UploadJob.STATUS_QUEUED, UploadJob.STATUS_PROCESSING],
+    ).update(heartbeat_at=timezone.now())
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(settings.EQUIPMENT_JOB_HEARTBEAT_SECONDS)
+        try:
+            run_in_worker(beat_jobs)
+        except Exception:
+            logger.exception('Refreshing the job heartbeat failed')
+
+
+def run_in_worker(func, *args):
+    """Call ``func``, then close the thread's database connection if it is expired
+
+    Worker threads are not covered by Django's request cycle cleanup, so
+    this does the same: with CONN_MAX_AGE a connection is reused by the
+    worker's next job until it expires or fails its health check.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def spool_path(job_id):
+    """Where the upload of a job is spooled"""
+    return os.path.join(settings.EQUIPMENT_UPLOAD_DIR, f'{job_id}.csv')
+
+
+def spool_upload(job, file, timestamp_column=None):
+    """Write an uploaded file to the upload directory and return its path
+
+    The file is hashed as it is written. With EQUIPMENT_DEDUPLICATE_UPLOADS
+    the hash is saved as the job's content_hash; it also covers the
+    ``timestamp_column``, which changes how the file is stored.
+    """
+    os.makedirs(settings.EQUIPMENT_UPLOAD_DIR, exist_ok=True)
+    path = spool_path(job.id)
+    digest = hashlib.sha256()
+    chunks = file.chunks() if hasattr(file, 'chunks') else iter(
+        partial(file.read, SPOOL_READ_SIZE), b'')
+    with open(path, 'wb') as destination:
+        for chunk in chunks:
+            digest.update(chunk)
+            destination.write(chunk)
+    if settings.EQUIPMENT_DEDUPLICATE_UPLOADS:
+        content_hash = digest.hexdigest()
+        if timestamp_column:
+            content_hash = hashlib.sha256(
+                f'{content_hash}\ntimestamp_column={timestamp_column}'.encode()).hexdigest()
+        update_job(job, content_hash=content_hash)
+    return path
+
+
+def complete_duplicate(job, path):
+    """Complete a job with the user's dataset of the same content, if there is one
+
+    Returns the dataset, whose spooled file is then removed, or None if the
+    upload has to be processed.
+    """
+    if not job.content_hash:
+        return None
+    dataset = EquipmentDataset.objects.ready().filter(
+        user=job.user, content_hash=job.content_hash).first()
+    if dataset is None:
+        return None
+    os.remove(path)
+    update_job(job, status=UploadJob.STATUS_COMPLETED, phase='duplicate',
+               rows_processed=dataset.total_count, dataset=dataset)
+    return dataset
+
+
+def _is_csv_member(info):
+    name = info.filename.replace('\\', '/')
+    return (not info.is_dir() and name.lower().endswith('.csv')
+            and not name.startswith('__MACOSX/') and not os.path.basename(name).startswith('.'))
+
+
+def batch_members(files):
+    """Return (filename, open) pairs for the CSV files of a batch upload
+
+    Zip archives are expanded into their CSV members. Raises
+    BatchUploadError if there are no files, too many files, or archives
+    that would expand beyond EQUIPMENT_BATCH_MAX_UNCOMPRESSED_BYTES.
+    """
+    members = []
+    uncompressed = 0
+    for file in files:
+        if zipfile.is_zipfile(file):
+            file.seek(0)
+            try:
+                archive = zipfile.ZipFile(file)
+            except zipfile.BadZipFile as e:
+                raise BatchUploadError(f'{file.name}: {e}')
+            for info in filter(_is_csv_member, archive.infolist()):
+                uncompressed += info.file_size
+                members.append((os.path.basename(info.filename), partial(archive.open, info)))
+        else:
+            file.seek(0)
+            members.append((file.name, lambda file=file: file))
+
+    if not members:
+        raise BatchUploadError('No CSV files provided')
+    if len(members) > settings.EQUIPMENT_BATCH_MAX_FILES:
+        raise BatchUploadError(
+            f'Too many files: {len(members)} (at most {settings.EQUIPMENT_BATCH_MAX_FILES})')
+    if uncompressed > settings.EQUIPMENT_BATCH_MAX_UNCOMPRESSED_BYTES:
+        raise BatchUploadError('Archive contents are too large')
+    return members
+
+
+def update_job(job, **fields):
+    """Persist a subset of job fields without touching the others"""
+    for name, value in fields.items():
+        setattr(job, name, value)
+    # Saving progress shows the job is alive as well
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=list(fields) + ['updated_at', 'heartbeat_at'])
+
+
+def stale_cutoff():
+    """Heartbeats older than this belong to jobs whose process is gone"""
+    return timezone.now() - timedelta(seconds=settings.EQUIPMENT_JOB_STALE_SECONDS)
+
+
+def fail_stale_jobs(jobs=None):
+    """Fail queued or processing jobs whose process stopped their heartbeat
+
+    ``jobs`` limits the check to a queryset. Returns the number of jobs
+    failed.
+    """
+    jobs = UploadJob.objects.all() if jobs is None else jobs
+    stale = jobs.filter(status__in=[UploadJob.STATUS_QUEUED, UploadJob.STATUS_PROCESSING],
+                        heartbeat_at__lt=stale_cutoff())
+    job_ids = list(stale.values_list('id', flat=True))
+    if not job_ids:
+        return 0
+    # Filtered again so that a job whose heartbeat came meanwhile is left alone
+    failed = stale.filter(id__in=job_ids).update(
+        status=UploadJob.STATUS_FAILED, phase='failed', updated_at=timezone.now(),
+        error='The upload was interrupted (e.g. by a server restart); please upload it again')
+    for job_id in job_ids:
+        if os.path.exists(spool_path(job_id)):
+            os.remove(spool_path(job_id))
+    return failed
+
+
+def process_upload(job_id, path, timestamp_column=None):
+    """Parse and store a spooled upload, recording progress on the job"""
+    try:
+        job = UploadJob.objects.select_related('user').get(pk=job_id)
+        with collect_timings('upload_job', job_id=str(job_id), filename=job.filename):
+            _process_upload(job, path, timestamp_column)
+    finally:
+        disown_jobs([job_id])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _process_upload(job, path, timestamp_column=None):
+    try:
+        update_job(job, status=UploadJob.STATUS_PROCESSING, phase='parsing')
+
+        def progress(rows, phase):
+            update_job(job, rows_processed=rows, phase=phase)
+
+        dataset = ingest_csv(path, user=job.user, filename=job.filename, progress=progress,
+                             timestamp_column=timestamp_column, content_hash=job.content_hash)
+
+        update_job(job, phase='pruning')
+        prune_datasets(user=job.user)
+        invalidate_user(job.user_id)
+
+        update_job(job, status=UploadJob.STATUS_COMPLETED, phase='done',
+                   rows_processed=dataset.total_count, dataset=dataset)
+    except Exception as e:
+        logger.exception('Upload job %s failed', job.id)
+        update_job(job, status=UploadJob.STATUS_FAILED, phase='failed', error=str(e))
+
+
+def submit_jobs(job_ids, func, *args):
+    """Run ``func`` in the worker pool, owning its jobs while they are queued"""
+    own_jobs(job_ids)
+    try:
+        get_executor().submit(run_in_worker, func, *args)
+    except Exception:
+        disown_jobs(job_ids)
+        raise
+
+
+def enqueue_upload(job, path, timestamp_column=None):
+    """Process an upload in the worker pool, or inline if async is disabled"""
+    if not settings.EQUIPMENT_ASYNC_UPLOADS:
+        process_upload(job.id, path, timestamp_column)
+        return
+    transaction.on_commit(partial(submit_jobs, [job.id], process_upload,
+                                  job.id, path, timestamp_column))
+
+
+def claim_dataset(job, dataset_id):
+    """Wait until ``job`` holds the claim to append rows to a dataset
+
+    The claim is the dataset's append_job, set by a conditional UPDATE of
+    that one row, so exactly one job holds it at a time in any process.
+    A claim left by a job that finished or lost its heartbeat (see
+    ``fail_stale_jobs``) is taken over.
+    """
+    while True:
+        if EquipmentDataset.objects.filter(id=dataset_id, append_job=None).update(append_job=job):
+            return
+        holder = EquipmentDataset.objects.filter(id=dataset_id).values_list(
+            'append_job_id', flat=True).first()
+        if holder is None:
+            # The dataset is gone, or its claim was just released
+            EquipmentDataset.objects.get(id=dataset_id)
+            continue
+        abandoned = UploadJob.objects.filter(id=holder).filter(
+            Q(status__in=[UploadJob.STATUS_COMPLETED, UploadJob.STATUS_FAILED])
+            | Q(heartbeat_at__lt=stale_cutoff())).exists()
+        # Only replaces the claim if it is still the abandoned one
+        if abandoned and EquipmentDataset.objects.filter(
+                id=dataset_id, append_job=holder).update(append_job=job):
+            return
+        time.sleep(APPEND_CLAIM_POLL_SECONDS)
+
+
+def release_dataset(job, dataset_id):
+    """Give up the append claim of ``job`` on a dataset, if it still holds it"""
+    EquipmentDataset.objects.filter(id=dataset_id, append_job=job).update(append_job=None)
+
+
+def process_append(job_id, path, dataset_id):
+    """Append a spooled upload to a dataset, recording progress on the job"""
+    try:
+        job = UploadJob.objects.select_related('user').get(pk=job_id)
+        with collect_timings('append_job', job_id=str(job_id), dataset_id=dataset_id,
+                             filename=job.filename):
+            _process_append(job, path, dataset_id)
+    finally:
+        disown_jobs([job_id])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _process_append(job, path, dataset_id):
+    # Reports import this module to build in its worker pool
+    from .reports import delete_reports
+
+    try:
+        update_job(job, status=UploadJob.STATUS_PROCESSING, phase='waiting')
+
+        def progress(rows, phase):
+            update_job(job, rows_processed=rows, phase=phase)
+
+        claim_dataset(job, dataset_id)
+        try:
+            # Read once claimed, so the summary and payload include any earlier append
+            dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=job.user)
+            before = dataset.total_count
+            update_job(job, phase='appending')
+            dataset = append_csv(dataset, path, progress=progress)
+        finally:
+            release_dataset(job, dataset_id)
+
+        delete_reports(dataset.id)
+        invalidate_user(job.user_id)
+        update_job(job, status=UploadJob.STATUS_COMPLETED, phase='done',
+                   rows_processed=dataset.total_count - before, dataset=dataset)
+    except Exception as e:
+        logger.exception('Append job %s failed', job.id)
+        update_job(job, status=UploadJob.STATUS_FAILED, phase='failed', error=str(e))
+
+
+def enqueue_append(job, path, dataset_id):
+    """Append an upload to a dataset in the worker pool, or inline if async is disabled"""
+    if not settings.EQUIPMENT_ASYNC_UPLOADS:
+        process_append(job.id, path, dataset_id)
+        return
+    transaction.on_commit(partial(submit_jobs, [job.id], process_append,
+                                  job.id, path, dataset_id))
+
+
+def _store_parsed(job, parsed):
+    """Create the dataset of one parsed batch file and complete its job"""
+    dataset = create_dataset(job.user, job.filename, parsed, content_hash=job.content_hash)
+    update_job(job, status=UploadJob.STATUS_COMPLETED, phase='done',
+               rows_processed=dataset.total_count, dataset=dataset)
+
+
+def _merge_parsed(batch, jobs, parsed):
+    """Merge the parsed files of a batch, in upload order, into one dataset"""
+    names = [parsed[job.id]['payload'] for job in jobs]
+    try:
+        for job in jobs:
+            update_job(job, phase='merging')
+        merged = merge_payloads(names)
+        filename = jobs[0].filename if len(jobs) == 1 else \
+            f'{jobs[0].filename} + {len(jobs) - 1} more'
+        dataset = create_dataset(batch.user, filename[:255], merged)
+    finally:
+        for name in names:
+            delete_payload(name)
+
+    for job in jobs:
+        update_job(job, status=UploadJob.STATUS_COMPLETED, phase='done', dataset=dataset)
+
+
+def process_batch(batch_id, uploads):
+    """Parse the spooled files of a batch in parallel and store the results
+
+    ``uploads`` is a list of (job id, spooled path) in upload order. Each
+    file becomes its own dataset, or with ``batch.merge`` all files are
+    merged into one dataset; a merge only happens if every file parsed.
+    """
+    try:
+        batch = UploadBatch.objects.select_related('user').get(pk=batch_id)
+        jobs = {job.id: job for job in batch.jobs.select_related('user')}
+        ordered = [jobs[job_id] for job_id, _ in uploads]
+        with collect_timings('upload_batch', batch_id=str(batch_id), files=len(uploads)):
+            _process_batch(batch, ordered, uploads)
+    finally:
+        disown_jobs([job_id for job_id, _ in uploads])
+        for _, path in uploads:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _process_batch(batch, ordered, uploads):
+    jobs = {job.id: job for job in ordered}
+    parsed = {}
+    futures = {}
+    for job_id, path in uploads:
+        job = jobs[job_id]
+        update_job(job, status=UploadJob.STATUS_PROCESSING, phase='parsing')
+        # Merged files are parsed into temporary payloads, never shared ones
+        futures[submit_parse(path, '' if batch.merge else job.content_hash)] = job
+
+    for future in as_completed(futures):
+        job = futures[future]
+        try:
+            parsed[job.id] = future.result()
+            if batch.merge:
+                update_job(job, phase='parsed', rows_processed=parsed[job.id]['total_count'])
+            else:
+                _store_parsed(job, parsed[job.id])
+        except Exception as e:
+            logger.exception('Upload job %s failed', job.id)
+            update_job(job, status=UploadJob.STATUS_FAILED, phase='failed', error=str(e))
+
+    if batch.merge:
+        failed = [job.filename for job in ordered if job.status == UploadJob.STATUS_FAILED]
+        if failed:
+            for job in ordered:
+                if job.status != UploadJob.STATUS_FAILED:
+                    update_job(job, status=UploadJob.STATUS_FAILED, phase='failed',
+                               error=f'Not merged because these files failed: {", ".join(failed)}')
+            for result in parsed.values():
+                delete_payload(result['payload'])
+        else:
+            try:
+                _merge_parsed(batch, ordered, parsed)
+            except Exception as e:
+                logger.exception('Merging batch %s failed', batch.id)
+                for job in ordered:
+                    update_job(job, status=UploadJob.STATUS_FAILED, phase='failed', error=str(e))
+
+    if any(job.status == UploadJob.STATUS_COMPLETED for job in ordered):
+        prune_datasets(user=batch.user)
+        invalidate_user(batch.user_id)
+
+
+def enqueue_batch(batch, uploads):
+    """Process a batch in the worker pool, or inline if async is disabled"""
+    if not settings.EQUIPMENT_ASYNC_UPLOADS:
+        process_batch(batch.id, uploads)
+        return
+    transaction.on_commit(partial(submit_jobs, [job_id for job_id, _ in uploads], process_batch,
+                                  batch.id, uploads))
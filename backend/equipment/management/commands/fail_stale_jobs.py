@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from equipment.jobs import fail_stale_jobs
+
+
+class Command(BaseCommand):
+    help = ('Fail upload jobs whose process stopped their heartbeat (e.g. by a restart) '
+            'and delete their spooled files')
+
+    def handle(self, *args, **options):
+        count = fail_stale_jobs()
+        self.stdout.write(self.style.SUCCESS(f'Failed {count} stale job(s)'))
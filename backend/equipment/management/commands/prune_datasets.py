@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from equipment.retention import prune_datasets, retention_policy
+
+
+class Command(BaseCommand):
+    help = 'Delete datasets outside the retention policy for all users (or one user)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int,
+                            help='Datasets to keep per user (default: EQUIPMENT_RETENTION)')
+        parser.add_argument('--max-age-days', type=int,
+                            help='Delete datasets older than this (default: EQUIPMENT_RETENTION)')
+        parser.add_argument('--user', help='Only prune datasets of this username')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many datasets would be deleted without deleting')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+
+        keep, max_age_days = retention_policy()
+        if options['keep'] is not None:
+            keep = options['keep']
+        if options['max_age_days'] is not None:
+            max_age_days = options['max_age_days']
+
+        count = prune_datasets(user=user, keep=keep, max_age_days=max_age_days,
+                               dry_run=options['dry_run'])
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} dataset(s)'))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+
+from .instrumentation import (REQUESTS, REQUEST_DURATION, start_timings, stop_timings,
+                              log_timings)
+
+
+class ServerTimingMiddleware:
+    """Time every request, add a Server-Timing header and record request metrics
+
+    Stages timed with equipment.instrumentation.timed while the request is
+    handled (including response rendering) are listed individually.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = start_timings()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_timings(token)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        # The URL pattern rather than the path keeps label cardinality bounded
+        route = match.route if match else 'unmatched'
+        REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        REQUEST_DURATION.observe(total, method=request.method, route=route)
+
+        if settings.EQUIPMENT_SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing(total)
+        size = None if response.streaming else len(response.content)
+        log_timings('request', timings, method=request.method, path=request.path, route=route,
+                    status=response.status_code, bytes=size,
+                    duration_ms=round(total * 1000, 3))
+        return response
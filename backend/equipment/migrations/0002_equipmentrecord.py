@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+import math
+
+
+BATCH_SIZE = 5000
+
+
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _text(value):
+    value = _clean(value)
+    return None if value is None else str(value)
+
+
+def backfill_records(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+    
+    for dataset in EquipmentDataset.objects.only('id', 'raw_data').iterator():
+        rows = json.loads(dataset.raw_data or '[]')
+        batch = []
+        for row_index, row in enumerate(rows):
+            batch.append(EquipmentRecord(
+                dataset_id=dataset.id,
+                row_index=row_index,
+                equipment_name=_text(row.get('Equipment Name')),
+                equipment_type=_text(row.get('Type')),
+                flowrate=_clean(row.get('Flowrate')),
+                pressure=_clean(row.get('Pressure')),
+                temperature=_clean(row.get('Temperature')),
+            ))
+            if len(batch) >= BATCH_SIZE:
+                EquipmentRecord.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            EquipmentRecord.objects.bulk_create(batch)
+
+
+def restore_raw_data(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+    
+    for dataset in EquipmentDataset.objects.only('id').iterator():
+        records = EquipmentRecord.objects.filter(dataset_id=dataset.id).order_by('row_index')
+        rows = [{
+            'Equipment Name': record.equipment_name,
+            'Type': record.equipment_type,
+            'Flowrate': record.flowrate,
+            'Pressure': record.pressure,
+            'Temperature': record.temperature,
+        } for record in records.iterator()]
+        EquipmentDataset.objects.filter(id=dataset.id).update(raw_data=json.dumps(rows))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_index', models.IntegerField()),
+                ('equipment_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('equipment_type', models.CharField(blank=True, max_length=255, null=True)),
+                ('flowrate', models.FloatField(blank=True, null=True)),
+                ('pressure', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='equipment.equipmentdataset')),
+            ],
+            options={
+                'ordering': ['row_index'],
+                'indexes': [models.Index(fields=['dataset', 'equipment_type'], name='equipment_record_type_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='equipmentrecord',
+            constraint=models.UniqueConstraint(fields=('dataset', 'row_index'), name='equipment_record_row_unique'),
+        ),
+        migrations.RunPython(backfill_records, restore_raw_data),
+    ]
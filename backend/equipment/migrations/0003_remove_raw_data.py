@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0002_equipmentrecord'),
+    ]
+
+    operations = [
+        # A default lets the column be re-added when migrating backwards
+        migrations.AlterField(
+            model_name='equipmentdataset',
+            name='raw_data',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.RemoveField(
+            model_name='equipmentdataset',
+            name='raw_data',
+        ),
+    ]
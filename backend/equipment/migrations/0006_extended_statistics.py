@@ -0,0 +1,118 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:41
+
+from django.db import migrations, models
+import json
+
+import numpy as np
+
+
+# Frozen copy of equipment.statistics as it was when this migration was
+# written, so later changes to that module cannot change what it does
+PERCENTILES = (50, 95, 99)
+
+
+def _to_list(values):
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def grouped_statistics(values, codes, n_groups):
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    valid = ~np.isnan(values)
+
+    counts = np.bincount(codes[valid], minlength=n_groups)
+    nulls = np.bincount(codes[~valid], minlength=n_groups)
+
+    v = values[valid]
+    c = codes[valid]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.bincount(c, weights=v, minlength=n_groups) / counts
+        sq_dev = np.bincount(c, weights=(v - means[c]) ** 2, minlength=n_groups)
+        stds = np.sqrt(sq_dev / (counts - 1))
+    stds[counts < 2] = np.nan
+
+    order = np.lexsort((v, c))
+    sorted_values = v[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+
+    mins = np.full(n_groups, np.nan)
+    maxs = np.full(n_groups, np.nan)
+    mins[present] = sorted_values[starts[present]]
+    maxs[present] = sorted_values[starts[present] + counts[present] - 1]
+
+    columns = {
+        'count': counts.tolist(),
+        'null_count': nulls.tolist(),
+        'mean': _to_list(means),
+        'std': _to_list(stds),
+        'min': _to_list(mins),
+        'max': _to_list(maxs),
+    }
+    for q in PERCENTILES:
+        result = np.full(n_groups, np.nan)
+        position = (counts[present] - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low_values = sorted_values[starts[present] + lower]
+        high_values = sorted_values[starts[present] + upper]
+        result[present] = low_values + (high_values - low_values) * (position - lower)
+        columns[f'p{q}'] = _to_list(result)
+
+    return [{name: column[i] for name, column in columns.items()} for i in range(n_groups)]
+
+
+def compute_statistics(columns, type_codes, type_names):
+    type_codes = np.asarray(type_codes, dtype=np.int64)
+    has_type = type_codes >= 0
+
+    overall = {}
+    by_type = {name: {} for name in type_names}
+    for column, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        overall[column] = grouped_statistics(values, np.zeros(len(values), dtype=np.int64), 1)[0]
+        groups = grouped_statistics(values[has_type], type_codes[has_type], len(type_names))
+        for name, stats in zip(type_names, groups):
+            by_type[name][column] = stats
+
+    return {
+        'percentiles': list(PERCENTILES),
+        'columns': overall,
+        'by_type': by_type,
+    }
+
+
+def backfill_statistics(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+    
+    for dataset in EquipmentDataset.objects.only('id').iterator():
+        rows = list(EquipmentRecord.objects.filter(dataset_id=dataset.id)
+                    .order_by('row_index')
+                    .values_list('equipment_type', 'flowrate', 'pressure', 'temperature'))
+        type_names = sorted({row[0] for row in rows if row[0] is not None})
+        type_index = {name: i for i, name in enumerate(type_names)}
+        codes = np.array([type_index.get(row[0], -1) for row in rows], dtype=np.int64)
+        columns = {
+            column: np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64)
+            for i, column in enumerate(['Flowrate', 'Pressure', 'Temperature'], start=1)
+        }
+        statistics = compute_statistics(columns, codes, type_names)
+        EquipmentDataset.objects.filter(id=dataset.id).update(
+            extended_statistics=json.dumps(statistics))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0005_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='extended_statistics',
+            field=models.TextField(default='{}'),
+        ),
+        migrations.RunPython(backfill_statistics, migrations.RunPython.noop),
+    ]
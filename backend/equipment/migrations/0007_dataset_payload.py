@@ -0,0 +1,123 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+
+BATCH_SIZE = 50000
+
+# Frozen copy of the payload layout of equipment/storage.py (format version
+# 1) as it was when this migration was written, so later changes to that
+# module cannot change what it writes
+NUMERIC_FILES = ['flowrate.f8', 'pressure.f8', 'temperature.f8']
+TYPE_CODES_FILE = 'type_codes.i4'
+NAME_OFFSETS_FILE = 'names.offsets.i8'
+NAME_DATA_FILE = 'names.utf8'
+NAME_NULLS_FILE = 'names.null.u1'
+
+
+def payload_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+class PayloadWriter:
+    """Write batches of (name, type, flowrate, pressure, temperature) rows"""
+    def __init__(self):
+        self.name = os.path.join(settings.EQUIPMENT_PAYLOAD_DIR, uuid.uuid4().hex)
+        self.directory = payload_path(self.name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.rows = 0
+        self.type_names = []
+        self._type_index = {}
+        self._name_offset = 0
+        self._files = {
+            filename: open(os.path.join(self.directory, filename), 'wb')
+            for filename in NUMERIC_FILES + [TYPE_CODES_FILE, NAME_OFFSETS_FILE,
+                                             NAME_DATA_FILE, NAME_NULLS_FILE]
+        }
+        np.zeros(1, dtype='<i8').tofile(self._files[NAME_OFFSETS_FILE])
+
+    def append(self, rows):
+        for i, filename in enumerate(NUMERIC_FILES, start=2):
+            values = np.array([np.nan if row[i] is None else row[i] for row in rows], dtype='<f8')
+            values.tofile(self._files[filename])
+
+        codes = []
+        for row in rows:
+            type_name = None if row[1] is None else str(row[1])
+            if type_name is not None and type_name not in self._type_index:
+                self._type_index[type_name] = len(self.type_names)
+                self.type_names.append(type_name)
+            codes.append(-1 if type_name is None else self._type_index[type_name])
+        np.array(codes, dtype='<i4').tofile(self._files[TYPE_CODES_FILE])
+
+        encoded = [b'' if row[0] is None else str(row[0]).encode('utf-8') for row in rows]
+        offsets = self._name_offset + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        offsets.astype('<i8').tofile(self._files[NAME_OFFSETS_FILE])
+        self._files[NAME_DATA_FILE].write(b''.join(encoded))
+        np.array([row[0] is None for row in rows], dtype=np.uint8).tofile(self._files[NAME_NULLS_FILE])
+        if len(offsets):
+            self._name_offset = int(offsets[-1])
+        self.rows += len(rows)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        meta = {
+            'version': 1,
+            'rows': self.rows,
+            'columns': {column: 'float64' for column in ['Flowrate', 'Pressure', 'Temperature']},
+            'types': self.type_names,
+        }
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+
+def write_payloads(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+    
+    for dataset in EquipmentDataset.objects.filter(payload='').only('id').iterator():
+        rows = (EquipmentRecord.objects.filter(dataset_id=dataset.id)
+                .order_by('row_index')
+                .values_list('equipment_name', 'equipment_type',
+                             'flowrate', 'pressure', 'temperature'))
+        writer = PayloadWriter()
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                writer.append(batch)
+                batch = []
+        writer.append(batch)
+        writer.close()
+        EquipmentDataset.objects.filter(id=dataset.id).update(payload=writer.name)
+
+
+def remove_payloads(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    for name in EquipmentDataset.objects.exclude(payload='').values_list('payload', flat=True):
+        shutil.rmtree(payload_path(name), ignore_errors=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_extended_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='payload',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(write_payloads, remove_payloads),
+    ]
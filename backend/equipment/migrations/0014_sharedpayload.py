@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import os
+
+
+def count_references(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    SharedPayload = apps.get_model('equipment', 'SharedPayload')
+    # Payloads stored under a content hash are the shared ones
+    shared = (EquipmentDataset.objects.exclude(payload='').values('payload')
+              .annotate(refs=Count('id')).order_by())
+    SharedPayload.objects.bulk_create([
+        SharedPayload(name=row['payload'], refs=row['refs']) for row in shared
+        if os.path.basename(row['payload']).startswith('sha256-')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0013_dataset_append_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedPayload',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refs', models.IntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
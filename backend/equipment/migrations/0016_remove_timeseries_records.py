@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:40
+
+from django.conf import settings
+from django.db import migrations
+
+import json
+import os
+
+import numpy as np
+
+
+BATCH_SIZE = 50000
+
+# Frozen copy of the payload layout of equipment/storage.py (format version
+# 1) as it was when this migration was written, so later changes to that
+# module cannot change what it reads
+NUMERIC_FILES = ['flowrate.f8', 'pressure.f8', 'temperature.f8']
+TYPE_CODES_FILE = 'type_codes.i4'
+NAME_OFFSETS_FILE = 'names.offsets.i8'
+NAME_DATA_FILE = 'names.utf8'
+NAME_NULLS_FILE = 'names.null.u1'
+
+
+def read_payload(name):
+    """Yield batches of (name, type, flowrate, pressure, temperature) rows of a payload"""
+    directory = os.path.join(settings.MEDIA_ROOT, name)
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    rows, types = meta['rows'], meta['types'] + [None]
+
+    def read(filename, dtype, count):
+        return np.fromfile(os.path.join(directory, filename), dtype=dtype, count=count)
+
+    columns = [read(filename, '<f8', rows) for filename in NUMERIC_FILES]
+    codes = read(TYPE_CODES_FILE, '<i4', rows)
+    offsets = read(NAME_OFFSETS_FILE, '<i8', rows + 1)
+    nulls = read(NAME_NULLS_FILE, '<u1', rows)
+    with open(os.path.join(directory, NAME_DATA_FILE), 'rb') as f:
+        data = f.read()
+    for start in range(0, rows, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, rows)
+        yield [(None if nulls[i] else data[offsets[i]:offsets[i + 1]].decode('utf-8'),
+                types[codes[i]],
+                *(None if np.isnan(column[i]) else float(column[i]) for column in columns))
+               for i in range(start, stop)]
+
+
+def remove_records(apps, schema_editor):
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+    EquipmentRecord.objects.filter(dataset__is_timeseries=True).exclude(dataset__payload='').delete()
+
+
+def restore_records(apps, schema_editor):
+    EquipmentDataset = apps.get_model('equipment', 'EquipmentDataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+
+    datasets = EquipmentDataset.objects.filter(is_timeseries=True).exclude(payload='')
+    for dataset in datasets.only('id', 'payload').iterator():
+        row_index = 0
+        for batch in read_payload(dataset.payload):
+            EquipmentRecord.objects.bulk_create([
+                EquipmentRecord(dataset_id=dataset.id, row_index=row_index + offset,
+                                equipment_name=name, equipment_type=equipment_type,
+                                flowrate=flowrate, pressure=pressure, temperature=temperature)
+                for offset, (name, equipment_type, flowrate, pressure, temperature)
+                in enumerate(batch)
+            ], batch_size=5000)
+            row_index += len(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0015_uploadjob_heartbeat_at'),
+    ]
+
+    operations = [
+        # Time-series readings are kept in their payload only
+        migrations.RunPython(remove_records, restore_records),
+    ]
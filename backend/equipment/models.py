@@ -1,6 +1,26 @@
 from django.db import models
 from django.contrib.auth.models import User
-import json
+from django.utils import timezone
+import uuid
+
+from . import fastjson
+from .storage import ColumnarPayload
+
+
+# CSV column name -> EquipmentRecord field name
+RECORD_FIELDS = {
+    'Equipment Name': 'equipment_name',
+    'Type': 'equipment_type',
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+}
+
+
+class EquipmentDatasetQuerySet(models.QuerySet):
+    def ready(self):
+        """Datasets whose rows have been fully ingested"""
+        return self.filter(is_ready=True)
 
 
 class EquipmentDataset(models.Model):
@@ -8,35 +28,162 @@ class EquipmentDataset(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     filename = models.CharField(max_length=255)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Moves on when rows are appended
     total_count = models.IntegerField()
     avg_flowrate = models.FloatField(null=True, blank=True)
     avg_pressure = models.FloatField(null=True, blank=True)
     avg_temperature = models.FloatField(null=True, blank=True)
     equipment_type_distribution = models.TextField()  # JSON string
-    raw_data = models.TextField()  # JSON string of all equipment data
+    extended_statistics = models.TextField(default='{}')  # JSON string, see statistics.py
+    anomalies = models.TextField(default='{}')  # JSON string of flagged row counts, see anomalies.py
+    payload = models.CharField(max_length=255, blank=True)  # Columnar files under MEDIA_ROOT, see storage.py
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # Of the uploaded file; cleared by appends
+    is_ready = models.BooleanField(default=True)  # False while an older upload inserted its records
+    is_timeseries = models.BooleanField(default=False)  # Readings sorted by (equipment, time), see timeseries.py
+    append_job = models.ForeignKey('UploadJob', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+')  # Job appending rows right now, see jobs.claim_dataset
+    
+    objects = EquipmentDatasetQuerySet.as_manager()
     
     class Meta:
         ordering = ['-uploaded_at']
     
     def get_equipment_type_distribution(self):
         """Parse and return equipment type distribution as dict"""
-        return json.loads(self.equipment_type_distribution)
+        return fastjson.loads(self.equipment_type_distribution)
+    
+    def get_extended_statistics(self):
+        """Parse and return per-column and per-type statistics as dict"""
+        return fastjson.loads(self.extended_statistics)
+    
+    def get_anomalies(self):
+        """Parse and return the counts of rows flagged at ingest as dict"""
+        return fastjson.loads(self.anomalies)
+    
+    def get_payload(self):
+        """Return the memory-mapped columnar payload, or None if there is none"""
+        return ColumnarPayload(self.payload) if self.payload else None
     
     def get_raw_data(self):
-        """Parse and return raw data as list of dicts"""
-        return json.loads(self.raw_data)
+        """Return all rows as a list of dicts keyed by CSV column"""
+        payload = self.get_payload()
+        if payload is not None:
+            return payload.to_records()
+        columns = list(RECORD_FIELDS)
+        rows = self.records.order_by('row_index').values_list(*RECORD_FIELDS.values())
+        return [dict(zip(columns, row)) for row in rows.iterator(chunk_size=5000)]
     
     def __str__(self):
         return f"{self.filename} - {self.uploaded_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class SharedPayload(models.Model):
+    """Model to count the datasets sharing a content-addressed payload, see sharing.py"""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.IntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.name} ({self.refs} datasets)"
 
 
+class EquipmentRecord(models.Model):
+    """Model to store a single row of a dataset without a columnar payload"""
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.CASCADE,
+                                related_name='records')
+    row_index = models.IntegerField()
+    equipment_name = models.CharField(max_length=255, null=True, blank=True)
+    equipment_type = models.CharField(max_length=255, null=True, blank=True)
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['row_index']
+        indexes = [
+            models.Index(fields=['dataset', 'equipment_type'],
+                         name='equipment_record_type_idx'),
+            # Keyset pagination sorts on (value, row_index) within a dataset
+            models.Index(fields=['dataset', 'flowrate', 'row_index'],
+                         name='equipment_record_flow_idx'),
+            models.Index(fields=['dataset', 'pressure', 'row_index'],
+                         name='equipment_record_press_idx'),
+            models.Index(fields=['dataset', 'temperature', 'row_index'],
+                         name='equipment_record_temp_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'row_index'],
+                                    name='equipment_record_row_unique'),
+        ]
+    
+    def to_row(self):
+        """Return the record as a dict keyed by CSV column"""
+        return {column: getattr(self, field) for column, field in RECORD_FIELDS.items()}
+    
+    def __str__(self):
+        return f"{self.equipment_name} ({self.equipment_type})"
 
 
+class UploadBatch(models.Model):
+    """Model to group the upload jobs of a multi-file upload"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    merge = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    @property
+    def status(self):
+        """Overall status derived from the batch's jobs"""
+        statuses = {job.status for job in self.jobs.all()}
+        if not statuses <= {UploadJob.STATUS_COMPLETED, UploadJob.STATUS_FAILED}:
+            return UploadJob.STATUS_PROCESSING
+        if statuses == {UploadJob.STATUS_COMPLETED}:
+            return UploadJob.STATUS_COMPLETED
+        if statuses == {UploadJob.STATUS_FAILED}:
+            return UploadJob.STATUS_FAILED
+        return 'partial'
+    
+    def __str__(self):
+        return f"Batch {self.id} ({self.user})"
 
 
-
-
-
-
+class UploadJob(models.Model):
+    """Model to track background processing of an uploaded CSV file"""
+    STATUS_QUEUED = 'queued'
+    STATUS_PROCESSING = 'processing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    phase = models.CharField(max_length=50, default='queued')
+    rows_processed = models.BigIntegerField(default=0)
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.SET_NULL,
+                                null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA-256 of the spooled file
+    batch = models.ForeignKey(UploadBatch, on_delete=models.CASCADE,
+                              null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    heartbeat_at = models.DateTimeField(default=timezone.now)  # Refreshed while a worker owns the job
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+    
+    def __str__(self):
+        return f"{self.filename} - {self.status}"
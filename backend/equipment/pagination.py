@@ -0,0 +1,201 @@
+"""
+Keyset (cursor) pagination over the rows of a dataset.
+
+Pages are addressed by the sort key of the last row returned rather than by
+an offset, so fetching page N costs the same as fetching page 1.
+
+Rows are read from the dataset's columnar payload: the filters and the
+cursor become masks over the memory-mapped columns, and only the rows of
+the page are sorted out of the remaining ones with a partial sort. Datasets
+stored before payloads existed are paged through their EquipmentRecord rows
+in the database instead. Both give the same pages and cursors.
+"""
+import base64
+import json
+
+import numpy as np
+from django.db.models import F, Q
+
+from .models import RECORD_FIELDS
+
+
+# Sortable fields; row_index is always used as the tie-breaker
+SORT_FIELDS = ['row_index', 'flowrate', 'pressure', 'temperature']
+
+# Numeric fields that accept min_<field>/max_<field> range filters
+RANGE_FIELDS = ['flowrate', 'pressure', 'temperature']
+
+
+class InvalidQueryError(ValueError):
+    """Raised for malformed pagination, sort or filter parameters"""
+
+
+def parse_ordering(value):
+    """Return (field, descending) for an ordering parameter like '-pressure'"""
+    value = (value or 'row_index').strip()
+    descending = value.startswith('-')
+    field = value.lstrip('-')
+    if field not in SORT_FIELDS:
+        raise InvalidQueryError(
+            f'Invalid ordering "{value}". Choose from: {", ".join(SORT_FIELDS)}')
+    return field, descending
+
+
+def encode_cursor(ordering, row):
+    """Build an opaque cursor pointing just after ``row``"""
+    field, _ = parse_ordering(ordering)
+    payload = {'o': ordering, 'v': row[field], 'r': row['row_index']}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor, ordering):
+    """Return (value, row_index) from a cursor produced by encode_cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value, row_index = payload['v'], int(payload['r'])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidQueryError('Invalid cursor')
+    if payload.get('o') != ordering:
+        raise InvalidQueryError('Cursor does not match the requested ordering')
+    return value, row_index
+
+
+def filter_records(queryset, params):
+    """Apply type and numeric range filters from query parameters"""
+    types = [t for value in params.getlist('type') for t in value.split(',') if t]
+    if types:
+        queryset = queryset.filter(equipment_type__in=types)
+
+    for field in RANGE_FIELDS:
+        for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+            raw = params.get(f'{bound}_{field}')
+            if raw in (None, ''):
+                continue
+            try:
+                value = float(raw)
+            except ValueError:
+                raise InvalidQueryError(f'{bound}_{field} must be a number')
+            queryset = queryset.filter(**{f'{field}__{lookup}': value})
+    return queryset
+
+
+def filter_payload(payload, params):
+    """Indices of the payload rows passing the type and numeric range filters"""
+    keep = np.ones(payload.rows, dtype=bool)
+    types = [t for value in params.getlist('type') for t in value.split(',') if t]
+    if types:
+        codes = [i for i, name in enumerate(payload.type_names) if name in set(types)]
+        keep &= np.isin(payload.type_codes, codes)
+
+    columns = {field: column for column, field in RECORD_FIELDS.items()}
+    for field in RANGE_FIELDS:
+        for bound, compare in (('min', np.greater_equal), ('max', np.less_equal)):
+            raw = params.get(f'{bound}_{field}')
+            if raw in (None, ''):
+                continue
+            try:
+                value = float(raw)
+            except ValueError:
+                raise InvalidQueryError(f'{bound}_{field} must be a number')
+            # Missing values compare False, as NULL does in SQL
+            with np.errstate(invalid='ignore'):
+                keep &= compare(payload.column(columns[field]), value)
+    return np.flatnonzero(keep)
+
+
+def _first_by_value(indices, values, count):
+    """The first ``count`` of ``indices`` ordered by ``values``, then index; NaN last"""
+    present = ~np.isnan(values)
+    ordered = []
+    for subset, keys in ((indices[present], values[present]), (indices[~present], None)):
+        wanted = count - sum(len(part) for part in ordered)
+        if wanted <= 0:
+            break
+        if keys is None:
+            # Rows without a value follow in index order
+            ordered.append(subset[:wanted])
+            continue
+        if len(keys) > wanted:
+            # Everything up to the wanted-th smallest value, ties included
+            bound = np.partition(keys, wanted - 1)[wanted - 1]
+            subset, keys = subset[keys <= bound], keys[keys <= bound]
+        ordered.append(subset[np.lexsort((subset, keys))][:wanted])
+    return np.concatenate(ordered) if ordered else indices[:0]
+
+
+def paginate_payload(payload, indices, ordering, cursor=None, limit=100):
+    """Return (rows, next_cursor) for one page of the payload rows at ``indices``
+
+    ``indices`` are ascending, as ``filter_payload`` returns them. Rows are
+    dicts like those of ``paginate_records``.
+    """
+    field, descending = parse_ordering(ordering)
+
+    if field == 'row_index':
+        if cursor:
+            _, row_index = decode_cursor(cursor, ordering)
+            indices = indices[indices < row_index] if descending else indices[indices > row_index]
+        page = indices[::-1][:limit + 1] if descending else indices[:limit + 1]
+    else:
+        column = {f: c for c, f in RECORD_FIELDS.items()}[field]
+        values = np.asarray(payload.column(column)[indices])
+        if cursor:
+            value, row_index = decode_cursor(cursor, ordering)
+            missing = np.isnan(values)
+            if value is None:
+                keep = missing & (indices > row_index)
+            else:
+                with np.errstate(invalid='ignore'):
+                    beyond = values < value if descending else values > value
+                    keep = beyond | ((values == value) & (indices > row_index)) | missing
+            indices, values = indices[keep], values[keep]
+        # Negated values sort descending while ties stay in index order
+        page = _first_by_value(indices, -values if descending else values, limit + 1)
+
+    frame = payload.take(page).astype(object)
+    frame = frame.where(frame.notna(), None)
+    rows = [dict(row_index=int(row_index),
+                 **{RECORD_FIELDS[column]: value for column, value in record.items()})
+            for row_index, record in zip(page, frame.to_dict('records'))]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(ordering, rows[-1])
+    return rows, next_cursor
+
+
+def paginate_records(queryset, ordering, cursor=None, limit=100):
+    """Return (rows, next_cursor) for one page of ``queryset``"""
+    field, descending = parse_ordering(ordering)
+
+    if field == 'row_index':
+        order_by = [F('row_index').desc() if descending else F('row_index').asc()]
+    else:
+        # Rows with a missing value sort after all others in either direction
+        if descending:
+            order_by = [F(field).desc(nulls_last=True), F('row_index').asc()]
+        else:
+            order_by = [F(field).asc(nulls_last=True), F('row_index').asc()]
+
+    if cursor:
+        value, row_index = decode_cursor(cursor, ordering)
+        if field == 'row_index':
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(**{f'row_index__{lookup}': row_index})
+        elif value is None:
+            queryset = queryset.filter(**{f'{field}__isnull': True, 'row_index__gt': row_index})
+        else:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value})
+                | Q(**{field: value, 'row_index__gt': row_index})
+                | Q(**{f'{field}__isnull': True})
+            )
+
+    fields = ['row_index'] + list(RECORD_FIELDS.values())
+    rows = list(queryset.order_by(*order_by).values(*fields)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(ordering, rows[-1])
+    return rows, next_cursor
@@ -0,0 +1,34 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from . import fastjson
+from .instrumentation import timed
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer backed by equipment.fastjson (orjson when available)"""
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        with timed('json_encode') as stage:
+            ret = fastjson.dumps(data, indent=bool(indent))
+            stage.bytes = len(ret)
+
+        # Keep the output a strict JavaScript subset, as JSONRenderer does
+        for char, escaped in ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029')):
+            if char in ret:
+                ret = ret.replace(char, escaped)
+        return ret
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Accept any media type for views that stream their own response body
+
+    Error responses from those views are still rendered as JSON.
+    """
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else fastjson.dumps(data)
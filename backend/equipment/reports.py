@@ -0,0 +1,350 @@
+"""
+PDF report generation.
+
+Reports are built by a worker pool and written to disk under
+MEDIA_ROOT/reports, keyed by dataset id, version and mode. The version is
+the dataset's updated_at, which appends move on, so a report is served
+straight from disk until rows are appended to its dataset, and a build
+that was still running when they were can never be served for the new
+rows. Three modes are available:
+
+    summary    summary statistics, type distribution and counts of the
+               rows flagged as anomalies
+    detailed   adds the flagged rows, per-type statistics, a distribution
+               chart and a histogram of every numeric column
+    full       adds a paged table of the dataset rows
+"""
+from concurrent.futures import Future
+import glob
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle, Paragraph,
+                                Spacer, PageBreak)
+
+from .anomalies import RULES as ANOMALY_RULES, reasons, select_anomalies
+from .charts import histogram_counts
+from .ingest import NUMERIC_COLUMNS
+from .jobs import get_executor, run_in_worker
+from .models import EquipmentDataset
+
+
+REPORT_MODES = ['summary', 'detailed', 'full']
+
+CHART_COLORS = [colors.HexColor(c) for c in
+                ('#667eea', '#764ba2', '#ff6384', '#36a2eb', '#ffce56', '#4bc0c0')]
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+COMPACT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+])
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def report_version(dataset):
+    """Version of a dataset's reports, in microseconds since the epoch"""
+    return int(dataset.updated_at.timestamp() * 1000000)
+
+
+def report_path(dataset, mode):
+    return os.path.join(settings.EQUIPMENT_REPORT_DIR,
+                        f'{dataset.id}-{report_version(dataset)}-{mode}.pdf')
+
+
+def delete_reports(dataset_id):
+    """Remove every cached report of a dataset"""
+    for path in glob.glob(os.path.join(settings.EQUIPMENT_REPORT_DIR, f'{dataset_id}-*.pdf')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _format(value):
+    return f'{value:.2f}' if value is not None else 'N/A'
+
+
+def summary_elements(dataset, styles):
+    """Summary statistics and type distribution tables"""
+    elements = [Paragraph("Summary Statistics", styles['Heading2'])]
+
+    summary_data = [
+        ['Metric', 'Value'],
+        ['Total Equipment Count', str(dataset.total_count)],
+        ['Average Flowrate', f"{dataset.avg_flowrate:.2f}" if dataset.avg_flowrate else "N/A"],
+        ['Average Pressure', f"{dataset.avg_pressure:.2f}" if dataset.avg_pressure else "N/A"],
+        ['Average Temperature', f"{dataset.avg_temperature:.2f}" if dataset.avg_temperature else "N/A"],
+    ]
+    summary_table = Table(summary_data)
+    summary_table.setStyle(TABLE_STYLE)
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    elements.append(Paragraph("Equipment Type Distribution", styles['Heading2']))
+    dist_data = [['Equipment Type', 'Count']]
+    for eq_type, count in dataset.get_equipment_type_distribution().items():
+        dist_data.append([eq_type, str(count)])
+    dist_table = Table(dist_data)
+    dist_table.setStyle(TABLE_STYLE)
+    elements.append(dist_table)
+    elements.append(Spacer(1, 0.3*inch))
+    return elements
+
+
+def anomaly_elements(dataset, styles, list_rows=False):
+    """Counts of the rows flagged at ingest and, with ``list_rows``, the first of them"""
+    anomalies = dataset.get_anomalies()
+    if not anomalies:
+        return []
+
+    elements = [Paragraph("Anomalies", styles['Heading2']), Paragraph(
+        f"{anomalies['flagged_rows']} rows flagged: more than {anomalies['zscore']:g} "
+        f"standard deviations from their type's mean (zscore), beyond "
+        f"{anomalies['iqr_factor']:g} IQR outside their type's quartiles (iqr), or outside "
+        f"their type's operating envelope (envelope).", styles['Normal']),
+        Spacer(1, 0.1*inch)]
+
+    data = [['Rule'] + NUMERIC_COLUMNS]
+    for rule in ANOMALY_RULES:
+        counts = anomalies['counts'].get(rule, {})
+        data.append([rule] + [str(counts.get(column, 0)) for column in NUMERIC_COLUMNS])
+    table = Table(data)
+    table.setStyle(COMPACT_TABLE_STYLE)
+    elements += [table, Spacer(1, 0.2*inch)]
+
+    if anomalies['by_type']:
+        data = [['Type', 'Flagged Rows'] + list(ANOMALY_RULES)]
+        for eq_type, type_anomalies in anomalies['by_type'].items():
+            data.append([eq_type, str(type_anomalies['flagged_rows'])]
+                        + [str(sum(type_anomalies['counts'][rule].values()))
+                           for rule in ANOMALY_RULES])
+        table = Table(data, repeatRows=1)
+        table.setStyle(COMPACT_TABLE_STYLE)
+        elements += [table, Spacer(1, 0.2*inch)]
+
+    payload = dataset.get_payload()
+    selected = None if payload is None else select_anomalies(payload)
+    if list_rows and selected is not None and len(selected[0]):
+        max_rows = settings.EQUIPMENT_REPORT_MAX_ANOMALY_ROWS
+        rows, flags = selected[0][:max_rows], selected[1][:max_rows]
+        if len(selected[0]) > max_rows:
+            elements.append(Paragraph(
+                f"Showing the first {max_rows} of {len(selected[0])} flagged rows.",
+                styles['Normal']))
+        data = [['Row', 'Equipment Name', 'Type'] + NUMERIC_COLUMNS + ['Reasons']]
+        frame = payload.take(rows)
+        for row_index, row_flags, row in zip(rows.tolist(), flags.tolist(),
+                                              frame.itertuples(index=False, name=None)):
+            name, eq_type, flowrate, pressure, temperature = row
+            data.append([str(row_index + 1), name or '', eq_type or '']
+                        + [_format(None if np.isnan(v) else v)
+                           for v in (flowrate, pressure, temperature)]
+                        + ['; '.join(f"{column}: {', '.join(rules)}"
+                                     for column, rules in reasons(row_flags).items())])
+        table = Table(data, repeatRows=1)
+        table.setStyle(COMPACT_TABLE_STYLE)
+        elements += [table, Spacer(1, 0.3*inch)]
+    return elements
+
+
+def type_statistics_elements(dataset, styles):
+    """Per-type statistics table from the precomputed extended statistics"""
+    statistics = dataset.get_extended_statistics()
+    by_type = statistics.get('by_type', {})
+    if not by_type:
+        return []
+
+    header = ['Type', 'Parameter', 'Count', 'Nulls', 'Mean', 'Std', 'Min',
+              'P50', 'P95', 'P99', 'Max']
+    data = [header]
+    for eq_type, columns in by_type.items():
+        for column in NUMERIC_COLUMNS:
+            stats = columns.get(column, {})
+            data.append([eq_type, column, str(stats.get('count', 0)), str(stats.get('null_count', 0))]
+                        + [_format(stats.get(name)) for name in
+                           ('mean', 'std', 'min', 'p50', 'p95', 'p99', 'max')])
+
+    table = Table(data, repeatRows=1)
+    table.setStyle(COMPACT_TABLE_STYLE)
+    return [Paragraph("Statistics by Equipment Type", styles['Heading2']), table,
+            Spacer(1, 0.3*inch)]
+
+
+def distribution_chart(dataset):
+    """Pie chart of the equipment type distribution"""
+    dist = dataset.get_equipment_type_distribution()
+    drawing = Drawing(400, 220)
+    pie = Pie()
+    pie.x, pie.y = 120, 20
+    pie.width = pie.height = 180
+    pie.data = list(dist.values()) or [1]
+    pie.labels = list(dist.keys()) or ['No data']
+    pie.sideLabels = True
+    for i in range(len(pie.data)):
+        pie.slices[i].fillColor = CHART_COLORS[i % len(CHART_COLORS)]
+    drawing.add(pie)
+    return drawing
+
+
+def histogram_chart(values, column, bins):
+    """Bar chart histogram of one numeric column"""
+    counts, edges = histogram_counts(values, bins)
+
+    drawing = Drawing(450, 200)
+    chart = VerticalBarChart()
+    chart.x, chart.y = 50, 40
+    chart.width, chart.height = 380, 140
+    chart.data = [counts.tolist()]
+    # Label every few bins only, so the axis stays readable
+    step = max(1, bins // 5)
+    chart.categoryAxis.categoryNames = [
+        f'{edge:.1f}' if i % step == 0 else '' for i, edge in enumerate(edges[:-1])]
+    chart.categoryAxis.labels.fontSize = 7
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.bars[0].fillColor = CHART_COLORS[NUMERIC_COLUMNS.index(column) % len(CHART_COLORS)]
+    drawing.add(chart)
+    return drawing
+
+
+def chart_elements(dataset, styles):
+    """Type distribution and parameter histogram charts"""
+    elements = [Paragraph("Charts", styles['Heading2']),
+                Paragraph("Equipment Type Distribution", styles['Heading3']),
+                distribution_chart(dataset)]
+
+    payload = dataset.get_payload()
+    if payload is None:
+        return elements
+    for column in NUMERIC_COLUMNS:
+        elements.append(Paragraph(f"{column} Distribution", styles['Heading3']))
+        elements.append(histogram_chart(payload.column(column), column,
+                                        settings.EQUIPMENT_REPORT_HISTOGRAM_BINS))
+    return elements
+
+
+def data_table_elements(dataset, styles):
+    """Paged table of dataset rows, read slice by slice from the payload"""
+    payload = dataset.get_payload()
+    if payload is None:
+        return []
+
+    max_rows = settings.EQUIPMENT_REPORT_MAX_TABLE_ROWS
+    elements = [PageBreak(), Paragraph("Equipment Data", styles['Heading2'])]
+    if payload.rows > max_rows:
+        elements.append(Paragraph(
+            f"Showing the first {max_rows} of {payload.rows} rows.", styles['Normal']))
+
+    header = ['Row', 'Equipment Name', 'Type'] + NUMERIC_COLUMNS
+    page_rows = settings.EQUIPMENT_REPORT_TABLE_PAGE_ROWS
+    for start in range(0, min(payload.rows, max_rows), page_rows):
+        stop = min(start + page_rows, max_rows)
+        frame = payload.frame(start, stop)
+        data = [header]
+        for offset, row in enumerate(frame.itertuples(index=False, name=None)):
+            name, eq_type, flowrate, pressure, temperature = row
+            data.append([str(start + offset + 1), name or '', eq_type or '']
+                        + [_format(None if np.isnan(v) else v)
+                           for v in (flowrate, pressure, temperature)])
+        # One table per slice keeps platypus from re-splitting a huge table
+        table = Table(data, repeatRows=1)
+        table.setStyle(COMPACT_TABLE_STYLE)
+        elements.append(table)
+    return elements
+
+
+def build_report(dataset, mode, path):
+    """Render a report for ``dataset`` into ``path``"""
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"Equipment Data Report: {dataset.filename}", styles['Title']),
+        Spacer(1, 0.2*inch),
+    ]
+    elements += summary_elements(dataset, styles)
+    elements += anomaly_elements(dataset, styles, list_rows=mode in ('detailed', 'full'))
+    if mode in ('detailed', 'full'):
+        elements += type_statistics_elements(dataset, styles)
+        elements += chart_elements(dataset, styles)
+    if mode == 'full':
+        elements += data_table_elements(dataset, styles)
+
+    elements.append(Spacer(1, 0.3*inch))
+    elements.append(Paragraph(
+        f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+
+    # Write to a temporary name first so readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.{threading.get_ident()}.partial'
+    try:
+        SimpleDocTemplate(partial, pagesize=letter).build(elements)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def _build_cached_report(dataset_id, mode):
+    # Rows appended since the report was requested are included, and the
+    # report is stored under the version it shows
+    dataset = EquipmentDataset.objects.get(id=dataset_id)
+    path = build_report(dataset, mode, report_path(dataset, mode))
+    pattern = os.path.join(settings.EQUIPMENT_REPORT_DIR, f'{dataset_id}-[0-9]*-{mode}.pdf')
+    for older in glob.glob(pattern):
+        if int(os.path.basename(older).split('-')[1]) < report_version(dataset):
+            try:
+                os.remove(older)
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def request_report(dataset, mode):
+    """Return a Future resolving to the path of the dataset's report
+
+    A report already on disk resolves immediately; otherwise it is built in
+    the report worker pool, and concurrent requests for the same report
+    share one build.
+    """
+    path = report_path(dataset, mode)
+    if os.path.exists(path):
+        future = Future()
+        future.set_result(path)
+        return future
+
+    with _pending_lock:
+        future = _pending.get(path)
+        if future is None:
+            executor = get_executor('report', settings.EQUIPMENT_REPORT_WORKERS)
+            future = executor.submit(run_in_worker, _build_cached_report, dataset.id, mode)
+            _pending[path] = future
+            future.add_done_callback(lambda _: _pending.pop(path, None))
+    return future
@@ -0,0 +1,78 @@
+"""
+Dataset retention policy.
+
+Datasets beyond the newest KEEP_PER_USER of each user, or older than
+MAX_AGE_DAYS, are removed with a single set-based delete. The same code
+prunes one user after an upload and all users from the prune_datasets
+management command.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .models import EquipmentDataset
+
+
+def retention_policy():
+    """Return (keep_per_user, max_age_days) from settings; None disables a limit"""
+    policy = settings.EQUIPMENT_RETENTION
+    return policy.get('KEEP_PER_USER'), policy.get('MAX_AGE_DAYS')
+
+
+def expired_datasets(user=None, keep=None, max_age_days=None):
+    """Return a queryset of ready datasets that fall outside the policy"""
+    datasets = EquipmentDataset.objects.ready()
+    if user is not None:
+        datasets = datasets.filter(user=user)
+
+    condition = Q(pk__in=[])
+    if keep is not None:
+        # Rank every user's datasets newest first in one query
+        ranked = datasets.annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('uploaded_at').desc(), F('id').desc()],
+        )).filter(rank__gt=keep).values('pk')
+        condition |= Q(pk__in=ranked)
+    if max_age_days is not None:
+        condition |= Q(uploaded_at__lt=timezone.now() - timedelta(days=max_age_days))
+
+    return datasets.filter(condition)
+
+
+def prune_datasets(user=None, keep=None, max_age_days=None, dry_run=False):
+    """Delete datasets outside the retention policy
+
+    ``keep`` and ``max_age_days`` default to EQUIPMENT_RETENTION. Pruning
+    a single user locks that user's row so concurrent uploads prune one
+    after another instead of racing. Returns the number of datasets removed
+    (or that would be removed, with ``dry_run``).
+    """
+    default_keep, default_max_age = retention_policy()
+    keep = default_keep if keep is None else keep
+    max_age_days = default_max_age if max_age_days is None else max_age_days
+    if keep is None and max_age_days is None:
+        return 0
+
+    with transaction.atomic():
+        if user is not None:
+            User.objects.select_for_update().filter(pk=user.pk).first()
+
+        expired = expired_datasets(user, keep=keep, max_age_days=max_age_days)
+        user_ids = set(expired.values_list('user_id', flat=True))
+        if dry_run or not user_ids:
+            return expired.count()
+
+        # One DELETE per table: records cascade with a single IN query and
+        # payload files are removed by the post_delete handler after commit
+        _, per_model = expired.only('id', 'user_id', 'payload').delete()
+
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return per_model.get(EquipmentDataset._meta.label, 0)
@@ -1,6 +1,5 @@
 from rest_framework import serializers
-from .models import EquipmentDataset
-import json
+from .models import EquipmentDataset, UploadJob, UploadBatch
 
 
 class EquipmentDatasetSerializer(serializers.ModelSerializer):
@@ -9,9 +8,9 @@ class EquipmentDatasetSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = EquipmentDataset
-        fields = ['id', 'filename', 'uploaded_at', 'total_count', 
+        fields = ['id', 'filename', 'uploaded_at', 'updated_at', 'total_count', 
                   'avg_flowrate', 'avg_pressure', 'avg_temperature',
-                  'equipment_type_distribution', 'raw_data']
+                  'equipment_type_distribution', 'is_timeseries', 'raw_data']
     
     def get_equipment_type_distribution(self, obj):
         return obj.get_equipment_type_distribution()
@@ -20,13 +19,43 @@ class EquipmentDatasetSerializer(serializers.ModelSerializer):
         return obj.get_raw_data()
 
 
+class EquipmentDatasetListSerializer(serializers.ModelSerializer):
+    """Dataset metadata without rows, for listings"""
+    equipment_type_distribution = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = EquipmentDataset
+        fields = ['id', 'filename', 'uploaded_at', 'updated_at', 'total_count', 
+                  'avg_flowrate', 'avg_pressure', 'avg_temperature',
+                  'equipment_type_distribution', 'is_timeseries']
+    
+    def get_equipment_type_distribution(self, obj):
+        return obj.get_equipment_type_distribution()
 
 
+class UploadJobSerializer(serializers.ModelSerializer):
+    dataset_id = serializers.PrimaryKeyRelatedField(source='dataset', read_only=True)
+    summary = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'filename', 'status', 'phase', 'rows_processed',
+                  'dataset_id', 'error', 'created_at', 'updated_at', 'summary']
+    
+    def get_summary(self, obj):
+        if obj.status != UploadJob.STATUS_COMPLETED or obj.dataset is None:
+            return None
+        return EquipmentDatasetListSerializer(obj.dataset).data
 
 
-
-
-
-
-
-
+class UploadBatchSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(read_only=True)
+    jobs = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadBatch
+        fields = ['id', 'merge', 'status', 'created_at', 'jobs']
+    
+    def get_jobs(self, obj):
+        jobs = obj.jobs.select_related('dataset').order_by('created_at')
+        return UploadJobSerializer(jobs, many=True).data
@@ -0,0 +1,101 @@
+"""
+Reference-counted sharing of content-addressed payloads.
+
+The payload of a hashed upload is stored under its content hash (see
+storage.py) and shared by every dataset with that content. A SharedPayload
+row counts the datasets using each shared payload. The count only changes
+through conditional UPDATEs of that one row, which the database applies
+one at a time, so:
+
+    a reference is only taken while the count is above zero; the release
+    that brings it to zero is the only one to see zero, and deletes the
+    files and then the row, while nobody can take a reference any more
+
+    a payload is only published under an address without a row, where
+    any files left over belong to no dataset
+
+Payloads without a row (merged batches, copies made by appends, uploads
+that were not hashed) belong to their one dataset. A dataset holding the
+only reference to a shared payload can take it over as such a private
+payload, see ``take_payload``.
+"""
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import SharedPayload
+from .storage import (META_FILE, content_payload_name, delete_payload, new_payload_name,
+                      payload_path)
+
+
+def acquire_payload(name):
+    """Take a reference to a shared payload; False if it is gone or being deleted"""
+    if not SharedPayload.objects.filter(name=name, refs__gt=0).update(refs=F('refs') + 1):
+        return False
+    # The reference keeps the files from being deleted from here on, but
+    # they may already be missing
+    if os.path.exists(os.path.join(payload_path(name), META_FILE)):
+        return True
+    release_payload(name)
+    return False
+
+
+def publish_payload(name, content_hash):
+    """Share a newly parsed payload under its content hash and return its name
+
+    The caller holds a reference to the returned payload. If the content is
+    shared already, that payload is returned and ``name`` is deleted; if it
+    is shared but its last dataset is releasing it, ``name`` is returned as
+    a private payload.
+    """
+    target = content_payload_name(content_hash)
+    try:
+        with transaction.atomic():
+            SharedPayload.objects.create(name=target)
+    except IntegrityError:
+        if acquire_payload(target):
+            delete_payload(name)
+            return target
+        return name
+
+    try:
+        # Files at an address without a row were left by an interrupted release
+        delete_payload(target)
+        os.rename(payload_path(name), payload_path(target))
+    except Exception:
+        SharedPayload.objects.filter(name=target).delete()
+        raise
+    return target
+
+
+def take_payload(name):
+    """Turn a shared payload into a private one if the caller holds its only reference
+
+    Returns the private name, which the caller's dataset must be pointed at
+    right away, or None if other datasets share the payload.
+    """
+    # At zero nobody can take a reference any more, as during a release
+    if not SharedPayload.objects.filter(name=name, refs=1).update(refs=0):
+        return None
+    private = new_payload_name()
+    try:
+        os.rename(payload_path(name), payload_path(private))
+    except Exception:
+        SharedPayload.objects.filter(name=name, refs=0).update(refs=1)
+        raise
+    SharedPayload.objects.filter(name=name, refs__lte=0).delete()
+    return private
+
+
+def release_payload(name):
+    """Drop one dataset's reference to a payload, deleting it with the last one"""
+    if not name:
+        return
+    if not SharedPayload.objects.filter(name=name).update(refs=F('refs') - 1):
+        # Not shared: the payload belonged to this dataset alone
+        delete_payload(name)
+        return
+    if SharedPayload.objects.filter(name=name, refs__lte=0).exists():
+        delete_payload(name)
+        SharedPayload.objects.filter(name=name, refs__lte=0).delete()
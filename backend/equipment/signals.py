@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import EquipmentDataset
+from .reports import delete_reports
+from .sharing import release_payload
+
+
+@receiver(post_delete, sender=EquipmentDataset)
+def remove_dataset_payload(sender, instance, **kwargs):
+    """Delete a dataset's files once its row is gone for good
+
+    Payloads shared with other datasets (see sharing.py) are kept until the
+    last of them is deleted.
+    """
+    dataset_id = instance.pk
+    if instance.payload:
+        transaction.on_commit(lambda: release_payload(instance.payload))
+    transaction.on_commit(lambda: delete_reports(dataset_id))
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Apply EQUIPMENT_SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    # One script on the raw connection, so the PRAGMAs do not show up as
+    # queries of the request that happened to open the connection
+    connection.connection.executescript(''.join(
+        f'PRAGMA {name} = {value};' for name, value in settings.EQUIPMENT_SQLITE_PRAGMAS.items()))
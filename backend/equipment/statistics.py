@@ -0,0 +1,185 @@
+"""
+Extended per-column and per-type statistics for equipment datasets.
+
+Everything is computed with grouped NumPy operations: one sort per column
+orders the values by (type, value), after which min, max and percentiles of
+every group are read off by index, and counts, means and variances come
+from weighted bincounts. No Python loop runs over rows or groups.
+
+When rows are appended to a dataset, counts, means, deviations and extremes
+are merged from the stored statistics and those of the new rows (Chan et
+al.'s pairwise form of Welford's update), without touching the old rows.
+Percentiles are order statistics and cannot be merged that way. They are
+deliberately kept exact rather than approximated by a mergeable sketch, as
+reports and anomaly scoring use them, so an append re-reads the
+memory-mapped columns and sorts them once more.
+"""
+import numpy as np
+
+
+PERCENTILES = (25, 50, 75, 95, 99)
+
+
+def _to_list(values):
+    """Convert a float array to a JSON-friendly list with NaN as None"""
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def grouped_quantiles(values, codes, n_groups, quantiles):
+    """Quantiles (0..1) of ``values`` within every group in ``codes``
+
+    ``values`` must not contain NaN. Returns an array with one row per
+    quantile and one column per group, NaN for groups without values.
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    # Sort by value, then stably by group, so each group is a contiguous sorted
+    # run; NumPy's stable sort of 16-bit codes is a radix sort
+    order = np.argsort(values)
+    group_dtype = np.int16 if n_groups <= np.iinfo(np.int16).max else np.int64
+    order = order[np.argsort(codes[order].astype(group_dtype), kind='stable')]
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+
+    result = np.full((len(quantiles), n_groups), np.nan)
+    for i, q in enumerate(quantiles):
+        # Linear interpolation between closest ranks (NumPy's default method)
+        position = (counts[present] - 1) * q
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low_values = sorted_values[starts[present] + lower]
+        high_values = sorted_values[starts[present] + upper]
+        result[i, present] = low_values + (high_values - low_values) * (position - lower)
+    return result
+
+
+def grouped_statistics(values, codes, n_groups):
+    """Compute statistics of ``values`` for every group in ``codes``
+
+    ``values`` is a float array where NaN marks a missing value and
+    ``codes`` holds the group number (0..n_groups-1) of every row. Returns a
+    list with one dict of statistics per group.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    valid = ~np.isnan(values)
+
+    counts = np.bincount(codes[valid], minlength=n_groups)
+    nulls = np.bincount(codes[~valid], minlength=n_groups)
+
+    v = values[valid]
+    c = codes[valid]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.bincount(c, weights=v, minlength=n_groups) / counts
+        sq_dev = np.bincount(c, weights=(v - means[c]) ** 2, minlength=n_groups)
+        # Sample standard deviation, as pandas and spreadsheets report it
+        stds = np.sqrt(sq_dev / (counts - 1))
+    stds[counts < 2] = np.nan
+
+    mins, maxs, *quantiles = grouped_quantiles(v, c, n_groups,
+                                               [0, 1] + [q / 100.0 for q in PERCENTILES])
+    percentiles = {q: _to_list(result) for q, result in zip(PERCENTILES, quantiles)}
+
+    columns = {
+        'count': counts.tolist(),
+        'null_count': nulls.tolist(),
+        'mean': _to_list(means),
+        'std': _to_list(stds),
+        'min': _to_list(mins),
+        'max': _to_list(maxs),
+    }
+    for q in PERCENTILES:
+        columns[f'p{q}'] = percentiles[q]
+
+    return [{name: column[i] for name, column in columns.items()} for i in range(n_groups)]
+
+
+def compute_statistics(columns, type_codes, type_names):
+    """Compute overall and per-type statistics for every numeric column
+
+    ``columns`` maps a column name to a float array, ``type_codes`` holds the
+    index into ``type_names`` of each row's type (-1 when missing).
+    """
+    type_codes = np.asarray(type_codes, dtype=np.int64)
+    has_type = type_codes >= 0
+    n_types = len(type_names)
+
+    overall = {}
+    by_type = {name: {} for name in type_names}
+    for column, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        overall[column] = grouped_statistics(values, np.zeros(len(values), dtype=np.int64), 1)[0]
+
+        groups = grouped_statistics(values[has_type], type_codes[has_type], n_types)
+        for name, stats in zip(type_names, groups):
+            by_type[name][column] = stats
+
+    return {
+        'percentiles': list(PERCENTILES),
+        'columns': overall,
+        'by_type': by_type,
+    }
+
+
+def merge_moments(old, new):
+    """Count, nulls, mean, std, min and max of two groups of values taken together"""
+    n_old, n_new = old['count'], new['count']
+    n = n_old + n_new
+    merged = {'count': n, 'null_count': old['null_count'] + new['null_count']}
+    if not n_new or not n_old:
+        source = old if n_old else new
+        return {**merged, **{name: source[name] for name in ('mean', 'std', 'min', 'max')}}
+
+    # Sums of squared deviations are recovered from the sample standard deviations
+    m2_old = (old['std'] or 0.0) ** 2 * (n_old - 1)
+    m2_new = (new['std'] or 0.0) ** 2 * (n_new - 1)
+    delta = new['mean'] - old['mean']
+    m2 = m2_old + m2_new + delta * delta * n_old * n_new / n
+    merged.update(
+        mean=old['mean'] + delta * n_new / n,
+        std=float(np.sqrt(m2 / (n - 1))),
+        min=min(old['min'], new['min']),
+        max=max(old['max'], new['max']),
+    )
+    return merged
+
+
+def update_statistics(statistics, columns, type_codes, type_names, start):
+    """Statistics of a dataset after rows [start:] were appended to it
+
+    ``statistics`` describe the first ``start`` rows; ``columns`` and
+    ``type_codes`` hold every row, the appended ones included, and
+    ``type_names`` may have grown with types first seen in the new rows.
+    """
+    added = compute_statistics({column: values[start:] for column, values in columns.items()},
+                               type_codes[start:], type_names)
+    type_codes = np.asarray(type_codes, dtype=np.int64)
+    has_type = type_codes >= 0
+    n_types = len(type_names)
+    quantiles = [q / 100.0 for q in PERCENTILES]
+
+    overall = {}
+    by_type = {name: {} for name in type_names}
+    for column, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        overall[column] = merge_moments(statistics['columns'][column], added['columns'][column])
+        result = grouped_quantiles(values[valid], np.zeros(int(valid.sum()), dtype=np.int64),
+                                   1, quantiles)
+        for q, value in zip(PERCENTILES, _to_list(result[:, 0])):
+            overall[column][f'p{q}'] = value
+
+        valid &= has_type
+        result = grouped_quantiles(values[valid], type_codes[valid], n_types, quantiles)
+        for i, name in enumerate(type_names):
+            new = added['by_type'][name][column]
+            old = statistics['by_type'].get(name, {}).get(column)
+            by_type[name][column] = merge_moments(old, new) if old else dict(new)
+            for q, value in zip(PERCENTILES, _to_list(result[:, i])):
+                by_type[name][column][f'p{q}'] = value
+
+    return {
+        'percentiles': list(PERCENTILES),
+        'columns': overall,
+        'by_type': by_type,
+    }
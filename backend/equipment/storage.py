@@ -0,0 +1,329 @@
+"""
+Columnar binary storage for dataset payloads.
+
+Each dataset is stored as a directory under MEDIA_ROOT holding one flat,
+little-endian file per column, so any column can be memory-mapped as a typed
+NumPy array without decoding anything:
+
+    meta.json          row count, column dtypes and the Type dictionary
+    flowrate.f8        float64 values, NaN where missing
+    pressure.f8
+    temperature.f8
+    type_codes.i4      int32 index into meta['types'], -1 where missing
+    names.offsets.i8   int64 start offset of every name (rows + 1 entries)
+    names.utf8         concatenated UTF-8 encoded equipment names
+    names.null.u1      uint8 flag, 1 where the name was missing
+    timestamps.i8      int64 nanoseconds since the epoch (UTC); time-series
+                       payloads only, see timeseries.py
+
+Rows can be appended to a payload in place. Readers map only the rows
+listed in meta.json, which is replaced once the new rows are written.
+
+Uploads are stored under their content hash (``content_payload_name``), so
+the same file uploaded by several users is stored once and shared by their
+datasets, see sharing.py. Such payloads are never changed while shared:
+rows are appended to a payload the dataset took over from the last of its
+sharers, or else to a private copy. Appending grows every column file, so
+the copy is a whole one; it is made with copy_file_range, which shares the
+blocks instead of copying them on filesystems with reflinks (Btrfs, XFS).
+"""
+import errno
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+FORMAT_VERSION = 1
+
+# CSV column -> file holding its values
+NUMERIC_FILES = {
+    'Flowrate': 'flowrate.f8',
+    'Pressure': 'pressure.f8',
+    'Temperature': 'temperature.f8',
+}
+TYPE_CODES_FILE = 'type_codes.i4'
+NAME_OFFSETS_FILE = 'names.offsets.i8'
+NAME_DATA_FILE = 'names.utf8'
+NAME_NULLS_FILE = 'names.null.u1'
+TIMESTAMPS_FILE = 'timestamps.i8'
+META_FILE = 'meta.json'
+
+
+def payload_path(name):
+    """Absolute directory of a payload stored under ``name``"""
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def new_payload_name():
+    return os.path.join(settings.EQUIPMENT_PAYLOAD_DIR, uuid.uuid4().hex)
+
+
+def content_payload_name(content_hash):
+    """Name of the shared payload of an upload with ``content_hash``"""
+    return os.path.join(settings.EQUIPMENT_PAYLOAD_DIR, f'sha256-{content_hash}')
+
+
+def _copy_file(source, destination):
+    """Copy a file in the kernel, as a reflink where the filesystem supports it"""
+    if not hasattr(os, 'copy_file_range'):
+        return shutil.copyfile(source, destination)
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if not copied:
+                    break
+                remaining -= copied
+        except OSError as e:
+            # Not supported between these files; nothing was copied yet
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL) \
+                    or dst.tell():
+                raise
+            shutil.copyfileobj(src, dst)
+    return destination
+
+
+def copy_payload(name):
+    """Copy a payload to a new name and return that name"""
+    copy = new_payload_name()
+    try:
+        shutil.copytree(payload_path(name), payload_path(copy), copy_function=_copy_file)
+    except Exception:
+        delete_payload(copy)
+        raise
+    return copy
+
+
+def delete_payload(name):
+    """Remove a payload directory if it exists"""
+    if name:
+        shutil.rmtree(payload_path(name), ignore_errors=True)
+
+
+class PayloadWriter:
+    """Append DataFrame chunks to a columnar payload directory
+
+    With ``timestamps`` the chunks also carry a datetime64 'Timestamp' column.
+    With ``append`` the chunks are added to the existing payload ``name``;
+    its meta.json only changes on ``close``, and ``abort`` cuts the files
+    back to the rows it lists.
+    """
+    def __init__(self, name, timestamps=False, append=False):
+        self.name = name
+        self.directory = payload_path(name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.rows = 0
+        self.timestamps = timestamps
+        self.type_names = []
+        self._type_index = {}
+        self._name_offset = 0
+        self._meta = None
+        if append:
+            with open(os.path.join(self.directory, META_FILE)) as f:
+                self._meta = json.load(f)
+            self.rows = self._meta['rows']
+            self.timestamps = self._meta.get('timestamps', False)
+            self.type_names = list(self._meta['types'])
+            self._type_index = {type_name: i for i, type_name in enumerate(self.type_names)}
+            # Bytes past the listed rows are left over from a failed append
+            self._truncate()
+            offsets = np.memmap(os.path.join(self.directory, NAME_OFFSETS_FILE), dtype='<i8',
+                                mode='r', shape=(self.rows + 1,))
+            self._name_offset = int(offsets[-1])
+            del offsets
+        self._files = {
+            filename: open(os.path.join(self.directory, filename), 'ab' if append else 'wb')
+            for filename in list(NUMERIC_FILES.values())
+            + [TYPE_CODES_FILE, NAME_OFFSETS_FILE, NAME_DATA_FILE, NAME_NULLS_FILE]
+            + ([TIMESTAMPS_FILE] if self.timestamps else [])
+        }
+        if not append:
+            np.zeros(1, dtype='<i8').tofile(self._files[NAME_OFFSETS_FILE])
+
+    def _truncate(self):
+        """Cut every file back to the rows listed in the payload's meta.json"""
+        rows = self._meta['rows']
+        sizes = {filename: rows * 8 for filename in NUMERIC_FILES.values()}
+        sizes.update({TYPE_CODES_FILE: rows * 4, NAME_OFFSETS_FILE: (rows + 1) * 8,
+                      NAME_NULLS_FILE: rows})
+        if self._meta.get('timestamps'):
+            sizes[TIMESTAMPS_FILE] = rows * 8
+        for filename, size in sizes.items():
+            os.truncate(os.path.join(self.directory, filename), size)
+        offsets = np.memmap(os.path.join(self.directory, NAME_OFFSETS_FILE), dtype='<i8',
+                            mode='r', shape=(rows + 1,))
+        os.truncate(os.path.join(self.directory, NAME_DATA_FILE), int(offsets[-1]))
+
+    def append(self, chunk):
+        for column, filename in NUMERIC_FILES.items():
+            values = chunk[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            values.astype('<f8', copy=False).tofile(self._files[filename])
+
+        if self.timestamps:
+            timestamps = chunk['Timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            timestamps.astype('<i8', copy=False).tofile(self._files[TIMESTAMPS_FILE])
+
+        self.encode_types(chunk['Type']).astype('<i4', copy=False).tofile(
+            self._files[TYPE_CODES_FILE])
+
+        names = chunk['Equipment Name']
+        missing = names.isna().to_numpy()
+        encoded = [b'' if is_missing else str(name).encode('utf-8')
+                   for name, is_missing in zip(names.tolist(), missing)]
+        lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+        offsets = self._name_offset + np.cumsum(lengths)
+        offsets.astype('<i8', copy=False).tofile(self._files[NAME_OFFSETS_FILE])
+        self._files[NAME_DATA_FILE].write(b''.join(encoded))
+        missing.astype(np.uint8).tofile(self._files[NAME_NULLS_FILE])
+        if len(offsets):
+            self._name_offset = int(offsets[-1])
+
+        self.rows += len(chunk)
+
+    def encode_types(self, types):
+        """Dictionary-encode a Type column, extending the dictionary as needed"""
+        types = types.astype(object).where(types.notna(), None)
+        types = types.map(lambda t: None if t is None else str(t))
+        for type_name in types.dropna().unique():
+            if type_name not in self._type_index:
+                self._type_index[type_name] = len(self.type_names)
+                self.type_names.append(type_name)
+        return types.map(self._type_index).fillna(-1).to_numpy(dtype=np.int32)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._write_meta({
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'columns': {column: 'float64' for column in NUMERIC_FILES},
+            'types': self.type_names,
+            'timestamps': self.timestamps,
+        })
+
+    def _write_meta(self, meta):
+        # Replaced in one step, so readers of an appended payload see the old
+        # or the new row count and never a partly written meta.json
+        partial = os.path.join(self.directory, f'{META_FILE}.partial')
+        with open(partial, 'w') as f:
+            json.dump(meta, f)
+        os.replace(partial, os.path.join(self.directory, META_FILE))
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        if self._meta is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        self._write_meta(self._meta)
+        self._truncate()
+
+
+class ColumnarPayload:
+    """Read-only, memory-mapped view of a payload directory"""
+    def __init__(self, name):
+        self.name = name
+        self.directory = payload_path(name)
+        with open(os.path.join(self.directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta['rows']
+        self.type_names = self.meta['types']
+
+    def _map(self, filename, dtype, length):
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, filename), dtype=dtype,
+                         mode='r', shape=(length,))
+
+    def column(self, column):
+        """Memory-mapped float64 values of a numeric column"""
+        return self._map(NUMERIC_FILES[column], '<f8', self.rows)
+
+    @property
+    def has_timestamps(self):
+        return self.meta.get('timestamps', False)
+
+    @property
+    def timestamps(self):
+        """Memory-mapped int64 nanoseconds since the epoch (UTC) of every row"""
+        return self._map(TIMESTAMPS_FILE, '<i8', self.rows)
+
+    @property
+    def type_codes(self):
+        return self._map(TYPE_CODES_FILE, '<i4', self.rows)
+
+    def types(self, start=0, stop=None):
+        """Decoded Type values for rows [start, stop) as an object array"""
+        codes = np.asarray(self.type_codes[start:stop])
+        lookup = np.array(list(self.type_names) + [None], dtype=object)
+        # -1 (missing) indexes the trailing None
+        return lookup[codes]
+
+    def names(self, start=0, stop=None):
+        """Decoded equipment names for rows [start, stop) as a list"""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        if stop <= start:
+            return []
+        offsets = self._map(NAME_OFFSETS_FILE, '<i8', self.rows + 1)[start:stop + 1]
+        nulls = self._map(NAME_NULLS_FILE, '<u1', self.rows)[start:stop]
+        first, last = int(offsets[0]), int(offsets[-1])
+        with open(os.path.join(self.directory, NAME_DATA_FILE), 'rb') as f:
+            f.seek(first)
+            data = f.read(last - first)
+        bounds = (np.asarray(offsets) - first).tolist()
+        return [None if nulls[i] else data[bounds[i]:bounds[i + 1]].decode('utf-8')
+                for i in range(stop - start)]
+
+    def frame(self, start=0, stop=None, columns=None):
+        """Rows [start, stop) as a DataFrame with the CSV column names"""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        columns = columns or ['Equipment Name', 'Type'] + list(NUMERIC_FILES)
+        data = {}
+        for column in columns:
+            if column == 'Equipment Name':
+                data[column] = self.names(start, stop)
+            elif column == 'Type':
+                data[column] = self.types(start, stop)
+            else:
+                data[column] = np.asarray(self.column(column)[start:stop])
+        return pd.DataFrame(data, columns=columns)
+
+    def take(self, indices):
+        """Rows at the sorted ``indices`` as a DataFrame with the CSV column names"""
+        indices = np.asarray(indices, dtype=np.int64)
+        offsets = self._map(NAME_OFFSETS_FILE, '<i8', self.rows + 1)
+        nulls = self._map(NAME_NULLS_FILE, '<u1', self.rows)
+        names = []
+        with open(os.path.join(self.directory, NAME_DATA_FILE), 'rb') as f:
+            for i in indices.tolist():
+                if nulls[i]:
+                    names.append(None)
+                    continue
+                f.seek(int(offsets[i]))
+                names.append(f.read(int(offsets[i + 1] - offsets[i])).decode('utf-8'))
+        lookup = np.array(list(self.type_names) + [None], dtype=object)
+        data = {
+            'Equipment Name': names,
+            'Type': lookup[np.asarray(self.type_codes[indices])] if len(indices) else [],
+            **{column: np.asarray(self.column(column)[indices]) if len(indices) else []
+               for column in NUMERIC_FILES},
+        }
+        return pd.DataFrame(data, columns=['Equipment Name', 'Type'] + list(NUMERIC_FILES))
+
+    def iter_frames(self, chunk_size=None, columns=None):
+        """Yield the payload as consecutive DataFrame slices"""
+        chunk_size = chunk_size or settings.EQUIPMENT_UPLOAD_CHUNK_SIZE
+        for start in range(0, self.rows, chunk_size):
+            yield self.frame(start, start + chunk_size, columns=columns)
+
+    def to_records(self, start=0, stop=None):
+        """Rows as a list of dicts keyed by CSV column, missing values as None"""
+        frame = self.frame(start, stop).astype(object)
+        frame = frame.where(frame.notna(), None)
+        return frame.to_dict('records')
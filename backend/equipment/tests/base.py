@@ -0,0 +1,74 @@
+"""
+Shared setup for the equipment tests.
+
+Payloads, spooled uploads and reports go to a temporary MEDIA_ROOT, uploads
+are processed inline, timing logs are muted and cached responses never
+outlive a test. Nothing depends on the database backend, so the tests run
+on SQLite and on PostgreSQL (DB_ENGINE=postgresql).
+"""
+import csv
+import io
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from equipment.cache import get_cache
+from equipment.ingest import ingest_csv
+
+
+SAMPLE_CSV = os.path.join(settings.BASE_DIR.parent, 'sample_equipment_data.csv')
+
+
+def csv_text(rows, header='Equipment Name,Type,Flowrate,Pressure,Temperature'):
+    """CSV text of a header and rows given as tuples; None is left empty"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(header.split(','))
+    writer.writerows(['' if v is None else v for v in row] for row in rows)
+    return out.getvalue()
+
+
+def csv_upload(text, name='data.csv'):
+    file = io.BytesIO(text.encode())
+    file.name = name
+    return file
+
+
+class EquipmentTestCase(TestCase):
+    """TestCase with its own MEDIA_ROOT, inline uploads and an authenticated client"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Every request and job would log its timings
+        timing = logging.getLogger('equipment.timing')
+        cls.addClassCleanup(timing.setLevel, timing.level)
+        timing.setLevel(logging.WARNING)
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media,
+            EQUIPMENT_UPLOAD_DIR=os.path.join(media, 'uploads'),
+            EQUIPMENT_REPORT_DIR=os.path.join(media, 'reports'),
+            EQUIPMENT_ASYNC_UPLOADS=False,
+            EQUIPMENT_PARSE_PROCESSES=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_cache().clear()
+
+        self.user = User.objects.create_user('engineer', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ingest(self, text, user=None, content_hash='', **kwargs):
+        """Store CSV text as a dataset of ``user`` (the test user by default)"""
+        return ingest_csv(io.StringIO(text), user or self.user, 'data.csv',
+                          content_hash=content_hash, **kwargs)
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from django.test import override_settings
+
+from equipment.anomalies import RULES, load_anomalies, reasons
+
+from .base import EquipmentTestCase, csv_text
+
+
+ENVELOPES = {'Pump': {'Pressure': (3.0, 7.0)}, 'Valve': {'Temperature': (None, 130.0)}}
+
+
+def reference_flags(frame, zscore=3.0, iqr_factor=1.5):
+    """{row index: {column: [rule, ...]}} of every flagged row, computed with pandas"""
+    flagged = {}
+    typed = frame[frame['Type'].notna()]
+    for column in ('Flowrate', 'Pressure', 'Temperature'):
+        groups = typed.groupby('Type')[column]
+        mean, std = groups.transform('mean'), groups.transform('std')
+        q1, q3 = groups.transform(lambda v: v.quantile(0.25)), groups.transform(lambda v: v.quantile(0.75))
+        spread = (q3 - q1) * iqr_factor
+        values = typed[column]
+        low = typed['Type'].map(lambda t: (ENVELOPES.get(t, {}).get(column) or (None, None))[0])
+        high = typed['Type'].map(lambda t: (ENVELOPES.get(t, {}).get(column) or (None, None))[1])
+        rules = {
+            'zscore': (values - mean).abs() > zscore * std,
+            'iqr': (values < q1 - spread) | (values > q3 + spread),
+            'envelope': (values < low.astype(float)) | (values > high.astype(float)),
+        }
+        for rule in RULES:
+            for index in typed.index[rules[rule].fillna(False).to_numpy(dtype=bool)]:
+                flagged.setdefault(int(index), {}).setdefault(column, []).append(rule)
+    return flagged
+
+
+@override_settings(EQUIPMENT_OPERATING_ENVELOPES=ENVELOPES)
+class AnomalyTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(11)
+        rows = []
+        for i in range(400):
+            type_name = ('Pump', 'Valve', 'Reactor', None)[i % 4]
+            values = [round(float(v), 3) for v in rng.normal((100, 5, 120), (10, 1, 6))]
+            # A few rows far outside the spread of their type, and some gaps
+            if i % 37 == 0:
+                values[i % 3] *= 3
+            if i % 23 == 0:
+                values[(i + 1) % 3] = None
+            rows.append((f'EQ-{i}', type_name, *values))
+        self.frame = pd.DataFrame(rows, columns=['Equipment Name', 'Type', 'Flowrate',
+                                                 'Pressure', 'Temperature'])
+        self.frame[['Flowrate', 'Pressure', 'Temperature']] = \
+            self.frame[['Flowrate', 'Pressure', 'Temperature']].astype(float)
+        self.dataset = self.ingest(csv_text(rows))
+        self.expected = reference_flags(self.frame)
+
+    def test_flags_match_pandas(self):
+        rows, flags = load_anomalies(self.dataset.get_payload())
+        found = {int(row): reasons(int(row_flags)) for row, row_flags in zip(rows, flags)}
+        self.assertEqual(found, self.expected)
+        for rule in RULES:
+            self.assertTrue(any(rule in rules for row in found.values() for rules in row.values()))
+
+    def test_counts(self):
+        summary = self.dataset.get_anomalies()
+        self.assertEqual(summary['flagged_rows'], len(self.expected))
+        self.assertEqual(summary['envelopes']['Pump'], {'Pressure': [3.0, 7.0]})
+        count = sum('zscore' in row.get('Flowrate', []) for row in self.expected.values())
+        self.assertEqual(summary['counts']['zscore']['Flowrate'], count)
+        self.assertEqual(sum(t['flagged_rows'] for t in summary['by_type'].values()),
+                         len(self.expected))
+
+    def test_endpoint_pages_through_flagged_rows(self):
+        url = f'/api/dataset/{self.dataset.id}/anomalies/'
+        found, cursor = {}, None
+        while True:
+            response = self.client.get(url, {'limit': 7, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            for row in page['results']:
+                self.assertEqual(row['Equipment Name'], f'EQ-{row["row_index"]}')
+                found[row['row_index']] = row['reasons']
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(found, self.expected)
+
+    def test_endpoint_filters(self):
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/anomalies/',
+                                   {'rule': 'envelope', 'type': 'Valve', 'limit': 1000})
+        expected = sorted(row for row, rules in self.expected.items()
+                          if self.frame['Type'][row] == 'Valve'
+                          and any('envelope' in r for r in rules.values()))
+        self.assertTrue(expected)
+        self.assertEqual([row['row_index'] for row in response.json()['results']], expected)
+        self.assertEqual(response.json()['count'], len(expected))
+
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/anomalies/',
+                                   {'columns': 'Pressure', 'rule': 'iqr', 'limit': 1000})
+        expected = sorted(row for row, rules in self.expected.items()
+                          if 'iqr' in rules.get('Pressure', []))
+        self.assertEqual([row['row_index'] for row in response.json()['results']], expected)
+
+    def test_invalid_requests(self):
+        url = f'/api/dataset/{self.dataset.id}/anomalies/'
+        for params in ({'rule': 'median'}, {'columns': 'Speed'}, {'limit': 'ten'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        self.assertEqual(self.client.get('/api/dataset/0/anomalies/').status_code, 404)
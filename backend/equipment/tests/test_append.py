@@ -0,0 +1,173 @@
+import io
+import os
+import random
+from unittest import mock
+
+import numpy as np
+from django.test import override_settings
+
+from equipment.anomalies import load_anomalies
+from equipment.ingest import append_csv
+from equipment.models import EquipmentDataset, SharedPayload, UploadJob
+from equipment.storage import payload_path
+
+from .base import EquipmentTestCase, csv_text, csv_upload
+
+
+def random_rows(seed, count, types=('Pump', 'Valve', 'Compressor')):
+    rng = random.Random(seed)
+    return [(f'E-{seed}-{i}', rng.choice(types),
+             None if rng.random() < 0.05 else round(rng.gauss(120, 20), 2),
+             round(rng.gauss(6, 1), 2), round(rng.gauss(115, 10), 2))
+            for i in range(count)]
+
+
+class AppendTests(EquipmentTestCase):
+    def assertSameSummary(self, dataset, expected):
+        self.assertEqual(dataset.total_count, expected.total_count)
+        self.assertEqual(dataset.get_equipment_type_distribution(),
+                         expected.get_equipment_type_distribution())
+        for field in ('avg_flowrate', 'avg_pressure', 'avg_temperature'):
+            self.assertAlmostEqual(getattr(dataset, field), getattr(expected, field))
+        merged, full = dataset.get_extended_statistics(), expected.get_extended_statistics()
+        self.assertEqual(set(merged['by_type']), set(full['by_type']))
+        for name in full['by_type']:
+            for column, stats in full['by_type'][name].items():
+                for key, value in stats.items():
+                    self.assertAlmostEqual(merged['by_type'][name][column][key], value)
+        for column, stats in full['columns'].items():
+            for key, value in stats.items():
+                self.assertAlmostEqual(merged['columns'][column][key], value)
+
+    def test_append_equals_full_upload(self):
+        first = random_rows(1, 300, types=('Pump', 'Valve'))
+        # 'Compressor' is first seen in the appended rows
+        second = random_rows(2, 250) + [('Spike', 'Valve', 9000.0, 6.0, 115.0)]
+        dataset = self.ingest(csv_text(first))
+
+        response = self.client.post(f'/api/dataset/{dataset.id}/append/',
+                                    {'file': csv_upload(csv_text(second))}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        job = UploadJob.objects.get(id=response.json()['id'])
+        self.assertEqual((job.status, job.rows_processed), (UploadJob.STATUS_COMPLETED, 251))
+
+        dataset.refresh_from_db()
+        self.assertIsNone(dataset.append_job_id)
+        self.assertSameSummary(dataset, self.ingest(csv_text(first + second)))
+        self.assertEqual(dataset.get_payload().rows, 551)
+        appended = dataset.get_payload().frame(300)
+        self.assertEqual(appended['Equipment Name'].tolist(), [row[0] for row in second])
+        np.testing.assert_array_equal(appended['Flowrate'],
+                                      [np.nan if row[2] is None else row[2] for row in second])
+        self.assertFalse(dataset.records.exists())
+        self.assertGreater(dataset.get_anomalies()['flagged_rows'], 0)
+
+    @override_settings(EQUIPMENT_UPLOAD_CHUNK_SIZE=4)
+    def test_failed_chunk_rolls_back(self):
+        dataset = self.ingest(csv_text(random_rows(1, 50)))
+        before = (dataset.total_count, dataset.extended_statistics, dataset.anomalies)
+        # The third chunk does not parse, after two chunks were written
+        rows = random_rows(2, 10)
+        rows[9] = ('Broken', 'Pump', 'fast', 5.0, 100.0)
+
+        with self.assertRaises(ValueError):
+            append_csv(dataset, io.StringIO(csv_text(rows)))
+
+        dataset = EquipmentDataset.objects.get(id=dataset.id)
+        self.assertEqual((dataset.total_count, dataset.extended_statistics, dataset.anomalies),
+                         before)
+        self.assertEqual(dataset.get_payload().rows, 50)
+        self.assertEqual(os.path.getsize(
+            os.path.join(payload_path(dataset.payload), 'flowrate.f8')), 50 * 8)
+
+        # The dataset still takes appends afterwards
+        append_csv(dataset, io.StringIO(csv_text(random_rows(3, 5))))
+        self.assertEqual(dataset.get_payload().rows, 55)
+
+    def test_failed_save_truncates_anomalies(self):
+        dataset = self.ingest(csv_text(random_rows(1, 200)))
+        flagged = dataset.get_anomalies()['flagged_rows']
+        outliers = [(f'Hot-{i}', 'Pump', 120.0, 6.0, 5000.0) for i in range(5)]
+
+        with mock.patch.object(EquipmentDataset, 'save', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                append_csv(dataset, io.StringIO(csv_text(outliers)))
+
+        dataset = EquipmentDataset.objects.get(id=dataset.id)
+        rows, flags = load_anomalies(dataset.get_payload())
+        self.assertEqual((len(rows), len(flags)), (flagged, flagged))
+        self.assertEqual(dataset.get_payload().rows, 200)
+
+    def test_append_to_shared_payload_copies_it(self):
+        text = csv_text(random_rows(1, 40))
+        other_user = self.user.__class__.objects.create_user('operator')
+        mine = self.ingest(text, content_hash='ab' * 32)
+        theirs = self.ingest(text, user=other_user, content_hash='ab' * 32)
+        shared = mine.payload
+        self.assertEqual(theirs.payload, shared)
+        self.assertEqual(SharedPayload.objects.get(name=shared).refs, 2)
+
+        append_csv(mine, io.StringIO(csv_text(random_rows(2, 10))))
+
+        mine.refresh_from_db()
+        self.assertNotEqual(mine.payload, shared)
+        self.assertEqual(mine.content_hash, '')
+        self.assertEqual(mine.get_payload().rows, 50)
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.get_payload().rows, 40)
+        self.assertEqual(SharedPayload.objects.get(name=shared).refs, 1)
+
+    def test_append_takes_over_a_payload_nobody_else_uses(self):
+        text = csv_text(random_rows(1, 40))
+        dataset = self.ingest(text, content_hash='ab' * 32)
+        shared = dataset.payload
+
+        with mock.patch('equipment.ingest.copy_payload') as copy:
+            append_csv(dataset, io.StringIO(csv_text(random_rows(2, 10))))
+        copy.assert_not_called()
+
+        dataset = EquipmentDataset.objects.get(id=dataset.id)
+        self.assertNotEqual(dataset.payload, shared)
+        self.assertEqual((dataset.content_hash, dataset.get_payload().rows), ('', 50))
+        self.assertFalse(os.path.exists(payload_path(shared)))
+        self.assertFalse(SharedPayload.objects.filter(name=shared).exists())
+        # The content can be shared again by the next upload of it
+        again = self.ingest(text, content_hash='ab' * 32)
+        self.assertEqual((again.payload, again.get_payload().rows), (shared, 40))
+
+    @override_settings(EQUIPMENT_UPLOAD_CHUNK_SIZE=4)
+    def test_failed_append_to_shared_payload_keeps_it(self):
+        text = csv_text(random_rows(1, 40))
+        dataset = self.ingest(text, content_hash='cd' * 32)
+        self.ingest(text, user=self.user.__class__.objects.create_user('operator'),
+                    content_hash='cd' * 32)
+        shared = dataset.payload
+        payloads = set(os.listdir(os.path.dirname(payload_path(shared))))
+        rows = random_rows(2, 10)
+        rows[6] = ('Broken', 'Pump', 'fast', 5.0, 100.0)
+
+        with self.assertRaises(ValueError):
+            append_csv(dataset, io.StringIO(csv_text(rows)))
+
+        dataset = EquipmentDataset.objects.get(id=dataset.id)
+        self.assertEqual((dataset.payload, dataset.content_hash), (shared, 'cd' * 32))
+        self.assertEqual(SharedPayload.objects.get(name=shared).refs, 2)
+        # The private copy made for the append is gone
+        self.assertEqual(set(os.listdir(os.path.dirname(payload_path(shared)))), payloads)
+
+    @override_settings(EQUIPMENT_UPLOAD_CHUNK_SIZE=4)
+    def test_failed_append_keeps_a_payload_taken_over(self):
+        dataset = self.ingest(csv_text(random_rows(1, 40)), content_hash='cd' * 32)
+        shared = dataset.payload
+        rows = random_rows(2, 10)
+        rows[6] = ('Broken', 'Pump', 'fast', 5.0, 100.0)
+
+        with self.assertRaises(ValueError):
+            append_csv(dataset, io.StringIO(csv_text(rows)))
+
+        dataset = EquipmentDataset.objects.get(id=dataset.id)
+        self.assertNotEqual(dataset.payload, shared)
+        self.assertEqual(dataset.content_hash, '')
+        self.assertEqual(dataset.get_payload().rows, 40)
+        self.assertEqual(os.listdir(os.path.dirname(payload_path(shared))),
+                         [os.path.basename(dataset.payload)])
@@ -0,0 +1,121 @@
+import io
+import os
+import zipfile
+
+from django.test import override_settings
+
+from equipment.jobs import get_process_pool
+from equipment.models import EquipmentDataset, UploadBatch, UploadJob
+
+from .base import EquipmentTestCase, csv_text, csv_upload
+
+
+def plant(prefix, count, start=0):
+    return csv_text([(f'{prefix}-{i}', 'Pump', 100 + i, 5.0, 110.0)
+                     for i in range(start, start + count)])
+
+
+def zip_upload(members, name='plants.zip'):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for filename, text in members.items():
+            archive.writestr(filename, text)
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+class BatchUploadTests(EquipmentTestCase):
+    def post(self, files, **data):
+        return self.client.post('/api/upload/batch/', {'files': files, **data}, format='multipart')
+
+    def jobs(self, response):
+        return {job['filename']: job for job in response.json()['jobs']}
+
+    def test_each_file_becomes_a_dataset(self):
+        archive = zip_upload({
+            'north/a.csv': plant('A', 3),
+            'b.CSV': plant('B', 4),
+            '__MACOSX/._a.csv': 'resource fork',
+            '.hidden.csv': plant('H', 1),
+            'notes.txt': 'not a CSV',
+        })
+        response = self.post([csv_upload(plant('C', 5), 'c.csv'), archive])
+        self.assertEqual(response.status_code, 202)
+        batch = UploadBatch.objects.get(id=response.json()['id'])
+        self.assertEqual(batch.status, UploadJob.STATUS_COMPLETED)
+
+        jobs = self.jobs(self.client.get(f'/api/batches/{batch.id}/'))
+        self.assertEqual(sorted(jobs), ['a.csv', 'b.CSV', 'c.csv'])
+        counts = {name: EquipmentDataset.objects.get(id=job['dataset_id']).total_count
+                  for name, job in jobs.items()}
+        self.assertEqual(counts, {'a.csv': 3, 'b.CSV': 4, 'c.csv': 5})
+
+    def test_merge_in_upload_order(self):
+        response = self.post([csv_upload(plant('A', 2), 'a.csv'),
+                              csv_upload(plant('B', 3), 'b.csv')], merge='true')
+        jobs = self.jobs(response)
+        dataset_ids = {job['dataset_id'] for job in jobs.values()}
+        self.assertEqual(len(dataset_ids), 1)
+        dataset = EquipmentDataset.objects.get(id=dataset_ids.pop())
+        self.assertEqual(dataset.filename, 'a.csv + 1 more')
+        self.assertEqual(dataset.total_count, 5)
+        self.assertEqual(dataset.get_payload().names(), ['A-0', 'A-1', 'B-0', 'B-1', 'B-2'])
+        # The per-file payloads parsed for the merge are gone
+        payloads = os.listdir(os.path.dirname(dataset.get_payload().directory))
+        self.assertEqual(payloads, [os.path.basename(dataset.payload)])
+
+    def test_failed_file_stops_the_merge(self):
+        with self.assertLogs('equipment.jobs', 'ERROR'):
+            response = self.post([csv_upload(plant('A', 2), 'a.csv'),
+                                  csv_upload('Equipment Name\nX\n', 'bad.csv')], merge='1')
+        jobs = self.jobs(response)
+        self.assertEqual(jobs['bad.csv']['status'], UploadJob.STATUS_FAILED)
+        self.assertEqual(jobs['a.csv']['error'], 'Not merged because these files failed: bad.csv')
+        self.assertEqual(response.json()['status'], UploadJob.STATUS_FAILED)
+        self.assertFalse(EquipmentDataset.objects.exists())
+
+    def test_partial_batch(self):
+        with self.assertLogs('equipment.jobs', 'ERROR'):
+            response = self.post([csv_upload(plant('A', 2), 'a.csv'),
+                                  csv_upload('Equipment Name\nX\n', 'bad.csv')])
+        self.assertEqual(response.json()['status'], 'partial')
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+
+    def test_duplicates_are_not_parsed_again(self):
+        first = self.jobs(self.post([csv_upload(plant('A', 2), 'a.csv')]))['a.csv']
+        again = self.jobs(self.post([csv_upload(plant('A', 2), 'copy.csv')]))['copy.csv']
+        self.assertEqual((again['phase'], again['dataset_id']), ('duplicate', first['dataset_id']))
+
+    @override_settings(EQUIPMENT_BATCH_MAX_FILES=2)
+    def test_limits(self):
+        response = self.post([csv_upload(plant('A', 1), f'{i}.csv') for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Too many files', response.json()['error'])
+        response = self.post([zip_upload({'notes.txt': 'no CSV'})])
+        self.assertEqual(response.json(), {'error': 'No CSV files provided'})
+        with override_settings(EQUIPMENT_BATCH_MAX_UNCOMPRESSED_BYTES=10):
+            response = self.post([zip_upload({'a.csv': plant('A', 5)})])
+        self.assertEqual(response.json(), {'error': 'Archive contents are too large'})
+        self.assertFalse(UploadBatch.objects.exists())
+
+
+class ProcessPoolBatchTests(EquipmentTestCase):
+    """Batch files parsed in separate processes, as in production"""
+    def setUp(self):
+        super().setUp()
+        override = override_settings(EQUIPMENT_PARSE_PROCESSES=2)
+        override.enable()
+        self.addCleanup(override.disable)
+        # The pool copies MEDIA_ROOT when it starts
+        get_process_pool(reset=True)
+        self.addCleanup(get_process_pool, reset=True)
+
+    def test_parallel_parsing(self):
+        files = [csv_upload(plant(name, 50), f'{name}.csv') for name in 'ABCD']
+        response = self.client.post('/api/upload/batch/', {'files': files}, format='multipart')
+        jobs = response.json()['jobs']
+        self.assertEqual({job['status'] for job in jobs}, {UploadJob.STATUS_COMPLETED})
+        for job in jobs:
+            dataset = EquipmentDataset.objects.get(id=job['dataset_id'])
+            self.assertEqual(dataset.get_payload().names()[0], f'{job["filename"][0]}-0')
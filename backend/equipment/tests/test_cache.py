@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from equipment.cache import cache_key, data_version
+from equipment.models import EquipmentDataset
+
+from .base import EquipmentTestCase, SAMPLE_CSV
+
+
+class ResponseCacheTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        with open(SAMPLE_CSV) as f:
+            self.text = f.read()
+
+    def summary(self):
+        response = self.client.get('/api/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_key_follows_the_database(self):
+        before = data_version(self.user.id)
+        dataset = self.ingest(self.text)
+        after_upload = data_version(self.user.id)
+        self.assertNotEqual(after_upload, before)
+
+        dataset.save()
+        after_save = data_version(self.user.id)
+        self.assertNotEqual(after_save, after_upload)
+        self.assertIn(after_save, cache_key(self.user, 'summary'))
+
+        dataset.delete()
+        self.assertNotEqual(data_version(self.user.id), after_save)
+
+    def test_cached_response_costs_one_query(self):
+        self.ingest(self.text)
+        first = self.summary()
+        # Only the data version is read from the database
+        with self.assertNumQueries(1):
+            self.assertEqual(self.summary(), first)
+
+    def test_changes_made_elsewhere_are_served(self):
+        dataset = self.ingest(self.text)
+        self.assertEqual(self.summary()['summary']['total_count'], dataset.total_count)
+        self.assertEqual(self.summary()['id'], dataset.id)
+
+        # As another worker would: straight to the database, no local invalidation
+        EquipmentDataset.objects.filter(id=dataset.id).update(
+            total_count=7, updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.summary()['summary']['total_count'], 7)
+
+        newer = self.ingest(self.text)
+        self.assertEqual(self.summary()['id'], newer.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            EquipmentDataset.objects.filter(id=newer.id).delete()
+        self.assertEqual(self.summary()['id'], dataset.id)
+
+    def test_conditional_requests(self):
+        self.ingest(self.text)
+        response = self.client.get('/api/history/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/history/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.ingest(self.text)
+        self.assertEqual(self.client.get('/api/history/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
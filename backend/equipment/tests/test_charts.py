@@ -0,0 +1,112 @@
+import math
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from equipment.charts import downsample, histogram_counts, lttb, minmax
+
+from .base import EquipmentTestCase, SAMPLE_CSV
+
+
+def reference_lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets written out point by point, as first published"""
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    return selected + [n - 1]
+
+
+class LttbTests(SimpleTestCase):
+    def test_matches_reference(self):
+        rng = np.random.default_rng(11)
+        for n, threshold in ((1002, 102), (5000, 500), (103, 3), (1000, 999)):
+            with self.subTest(n=n, threshold=threshold):
+                x = np.arange(n, dtype=np.float64)
+                y = np.cumsum(rng.normal(0, 1, n))
+                self.assertEqual(lttb(x, y, threshold).tolist(), reference_lttb(x, y, threshold))
+
+    def test_keeps_ends_order_and_spikes(self):
+        n = 10000
+        x = np.arange(n, dtype=np.float64)
+        y = np.zeros(n)
+        y[4321] = 50.0
+        y[8765] = -50.0
+        selected = lttb(x, y, 100)
+        self.assertEqual(len(selected), 100)
+        self.assertEqual((selected[0], selected[-1]), (0, n - 1))
+        self.assertTrue((np.diff(selected) > 0).all())
+        self.assertIn(4321, selected)
+        self.assertIn(8765, selected)
+
+    def test_short_series_kept_whole(self):
+        x = np.arange(5, dtype=np.float64)
+        self.assertEqual(lttb(x, x, 5).tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(lttb(x, x, 2).tolist(), [0, 1, 2, 3, 4])
+
+
+class MinMaxTests(SimpleTestCase):
+    def test_matches_bucket_extremes(self):
+        rng = np.random.default_rng(2)
+        for n, buckets in ((1000, 10), (1003, 10), (997, 33), (50, 24)):
+            with self.subTest(n=n, buckets=buckets):
+                y = rng.normal(0, 1, n)
+                size = -(-n // buckets)
+                expected = set()
+                for start in range(0, n, size):
+                    block = y[start:start + size]
+                    expected |= {start + int(block.argmin()), start + int(block.argmax())}
+                selected = minmax(y, buckets)
+                self.assertEqual(selected.tolist(), sorted(expected))
+                self.assertLessEqual(len(selected), 2 * buckets)
+                self.assertIn(int(y.argmin()), selected)
+                self.assertIn(int(y.argmax()), selected)
+
+    def test_short_series_kept_whole(self):
+        y = np.arange(6, dtype=np.float64)
+        self.assertEqual(minmax(y, 3).tolist(), list(range(6)))
+
+
+class DownsampleTests(SimpleTestCase):
+    def test_skips_missing_values(self):
+        values = np.sin(np.arange(2000) / 50.0)
+        values[::3] = np.nan
+        for method in ('lttb', 'minmax'):
+            rows, y = downsample(values, 100, method)
+            self.assertLessEqual(len(rows), 100)
+            self.assertFalse(np.isnan(y).any())
+            self.assertEqual(y.tolist(), values[rows].tolist())
+            self.assertTrue((rows % 3 != 0).all())
+
+    def test_histogram_of_empty_column(self):
+        counts, edges = histogram_counts(np.array([np.nan, np.inf]), 4)
+        self.assertEqual(counts.tolist(), [0, 0, 0, 0])
+        self.assertEqual(len(edges), 5)
+
+
+class ChartEndpointTests(EquipmentTestCase):
+    def test_downsampled_series(self):
+        with open(SAMPLE_CSV) as f:
+            dataset = self.ingest(f.read())
+        for method in ('lttb', 'minmax'):
+            response = self.client.get(f'/api/dataset/{dataset.id}/chart/',
+                                       {'points': 10, 'method': method, 'columns': 'Pressure'})
+            self.assertEqual(response.status_code, 200)
+            series = response.json()['series']
+            self.assertEqual(list(series), ['Pressure'])
+            self.assertLessEqual(len(series['Pressure']['x']), 10)
+            self.assertEqual(series['Pressure']['count'], dataset.total_count)
+
+        response = self.client.get(f'/api/dataset/{dataset.id}/chart/', {'method': 'mean'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+
+from .base import EquipmentTestCase, csv_text
+
+
+BASELINE = [
+    ('P-1', 'Pump', 100, 5.0, 110),
+    ('P-2', 'Pump', 120, 5.5, 115),
+    # Repeated names are collapsed to their mean readings
+    ('V-1', 'Valve', 80, 4.0, 100),
+    ('V-1', 'Valve', 90, 4.0, 100),
+    ('C-1', 'Compressor', 150, 8.0, 140),
+]
+CURRENT = [
+    ('P-1', 'Pump', 110, 5.0, 110),
+    ('P-2', 'Pump', 100, None, 118),
+    ('V-1', 'Valve', 85, 4.5, 101),
+    ('H-1', 'HeatExchanger', 95, 6.0, 125),
+]
+
+
+class CompareTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.baseline = self.ingest(csv_text(BASELINE))
+        self.current = self.ingest(csv_text(CURRENT))
+
+    def compare(self, **params):
+        params.setdefault('ids', f'{self.baseline.id},{self.current.id}')
+        return self.client.get('/api/compare/', params)
+
+    def test_join_and_drift(self):
+        response = self.compare()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['baseline_id'], self.baseline.id)
+        self.assertEqual([d['id'] for d in data['datasets']], [self.baseline.id, self.current.id])
+        comparison, = data['comparisons']
+        self.assertEqual((comparison['matched_count'], comparison['added'], comparison['removed']),
+                         (3, ['H-1'], ['C-1']))
+
+        equipment = {row['Equipment Name']: row for row in comparison['equipment']}
+        self.assertEqual(list(equipment), ['P-1', 'P-2', 'V-1'])
+        self.assertEqual(equipment['V-1']['Flowrate'], {'baseline': 85.0, 'value': 85.0, 'delta': 0.0})
+        self.assertEqual(equipment['P-2']['Pressure'], {'baseline': 5.5, 'value': None, 'delta': None})
+
+        flowrate = comparison['drift']['Flowrate']
+        self.assertEqual((flowrate['matched_count'], flowrate['changed_count']), (3, 2))
+        self.assertAlmostEqual(flowrate['mean_delta'], (10 - 20 + 0) / 3)
+        self.assertEqual(flowrate['max_abs_delta'], 20.0)
+        # P-2 has no pressure in the current dataset
+        self.assertEqual(comparison['drift']['Pressure']['matched_count'], 2)
+
+    def test_sort_by_largest_change_and_limit(self):
+        comparison = self.compare(sort='Flowrate', limit=2).json()['comparisons'][0]
+        self.assertEqual([row['Equipment Name'] for row in comparison['equipment']], ['P-2', 'P-1'])
+        self.assertEqual(comparison['matched_count'], 3)
+
+    def test_several_datasets_against_the_baseline(self):
+        third = self.ingest(csv_text(BASELINE[:2]))
+        data = self.compare(ids=f'{self.baseline.id},{self.current.id},{third.id}').json()
+        self.assertEqual([c['dataset_id'] for c in data['comparisons']], [self.current.id, third.id])
+        self.assertEqual(data['comparisons'][1]['removed'], ['C-1', 'V-1'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.compare(ids=str(self.baseline.id)).status_code, 400)
+        self.assertEqual(self.compare(ids=f'{self.baseline.id},{self.baseline.id}').status_code, 400)
+        self.assertEqual(self.compare(ids='1,x').status_code, 400)
+        self.assertEqual(self.compare(sort='Type').status_code, 400)
+
+        theirs = self.ingest(csv_text(CURRENT), user=User.objects.create_user('operator'))
+        self.assertEqual(self.compare(ids=f'{self.baseline.id},{theirs.id}').status_code, 404)
@@ -0,0 +1,67 @@
+import gzip
+import io
+import json
+
+import pandas as pd
+from django.test import override_settings
+
+from .base import EquipmentTestCase, SAMPLE_CSV, csv_text
+
+
+ROWS = [
+    ('P-1', 'Pump', 120.5, 5.2, 110),
+    ('V, "main"', None, None, 4.5, 100),
+    (None, 'Valve', 85, None, 95.25),
+]
+
+
+@override_settings(EQUIPMENT_EXPORT_CHUNK_ROWS=2)
+class ExportTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = self.ingest(csv_text(ROWS))
+
+    def export(self, export_format, **params):
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/export.{export_format}', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_round_trips(self):
+        response, body = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'dataset_{self.dataset.id}.csv', response['Content-Disposition'])
+        frame = pd.read_csv(io.BytesIO(body))
+        expected = pd.DataFrame(ROWS, columns=frame.columns)
+        pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
+
+    def test_ndjson_with_columns(self):
+        response, body = self.export('ndjson', columns='Temperature,Equipment Name,Temperature')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(lines, [
+            {'Temperature': 110.0, 'Equipment Name': 'P-1'},
+            {'Temperature': 100.0, 'Equipment Name': 'V, "main"'},
+            {'Temperature': 95.25, 'Equipment Name': None},
+        ])
+
+    def test_gzip(self):
+        _, plain = self.export('csv')
+        response, body = self.export('csv', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_invalid_columns(self):
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/export.csv',
+                                   {'columns': 'Flowrate,Owner'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Owner', response.json()['error'])
+        self.assertEqual(self.client.get('/api/dataset/999/export.ndjson').status_code, 404)
+
+    def test_export_matches_upload(self):
+        with open(SAMPLE_CSV) as f:
+            self.dataset = self.ingest(f.read())
+        _, body = self.export('csv')
+        pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(body)), pd.read_csv(SAMPLE_CSV),
+                                      check_dtype=False)
@@ -0,0 +1,68 @@
+import datetime
+import decimal
+import uuid
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from equipment import fastjson
+from equipment.renderers import FastJSONRenderer
+
+from .base import EquipmentTestCase
+
+
+DOCUMENT = {
+    'count': np.int64(3),
+    'mean': np.float32(1.5),
+    'values': np.array([1.0, np.nan, np.inf]),
+    'nested': [{'missing': float('nan'), 'ratio': decimal.Decimal('0.25')}],
+    'uploaded_at': datetime.datetime(2024, 3, 1, 12, 30, tzinfo=datetime.timezone.utc),
+    'day': datetime.date(2024, 3, 1),
+    'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'name': 'Kühler \u2028',
+}
+EXPECTED = {
+    'count': 3,
+    'mean': 1.5,
+    'values': [1.0, None, None],
+    'nested': [{'missing': None, 'ratio': 0.25}],
+    'uploaded_at': '2024-03-01T12:30:00Z',
+    'day': '2024-03-01',
+    'id': '12345678-1234-5678-1234-567812345678',
+    'name': 'Kühler \u2028',
+}
+
+
+class FastJsonTests(SimpleTestCase):
+    def test_backends_agree(self):
+        self.assertEqual(fastjson.backend(), 'orjson')
+        fast = fastjson.dumps(DOCUMENT)
+        with override_settings(EQUIPMENT_JSON_BACKEND='json'):
+            self.assertEqual(fastjson.backend(), 'json')
+            self.assertEqual(fastjson.dumps(DOCUMENT), fast)
+            self.assertEqual(fastjson.loads(fast), EXPECTED)
+        self.assertEqual(fastjson.loads(fast), EXPECTED)
+
+    def test_non_string_keys(self):
+        self.assertEqual(fastjson.loads(fastjson.dumps({1: 'a', 'b': 2})), {'1': 'a', 'b': 2})
+
+    def test_renderer_escapes_line_separators(self):
+        rendered = FastJSONRenderer().render({'name': 'a\u2028b\u2029c'})
+        self.assertEqual(rendered, b'{"name":"a\\u2028b\\u2029c"}')
+        self.assertEqual(fastjson.loads(rendered), {'name': 'a\u2028b\u2029c'})
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class JsonApiTests(EquipmentTestCase):
+    def test_json_requests_and_responses(self):
+        response = self.client.post('/api/register/',
+                                    b'{"username": "operator", "password": "pw-1234"}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(fastjson.loads(response.content)['username'], 'operator')
+
+        response = self.client.post('/api/login/', b'{"username": ',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
@@ -0,0 +1,106 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+
+from equipment.instrumentation import (Counter, Histogram, Registry, collect_timings,
+                                       start_timings, stop_timings, timed)
+
+from .base import EquipmentTestCase, csv_text, csv_upload
+
+
+def server_timing(response):
+    """Stage names of a Server-Timing header, in order"""
+    return [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+
+
+class MetricsFormatTests(SimpleTestCase):
+    def test_prometheus_text(self):
+        registry = Registry()
+        counter = registry.register(Counter('requests_total', 'Requests', ['route']))
+        histogram = registry.register(Histogram('duration_seconds', 'Duration', buckets=(0.1, 1.0)))
+        counter.inc(route='a"b\\c')
+        counter.inc(2, route='a"b\\c')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5.0)
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP requests_total Requests',
+            '# TYPE requests_total counter',
+            'requests_total{route="a\\"b\\\\c"} 3',
+            '# HELP duration_seconds Duration',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{le="0.1"} 1',
+            'duration_seconds_bucket{le="1.0"} 2',
+            'duration_seconds_bucket{le="+Inf"} 3',
+            'duration_seconds_sum 5.55',
+            'duration_seconds_count 3',
+        ]) + '\n')
+
+    def test_stages_aggregate_by_name(self):
+        timings, token = start_timings()
+        try:
+            with timed('db_insert', rows=2):
+                pass
+            with timed('db_insert', rows=3) as stage:
+                stage.bytes = 10
+        finally:
+            stop_timings(token)
+        self.assertEqual(timings.stages['db_insert']['rows'], 5)
+        self.assertEqual(timings.stages['db_insert']['bytes'], 10)
+        header = timings.server_timing(total=0.5)
+        self.assertRegex(header, r'^db_insert;dur=[\d.]+;desc="rows=5 bytes=10 count=2", total;dur=500\.0$')
+
+    def test_nested_collector_passes_stages_on(self):
+        timings, token = start_timings()
+        try:
+            with self.assertLogs('equipment.timing', 'INFO') as logs:
+                with collect_timings('upload_job', job_id='1'):
+                    with timed('csv_read', rows=4):
+                        pass
+        finally:
+            stop_timings(token)
+        self.assertEqual(timings.stages['csv_read']['rows'], 4)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['event'], line['job_id']), ('upload_job', '1'))
+        self.assertEqual(line['stages']['csv_read']['rows'], 4)
+
+
+class ServerTimingTests(EquipmentTestCase):
+    def test_upload_lists_the_job_stages(self):
+        text = csv_text([('P-1', 'Pump', 100, 5.0, 110.0)])
+        response = self.client.post('/api/upload/', {'file': csv_upload(text)}, format='multipart')
+        stages = server_timing(response)
+        for stage in ('spool', 'enqueue', 'csv_read', 'payload_write', 'statistics', 'json_encode'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages[-1], 'total')
+
+    @override_settings(EQUIPMENT_SERVER_TIMING=False)
+    def test_header_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/history/'))
+
+    def test_request_log_line(self):
+        with self.assertLogs('equipment.timing', 'INFO') as logs:
+            self.client.get('/api/history/')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['event'], line['route'], line['status']),
+                         ('request', 'api/history/', 200))
+
+
+class MetricsEndpointTests(EquipmentTestCase):
+    def test_counts_requests_by_route(self):
+        self.client.get('/api/history/')
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertRegex(response.content.decode(),
+                         r'equipment_http_requests_total\{method="GET",route="api/history/",status="200"\} \d+')
+
+    def test_restricted_to_allowed_addresses_and_staff(self):
+        self.client.logout()
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 403)
+        staff = User.objects.create_user('operator', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 200)
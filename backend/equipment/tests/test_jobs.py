@@ -0,0 +1,172 @@
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from equipment import jobs
+from equipment.jobs import (beat_jobs, claim_dataset, disown_jobs, fail_stale_jobs, own_jobs,
+                            release_dataset, spool_path)
+from equipment.models import EquipmentDataset, UploadJob
+
+from .base import EquipmentTestCase, SAMPLE_CSV, csv_upload
+
+
+class StaleJobTests(EquipmentTestCase):
+    def make_job(self, status=UploadJob.STATUS_PROCESSING, minutes_ago=0):
+        job = UploadJob.objects.create(user=self.user, filename='data.csv', status=status)
+        UploadJob.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=minutes_ago))
+        os.makedirs(os.path.dirname(spool_path(job.id)), exist_ok=True)
+        with open(spool_path(job.id), 'w') as f:
+            f.write('Equipment Name\n')
+        return job
+
+    def test_fails_only_jobs_without_heartbeat(self):
+        stale = [self.make_job(UploadJob.STATUS_QUEUED, 6), self.make_job(minutes_ago=90)]
+        running = self.make_job(minutes_ago=4)
+        done = self.make_job(UploadJob.STATUS_COMPLETED, 90)
+
+        self.assertEqual(fail_stale_jobs(), 2)
+        for job in stale:
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.phase), (UploadJob.STATUS_FAILED, 'failed'))
+            self.assertIn('interrupted', job.error)
+            self.assertFalse(os.path.exists(spool_path(job.id)))
+        for job in (running, done):
+            status = job.status
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+            self.assertTrue(os.path.exists(spool_path(job.id)))
+        self.assertEqual(fail_stale_jobs(), 0)
+
+    def test_polling_reports_stale_job_as_failed(self):
+        job = self.make_job(minutes_ago=10)
+        data = self.client.get(f'/api/jobs/{job.id}/').json()
+        self.assertEqual(data['status'], UploadJob.STATUS_FAILED)
+        self.assertIn('upload it again', data['error'])
+
+        with override_settings(EQUIPMENT_JOB_STALE_SECONDS=60 * 60):
+            job = self.make_job(minutes_ago=45)
+            self.assertEqual(self.client.get(f'/api/jobs/{job.id}/').json()['status'],
+                             UploadJob.STATUS_PROCESSING)
+
+    def test_management_command(self):
+        job = self.make_job(UploadJob.STATUS_QUEUED, 60)
+        out = StringIO()
+        call_command('fail_stale_jobs', stdout=out)
+        self.assertIn('Failed 1 stale job(s)', out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.STATUS_FAILED)
+
+    def own(self, job_ids):
+        # The heartbeat thread is not started; the tests beat by hand
+        with mock.patch.object(jobs, '_heartbeat_loop'):
+            own_jobs(job_ids)
+        self.addCleanup(disown_jobs, job_ids)
+
+    def test_heartbeat_keeps_owned_jobs_alive(self):
+        queued = self.make_job(UploadJob.STATUS_QUEUED, 10)
+        done = self.make_job(UploadJob.STATUS_COMPLETED, 10)
+        self.own([queued.id, done.id])
+
+        self.assertEqual(beat_jobs(), 1)
+        self.assertEqual(fail_stale_jobs(), 0)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, UploadJob.STATUS_QUEUED)
+        self.assertTrue(os.path.exists(spool_path(queued.id)))
+
+        disown_jobs([queued.id, done.id])
+        self.assertEqual(beat_jobs(), 0)
+
+    @override_settings(EQUIPMENT_ASYNC_UPLOADS=True)
+    def test_jobs_are_owned_from_queueing_to_completion(self):
+        executor = mock.Mock()
+        with open(SAMPLE_CSV) as f:
+            text = f.read()
+        with mock.patch.object(jobs, 'get_executor', return_value=executor), \
+                mock.patch.object(jobs, '_heartbeat_loop'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/upload/', {'file': csv_upload(text)},
+                                        format='multipart')
+        job = UploadJob.objects.get(id=response.json()['id'])
+        self.assertEqual(job.status, UploadJob.STATUS_QUEUED)
+        self.assertIn(job.id, jobs._owned_jobs)
+
+        # The worker runs the job and disowns it
+        _, func, *args = executor.submit.call_args.args
+        func(*args)
+        self.assertNotIn(job.id, jobs._owned_jobs)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.STATUS_COMPLETED)
+
+
+class JobPollingTests(EquipmentTestCase):
+    def test_completed_job(self):
+        with open(SAMPLE_CSV) as f:
+            response = self.client.post('/api/upload/', {'file': csv_upload(f.read(), 'plant.csv')},
+                                        format='multipart')
+        job_id = response.json()['id']
+        data = self.client.get(f'/api/jobs/{job_id}/').json()
+        self.assertEqual((data['status'], data['filename']), ('completed', 'plant.csv'))
+        self.assertEqual(data['rows_processed'], 60)
+        self.assertIsNotNone(data['dataset_id'])
+        # The spooled file is removed once processed
+        self.assertFalse(os.path.exists(spool_path(job_id)))
+
+    def test_jobs_of_other_users_are_hidden(self):
+        other = User.objects.create_user('operator')
+        job = UploadJob.objects.create(user=other, filename='data.csv')
+        self.assertEqual(self.client.get(f'/api/jobs/{job.id}/').status_code, 404)
+
+
+class AppendClaimTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        with open(SAMPLE_CSV) as f:
+            self.dataset = self.ingest(f.read())
+
+    def job(self, status=UploadJob.STATUS_PROCESSING):
+        return UploadJob.objects.create(user=self.user, filename='more.csv', status=status)
+
+    def holder(self):
+        self.dataset.refresh_from_db()
+        return self.dataset.append_job_id
+
+    def test_claim_and_release(self):
+        first, second = self.job(), self.job()
+        claim_dataset(first, self.dataset.id)
+        self.assertEqual(self.holder(), first.id)
+        # Only the holder's release counts
+        release_dataset(second, self.dataset.id)
+        self.assertEqual(self.holder(), first.id)
+        release_dataset(first, self.dataset.id)
+        self.assertIsNone(self.holder())
+        claim_dataset(second, self.dataset.id)
+        self.assertEqual(self.holder(), second.id)
+
+    def test_takes_over_abandoned_claims(self):
+        for status, minutes_ago in ((UploadJob.STATUS_FAILED, 0),
+                                    (UploadJob.STATUS_COMPLETED, 0),
+                                    (UploadJob.STATUS_PROCESSING, 10)):
+            abandoned = self.job(status)
+            UploadJob.objects.filter(id=abandoned.id).update(
+                heartbeat_at=timezone.now() - timedelta(minutes=minutes_ago))
+            EquipmentDataset.objects.filter(id=self.dataset.id).update(append_job=abandoned)
+            job = self.job()
+            claim_dataset(job, self.dataset.id)
+            self.assertEqual(self.holder(), job.id)
+
+    def test_append_job_releases_its_claim_on_failure(self):
+        with self.assertLogs('equipment.jobs', 'ERROR'):
+            response = self.client.post(
+                f'/api/dataset/{self.dataset.id}/append/',
+                {'file': csv_upload('Equipment Name,Type\nPump-9,Pump\n')}, format='multipart')
+        job = UploadJob.objects.get(id=response.json()['id'])
+        self.assertEqual(job.status, UploadJob.STATUS_FAILED)
+        self.assertIn('Missing required columns', job.error)
+        self.assertIsNone(self.holder())
@@ -0,0 +1,125 @@
+import random
+
+from django.http import QueryDict
+
+from equipment.models import EquipmentDataset, EquipmentRecord
+from equipment.pagination import (InvalidQueryError, SORT_FIELDS, encode_cursor,
+                                  filter_payload, filter_records, paginate_payload,
+                                  paginate_records)
+
+from .base import EquipmentTestCase, csv_text
+
+
+def generated_rows(seed=5, count=200):
+    """Rows with few distinct values, so most tie on the sort field, and some missing ones"""
+    rng = random.Random(seed)
+    choices = [1.5, 2.0, 2.5, None]
+    return [dict(row_index=i, equipment_name=f'E-{i}',
+                 equipment_type=rng.choice(['Pump', 'Valve']),
+                 flowrate=rng.choice(choices), pressure=rng.choice(choices),
+                 temperature=rng.choice(choices))
+            for i in range(count)]
+
+
+class PaginationTestsMixin:
+    """Paging checks shared by datasets stored as records and as payloads"""
+    def expected_order(self, rows, ordering):
+        field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        if field == 'row_index':
+            return sorted((r['row_index'] for r in rows), reverse=descending)
+        # Missing values last in both directions, ties by row_index
+        present = sorted((r for r in rows if r[field] is not None),
+                         key=lambda r: (-r[field] if descending else r[field], r['row_index']))
+        missing = sorted(r['row_index'] for r in rows if r[field] is None)
+        return [r['row_index'] for r in present] + missing
+
+    def collect(self, ordering, limit, params=''):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = self.page(ordering, cursor=cursor, limit=limit, params=params)
+            self.assertLessEqual(len(rows), limit)
+            seen += [row['row_index'] for row in rows]
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_every_row_once(self):
+        for field in SORT_FIELDS:
+            for ordering in (field, f'-{field}'):
+                for limit in (1, 7, 50, 200, 500):
+                    with self.subTest(ordering=ordering, limit=limit):
+                        self.assertEqual(self.collect(ordering, limit),
+                                         self.expected_order(self.rows, ordering))
+
+    def test_pages_with_filters(self):
+        matching = [r for r in self.rows
+                    if r['equipment_type'] == 'Pump'
+                    and r['pressure'] is not None and r['pressure'] >= 2
+                    and r['temperature'] is not None and r['temperature'] <= 2.0]
+        self.assertEqual(self.collect('-flowrate', 3, 'type=Pump&min_pressure=2&max_temperature=2.0'),
+                         self.expected_order(matching, '-flowrate'))
+
+    def test_rows_carry_every_field(self):
+        rows, _ = self.page('-pressure', limit=200)
+        by_index = {row['row_index']: row for row in self.rows}
+        self.assertEqual(rows, [by_index[row['row_index']] for row in rows])
+
+    def test_cursor_must_match_ordering(self):
+        cursor = encode_cursor('pressure', {'pressure': 2.0, 'row_index': 4})
+        with self.assertRaises(InvalidQueryError):
+            self.page('-pressure', cursor=cursor)
+        with self.assertRaises(InvalidQueryError):
+            self.page('pressure', cursor='not-a-cursor')
+        with self.assertRaises(InvalidQueryError):
+            self.page('equipment_name')
+        with self.assertRaises(InvalidQueryError):
+            self.page('pressure', params='min_flowrate=fast')
+
+    def test_rows_endpoint_follows_next(self):
+        url = f'/api/dataset/{self.dataset.id}/rows/'
+        seen, params = [], {'ordering': '-temperature', 'limit': 30}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data['count'], 200)
+            seen += [row['row_index'] for row in data['results']]
+            if not data['next']:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(seen, self.expected_order(self.rows, '-temperature'))
+
+        response = self.client.get(url, {'ordering': 'temperature', 'cursor': params['cursor']})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecordPaginationTests(PaginationTestsMixin, EquipmentTestCase):
+    """Datasets stored before payloads existed are paged in the database"""
+    def setUp(self):
+        super().setUp()
+        self.rows = generated_rows()
+        self.dataset = EquipmentDataset.objects.create(
+            user=self.user, filename='ties.csv', total_count=200,
+            equipment_type_distribution='{}', is_ready=True)
+        EquipmentRecord.objects.bulk_create([
+            EquipmentRecord(dataset=self.dataset, **row)
+            for row in random.Random(5).sample(self.rows, len(self.rows))
+        ])
+
+    def page(self, ordering, cursor=None, limit=100, params=''):
+        records = filter_records(self.dataset.records.all(), QueryDict(params))
+        return paginate_records(records, ordering, cursor=cursor, limit=limit)
+
+
+class PayloadPaginationTests(PaginationTestsMixin, EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rows = generated_rows()
+        self.dataset = self.ingest(csv_text(
+            [(r['equipment_name'], r['equipment_type'], r['flowrate'], r['pressure'],
+              r['temperature']) for r in self.rows]))
+        self.payload = self.dataset.get_payload()
+
+    def page(self, ordering, cursor=None, limit=100, params=''):
+        indices = filter_payload(self.payload, QueryDict(params))
+        return paginate_payload(self.payload, indices, ordering, cursor=cursor, limit=limit)
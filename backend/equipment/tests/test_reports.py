@@ -0,0 +1,59 @@
+import glob
+import io
+import os
+
+from django.conf import settings
+
+from equipment.ingest import append_csv
+from equipment.models import EquipmentDataset
+from equipment.reports import _build_cached_report, report_path, report_version
+
+from .base import EquipmentTestCase, SAMPLE_CSV, csv_text
+
+
+class ReportVersionTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        with open(SAMPLE_CSV) as f:
+            self.dataset = self.ingest(f.read())
+
+    def reports(self):
+        return sorted(os.path.basename(p)
+                      for p in glob.glob(os.path.join(settings.EQUIPMENT_REPORT_DIR, '*.pdf')))
+
+    def test_append_changes_the_report_path(self):
+        stale = EquipmentDataset.objects.get(id=self.dataset.id)
+        old_path = _build_cached_report(self.dataset.id, 'summary')
+        self.assertEqual(old_path, report_path(stale, 'summary'))
+
+        append_csv(self.dataset, io.StringIO(csv_text([('Pump-99', 'Pump', 100, 5, 110)])))
+        self.assertNotEqual(report_path(self.dataset, 'summary'), old_path)
+        self.assertGreater(report_version(self.dataset), report_version(stale))
+
+        # A build requested before the append shows, and is stored under, the new version
+        path = _build_cached_report(stale.id, 'summary')
+        self.assertEqual(path, report_path(self.dataset, 'summary'))
+        self.assertEqual(self.reports(), [os.path.basename(path)])
+
+    def test_modes_are_kept_apart(self):
+        summary = _build_cached_report(self.dataset.id, 'summary')
+        full = _build_cached_report(self.dataset.id, 'full')
+        self.assertEqual(self.reports(), sorted(os.path.basename(p) for p in (summary, full)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dataset.delete()
+        self.assertEqual(self.reports(), [])
+
+    def test_endpoint_serves_the_cached_report(self):
+        path = _build_cached_report(self.dataset.id, 'detailed')
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/pdf/', {'mode': 'detailed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(f'report_{self.dataset.id}_detailed.pdf', response['Content-Disposition'])
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF'))
+        with open(path, 'rb') as f:
+            self.assertEqual(content, f.read())
+
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/pdf/', {'mode': 'poster'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/dataset/999/pdf/').status_code, 404)
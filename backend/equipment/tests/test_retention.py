@@ -0,0 +1,84 @@
+import os
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from equipment.models import EquipmentDataset
+from equipment.retention import expired_datasets, prune_datasets
+from equipment.storage import payload_path
+
+from .base import EquipmentTestCase, SAMPLE_CSV, csv_upload
+
+
+class RetentionTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('operator')
+        now = timezone.now()
+        self.datasets = {}
+        for user in (self.user, self.other):
+            for days_ago in (0, 1, 2, 10, 40):
+                dataset = EquipmentDataset.objects.create(
+                    user=user, filename=f'{days_ago}.csv', total_count=0,
+                    equipment_type_distribution='{}', is_ready=True)
+                EquipmentDataset.objects.filter(id=dataset.id).update(
+                    uploaded_at=now - timedelta(days=days_ago))
+                self.datasets[user.username, days_ago] = dataset.id
+        # Still being stored, never pruned
+        self.hidden = EquipmentDataset.objects.create(
+            user=self.user, filename='new.csv', total_count=0,
+            equipment_type_distribution='{}', is_ready=False).id
+
+    def remaining(self, user):
+        return sorted(int(name.split('.')[0]) for name in EquipmentDataset.objects.ready().filter(
+            user=user).values_list('filename', flat=True))
+
+    def test_keeps_newest_per_user(self):
+        self.assertEqual(prune_datasets(keep=2), 6)
+        self.assertEqual(self.remaining(self.user), [0, 1])
+        self.assertEqual(self.remaining(self.other), [0, 1])
+        self.assertTrue(EquipmentDataset.objects.filter(id=self.hidden).exists())
+
+    def test_single_user_and_max_age(self):
+        self.assertEqual(prune_datasets(user=self.user, keep=4, max_age_days=5), 2)
+        self.assertEqual(self.remaining(self.user), [0, 1, 2])
+        self.assertEqual(self.remaining(self.other), [0, 1, 2, 10, 40])
+
+    def test_dry_run_and_disabled_policy(self):
+        self.assertEqual(prune_datasets(max_age_days=30, dry_run=True), 2)
+        self.assertEqual(expired_datasets(max_age_days=30).count(), 2)
+        self.assertEqual(EquipmentDataset.objects.count(), 11)
+        with override_settings(EQUIPMENT_RETENTION={'KEEP_PER_USER': None, 'MAX_AGE_DAYS': None}):
+            self.assertEqual(prune_datasets(), 0)
+        self.assertEqual(EquipmentDataset.objects.count(), 11)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('prune_datasets', '--keep=3', '--user=operator', stdout=out)
+        self.assertIn('Deleted 2 dataset(s)', out.getvalue())
+        self.assertEqual(self.remaining(self.other), [0, 1, 2])
+        self.assertEqual(len(self.remaining(self.user)), 5)
+
+
+@override_settings(EQUIPMENT_RETENTION={'KEEP_PER_USER': 2, 'MAX_AGE_DAYS': None})
+class UploadRetentionTests(EquipmentTestCase):
+    def test_upload_prunes_and_removes_payloads(self):
+        with open(SAMPLE_CSV) as f:
+            text = f.read()
+        payloads = []
+        for i in range(3):
+            # Distinct files, so none is answered as a duplicate
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/upload/', {'file': csv_upload(text + f'P-{i},Pump,1,1,1\n')},
+                                 format='multipart')
+            payloads.append(EquipmentDataset.objects.latest('id').payload)
+
+        self.assertEqual(EquipmentDataset.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(os.path.exists(payload_path(payloads[0])))
+        self.assertTrue(all(os.path.exists(payload_path(name)) for name in payloads[1:]))
+        history = self.client.get('/api/history/').json()
+        self.assertEqual(len(history), 2)
@@ -0,0 +1,148 @@
+import os
+import shutil
+
+from django.contrib.auth.models import User
+
+from equipment.ingest import parse_csv
+from equipment.models import EquipmentDataset, SharedPayload, UploadJob
+from equipment.retention import prune_datasets
+from equipment.sharing import acquire_payload, publish_payload, release_payload, take_payload
+from equipment.storage import content_payload_name, payload_path
+
+from .base import EquipmentTestCase, SAMPLE_CSV, csv_upload
+
+
+HASH = 'ef' * 32
+
+
+class SharedPayloadTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        with open(SAMPLE_CSV) as f:
+            self.text = f.read()
+        self.other_user = User.objects.create_user('operator')
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(payload_path(name), 'meta.json'))
+
+    def delete(self, dataset):
+        # Payloads are released once the deletion commits
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset.delete()
+
+    def test_deleting_one_of_two_datasets_keeps_the_files(self):
+        first = self.ingest(self.text, content_hash=HASH)
+        second = self.ingest(self.text, user=self.other_user, content_hash=HASH)
+        name = content_payload_name(HASH)
+        self.assertEqual((first.payload, second.payload), (name, name))
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 2)
+
+        self.delete(first)
+        self.assertTrue(self.exists(name))
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 1)
+        self.assertEqual(second.get_payload().rows, second.total_count)
+
+        self.delete(second)
+        self.assertFalse(os.path.exists(payload_path(name)))
+        self.assertFalse(SharedPayload.objects.filter(name=name).exists())
+
+    def test_retention_releases_shared_payloads(self):
+        for i in range(3):
+            self.ingest(self.text, content_hash=HASH)
+        name = content_payload_name(HASH)
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            prune_datasets(user=self.user, keep=1)
+        self.assertEqual(EquipmentDataset.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 1)
+        self.assertTrue(self.exists(name))
+
+    def test_private_payload_deleted_with_its_dataset(self):
+        dataset = self.ingest(self.text)
+        self.assertFalse(SharedPayload.objects.filter(name=dataset.payload).exists())
+        self.delete(dataset)
+        self.assertFalse(os.path.exists(payload_path(dataset.payload)))
+
+    def test_no_reference_to_a_released_payload(self):
+        dataset = self.ingest(self.text, content_hash=HASH)
+        name = dataset.payload
+        self.assertTrue(acquire_payload(name))
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 2)
+        release_payload(name)
+
+        # Once the count reaches zero the payload can no longer be taken
+        SharedPayload.objects.filter(name=name).update(refs=0)
+        self.assertFalse(acquire_payload(name))
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 0)
+        self.assertFalse(acquire_payload(content_payload_name('00' * 32)))
+
+    def test_no_reference_to_missing_files(self):
+        dataset = self.ingest(self.text, content_hash=HASH)
+        shutil.rmtree(payload_path(dataset.payload))
+        self.assertFalse(acquire_payload(dataset.payload))
+        self.assertEqual(SharedPayload.objects.get(name=dataset.payload).refs, 1)
+
+        # The next upload of the content is parsed again
+        other = self.ingest(self.text, user=self.other_user, content_hash=HASH)
+        self.assertNotEqual(other.payload, dataset.payload)
+        self.assertTrue(self.exists(other.payload))
+
+    def test_take_over_only_the_last_reference(self):
+        first = self.ingest(self.text, content_hash=HASH)
+        self.ingest(self.text, user=self.other_user, content_hash=HASH)
+        self.assertIsNone(take_payload(first.payload))
+        self.assertEqual(SharedPayload.objects.get(name=first.payload).refs, 2)
+
+        release_payload(first.payload)
+        private = take_payload(first.payload)
+        self.assertTrue(self.exists(private))
+        self.assertFalse(os.path.exists(payload_path(first.payload)))
+        self.assertFalse(SharedPayload.objects.exists())
+
+    def test_publish_reuses_the_shared_payload(self):
+        name = publish_payload(parse_csv(SAMPLE_CSV)['payload'], HASH)
+        self.assertEqual(name, content_payload_name(HASH))
+
+        duplicate = parse_csv(SAMPLE_CSV)['payload']
+        self.assertEqual(publish_payload(duplicate, HASH), name)
+        self.assertFalse(os.path.exists(payload_path(duplicate)))
+        self.assertEqual(SharedPayload.objects.get(name=name).refs, 2)
+
+    def test_publish_while_released_keeps_a_private_payload(self):
+        name = publish_payload(parse_csv(SAMPLE_CSV)['payload'], HASH)
+        SharedPayload.objects.filter(name=name).update(refs=0)
+
+        private = parse_csv(SAMPLE_CSV)['payload']
+        self.assertEqual(publish_payload(private, HASH), private)
+        self.assertTrue(self.exists(private))
+
+    def test_publish_replaces_leftover_files(self):
+        leftover = content_payload_name(HASH)
+        os.makedirs(payload_path(leftover))
+        with open(os.path.join(payload_path(leftover), 'flowrate.f8'), 'wb') as f:
+            f.write(b'partial')
+
+        name = publish_payload(parse_csv(SAMPLE_CSV)['payload'], HASH)
+        self.assertEqual(name, leftover)
+        self.assertTrue(self.exists(name))
+        self.assertEqual(os.path.getsize(os.path.join(payload_path(name), 'flowrate.f8')),
+                         len(self.text.strip().splitlines()[1:]) * 8)
+
+    def test_duplicate_uploads_through_the_api(self):
+        def upload(client):
+            response = client.post('/api/upload/', {'file': csv_upload(self.text)},
+                                   format='multipart')
+            return UploadJob.objects.get(id=response.json()['id'])
+
+        job = upload(self.client)
+        self.assertEqual(job.status, UploadJob.STATUS_COMPLETED)
+        # The same user gets the same dataset back
+        again = upload(self.client)
+        self.assertEqual((again.phase, again.dataset_id), ('duplicate', job.dataset_id))
+
+        self.client.force_authenticate(self.other_user)
+        theirs = upload(self.client)
+        self.assertNotEqual(theirs.dataset_id, job.dataset_id)
+        self.assertEqual(theirs.dataset.payload, job.dataset.payload)
+        self.assertEqual(SharedPayload.objects.get(name=job.dataset.payload).refs, 2)
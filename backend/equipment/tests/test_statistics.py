@@ -0,0 +1,118 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from equipment.statistics import (PERCENTILES, compute_statistics, grouped_statistics,
+                                  merge_moments, update_statistics)
+
+
+class GroupedStatisticsTests(SimpleTestCase):
+    def test_matches_numpy_per_group(self):
+        rng = np.random.default_rng(1)
+        values = rng.normal(50, 10, 500)
+        values[rng.choice(500, 40, replace=False)] = np.nan
+        codes = rng.integers(0, 3, 500)
+
+        for group, stats in enumerate(grouped_statistics(values, codes, 4)):
+            group_values = values[codes == group]
+            valid = group_values[~np.isnan(group_values)]
+            if group == 3:
+                self.assertEqual(stats['count'], 0)
+                self.assertIsNone(stats['mean'])
+                continue
+            self.assertEqual(stats['count'], len(valid))
+            self.assertEqual(stats['null_count'], len(group_values) - len(valid))
+            self.assertAlmostEqual(stats['mean'], valid.mean())
+            self.assertAlmostEqual(stats['std'], valid.std(ddof=1))
+            self.assertEqual(stats['min'], valid.min())
+            self.assertEqual(stats['max'], valid.max())
+            for q in PERCENTILES:
+                self.assertAlmostEqual(stats[f'p{q}'], np.percentile(valid, q))
+
+    def test_single_value_has_no_std(self):
+        stats = grouped_statistics(np.array([4.0]), np.array([0]), 1)[0]
+        self.assertIsNone(stats['std'])
+        self.assertEqual(stats['p50'], 4.0)
+
+
+class ComputeStatisticsTests(SimpleTestCase):
+    def test_overall_and_per_type(self):
+        values = np.array([1.0, 2.0, np.nan, 4.0, 8.0])
+        codes = np.array([0, 1, 0, -1, 1])
+        statistics = compute_statistics({'Flowrate': values}, codes, ['Pump', 'Valve', 'Tank'])
+
+        self.assertEqual(statistics['percentiles'], list(PERCENTILES))
+        overall = statistics['columns']['Flowrate']
+        self.assertEqual((overall['count'], overall['null_count']), (4, 1))
+        self.assertEqual(overall['mean'], 3.75)
+        # Rows without a type only count overall
+        self.assertEqual(statistics['by_type']['Pump']['Flowrate']['count'], 1)
+        self.assertEqual(statistics['by_type']['Pump']['Flowrate']['null_count'], 1)
+        self.assertEqual(statistics['by_type']['Valve']['Flowrate']['p50'], 5.0)
+        self.assertEqual(statistics['by_type']['Tank']['Flowrate']['count'], 0)
+        self.assertIsNone(statistics['by_type']['Tank']['Flowrate']['min'])
+
+
+class MergedStatisticsTests(SimpleTestCase):
+    """Statistics merged after an append equal those computed over all rows"""
+    def assertStatisticsEqual(self, merged, full):
+        self.assertEqual(merged['percentiles'], full['percentiles'])
+        self.assertEqual(set(merged['by_type']), set(full['by_type']))
+        pairs = [(merged['columns'], full['columns'])]
+        pairs += [(merged['by_type'][name], full['by_type'][name]) for name in full['by_type']]
+        for merged_columns, full_columns in pairs:
+            for column, expected in full_columns.items():
+                for name, value in expected.items():
+                    actual = merged_columns[column][name]
+                    if value is None:
+                        self.assertIsNone(actual, f'{column} {name}')
+                    else:
+                        self.assertAlmostEqual(actual, value, places=6, msg=f'{column} {name}')
+
+    def random_columns(self, rng, n):
+        columns = {
+            'Flowrate': rng.normal(120, 30, n),
+            'Pressure': rng.normal(6, 1.5, n) * 1e6,
+            'Temperature': rng.uniform(80, 150, n),
+        }
+        for values in columns.values():
+            values[rng.random(n) < 0.05] = np.nan
+        return columns
+
+    def test_update_equals_recompute(self):
+        rng = np.random.default_rng(7)
+        type_names = ['Pump', 'Valve', 'Compressor']
+        columns = self.random_columns(rng, 1000)
+        codes = rng.integers(-1, 3, 1000)
+
+        for start in (1, 600, 999):
+            # 'Compressor' (code 2) only appears in the appended rows
+            old_codes = codes[:start].copy()
+            old_codes[old_codes == 2] = -1
+            all_codes = np.concatenate((old_codes, codes[start:]))
+            old = compute_statistics({c: v[:start] for c, v in columns.items()},
+                                     old_codes, type_names[:2])
+            merged = update_statistics(old, columns, all_codes, type_names, start)
+            self.assertStatisticsEqual(merged, compute_statistics(columns, all_codes, type_names))
+
+    def test_repeated_appends_stay_exact(self):
+        rng = np.random.default_rng(3)
+        type_names = ['Pump', 'Valve']
+        columns = self.random_columns(rng, 3000)
+        codes = rng.integers(0, 2, 3000)
+
+        bounds = [10, 11, 500, 1700, 3000]
+        statistics = compute_statistics({c: v[:10] for c, v in columns.items()},
+                                        codes[:10], type_names)
+        for start, stop in zip(bounds, bounds[1:]):
+            statistics = update_statistics(statistics, {c: v[:stop] for c, v in columns.items()},
+                                           codes[:stop], type_names, start)
+        self.assertStatisticsEqual(statistics, compute_statistics(columns, codes, type_names))
+
+    def test_merge_with_empty_side(self):
+        stats = grouped_statistics(np.array([1.0, 2.0, 3.0]), np.zeros(3, dtype=int), 1)[0]
+        empty = grouped_statistics(np.array([np.nan]), np.zeros(1, dtype=int), 1)[0]
+        merged = merge_moments(stats, empty)
+        self.assertEqual(merged['count'], 3)
+        self.assertEqual(merged['null_count'], 1)
+        self.assertEqual((merged['mean'], merged['min'], merged['max']), (2.0, 1.0, 3.0))
+        self.assertEqual(merge_moments(empty, stats)['std'], stats['std'])
@@ -0,0 +1,115 @@
+import errno
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from equipment.storage import (ColumnarPayload, PayloadWriter, copy_payload, new_payload_name,
+                               payload_path)
+
+from .base import EquipmentTestCase, SAMPLE_CSV
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['Equipment Name', 'Type', 'Flowrate', 'Pressure',
+                                       'Temperature'])
+
+
+ROWS = [
+    ('Pump-1', 'Pump', 120.5, 5.2, 110.0),
+    (None, 'Valve', None, 4.5, 100.0),
+    ('Kühler-2', None, 95.0, None, 125.0),
+    ('', 'Pump', 1e12, -3.0, None),
+]
+
+
+class PayloadTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write(self, *chunks):
+        writer = PayloadWriter(new_payload_name())
+        for chunk in chunks:
+            writer.append(frame(chunk))
+        writer.close()
+        return ColumnarPayload(writer.name)
+
+    def test_round_trip(self):
+        payload = self.write(ROWS[:3], ROWS[3:])
+        self.assertEqual(payload.rows, 4)
+        self.assertEqual(payload.type_names, ['Pump', 'Valve'])
+        self.assertEqual(payload.type_codes.tolist(), [0, 1, -1, 0])
+        self.assertEqual(payload.names(), ['Pump-1', None, 'Kühler-2', ''])
+        self.assertEqual(payload.names(1, 3), [None, 'Kühler-2'])
+        np.testing.assert_array_equal(payload.column('Flowrate'), [120.5, np.nan, 95.0, 1e12])
+        self.assertIsInstance(payload.column('Pressure'), np.memmap)
+        self.assertEqual(payload.to_records(), [dict(zip(
+            ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'], row))
+            for row in ROWS])
+        self.assertEqual(payload.take([0, 2])['Equipment Name'].tolist(), ['Pump-1', 'Kühler-2'])
+        frames = list(payload.iter_frames(chunk_size=3))
+        self.assertEqual([len(f) for f in frames], [3, 1])
+
+    def test_append_and_abort(self):
+        name = self.write(ROWS[:2]).name
+        writer = PayloadWriter(name, append=True)
+        writer.append(frame(ROWS[2:]))
+        writer.close()
+        payload = ColumnarPayload(name)
+        self.assertEqual(payload.rows, 4)
+        self.assertEqual(payload.names(), ['Pump-1', None, 'Kühler-2', ''])
+
+        writer = PayloadWriter(name, append=True)
+        writer.append(frame([('Tank-1', 'Tank', 1.0, 2.0, 3.0)]))
+        writer.abort()
+        payload = ColumnarPayload(name)
+        self.assertEqual(payload.rows, 4)
+        self.assertEqual(payload.type_names, ['Pump', 'Valve'])
+        self.assertEqual(os.path.getsize(os.path.join(payload.directory, 'flowrate.f8')), 32)
+        self.assertEqual(os.path.getsize(os.path.join(payload.directory, 'names.utf8')),
+                         len('Pump-1Kühler-2'.encode()))
+
+    def test_abort_of_new_payload_removes_it(self):
+        writer = PayloadWriter(new_payload_name())
+        writer.append(frame(ROWS))
+        writer.abort()
+        self.assertFalse(os.path.exists(payload_path(writer.name)))
+
+    def test_empty_payload(self):
+        payload = self.write()
+        self.assertEqual(payload.rows, 0)
+        self.assertEqual(len(payload.column('Flowrate')), 0)
+        self.assertEqual(payload.names(), [])
+
+    def test_copy(self):
+        payload = self.write(ROWS)
+        unsupported = OSError(errno.EXDEV, 'Invalid cross-device link')
+        for side_effect in (None, unsupported):
+            with self.subTest(copy_file_range=side_effect), \
+                    mock.patch('os.copy_file_range', side_effect=side_effect,
+                               wraps=None if side_effect else os.copy_file_range):
+                copy = ColumnarPayload(copy_payload(payload.name))
+                self.assertEqual(copy.names(), payload.names())
+                np.testing.assert_array_equal(copy.column('Pressure'), payload.column('Pressure'))
+                self.assertEqual(sorted(os.listdir(copy.directory)),
+                                 sorted(os.listdir(payload.directory)))
+
+
+class DatasetPayloadTests(EquipmentTestCase):
+    def test_dataset_reads_its_payload(self):
+        with open(SAMPLE_CSV) as f:
+            dataset = self.ingest(f.read())
+        payload = dataset.get_payload()
+        self.assertTrue(payload.directory.startswith(settings.MEDIA_ROOT))
+        expected = pd.read_csv(SAMPLE_CSV)
+        self.assertEqual(payload.rows, len(expected))
+        self.assertEqual(dataset.get_raw_data(), expected.to_dict('records'))
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from equipment.timeseries import NANOSECONDS, ROLLUP_FIELDS, TimeSeries, parse_time
+
+from .base import EquipmentTestCase, csv_text
+
+
+HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature,Time'
+START = pd.Timestamp('2024-03-01T22:30:00Z')
+
+
+class TimeSeriesTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(4)
+        rows = []
+        # Three pumps read every 7 s for about 5 hours, across midnight, in shuffled order
+        for name in ('Pump-B', 'Pump-A', 'Pump-C'):
+            for step in range(2600):
+                flowrate = None if rng.random() < 0.05 else round(float(rng.normal(100, 10)), 3)
+                rows.append((name, 'Pump', flowrate, round(float(rng.normal(5, 1)), 3),
+                             round(float(rng.normal(120, 5)), 3),
+                             (START + pd.Timedelta(seconds=7 * step)).isoformat()))
+        rng.shuffle(rows)
+        self.readings = pd.DataFrame(rows, columns=HEADER.split(','))
+        self.readings['Flowrate'] = self.readings['Flowrate'].astype(float)
+        self.readings['ns'] = pd.to_datetime(self.readings['Time'], utc=True).to_numpy(
+            dtype='datetime64[ns]').view(np.int64)
+        self.dataset = self.ingest(csv_text(rows, header=HEADER), timestamp_column='Time')
+        self.series = TimeSeries(self.dataset.get_payload())
+
+    def test_readings_sorted_by_equipment_and_time(self):
+        self.assertTrue(self.dataset.is_timeseries)
+        self.assertEqual(self.series.equipment, ['Pump-A', 'Pump-B', 'Pump-C'])
+        self.assertEqual(self.series.starts['raw'], [0, 2600, 5200, 7800])
+        times = np.asarray(self.dataset.get_payload().timestamps)
+        for i in range(3):
+            self.assertTrue((np.diff(times[i * 2600:(i + 1) * 2600]) > 0).all())
+
+    def test_readings_are_kept_in_the_payload_only(self):
+        self.assertFalse(self.dataset.records.exists())
+        response = self.client.get(f'/api/dataset/{self.dataset.id}/rows/',
+                                   {'ordering': '-flowrate', 'limit': 5})
+        data = response.json()
+        self.assertEqual(data['count'], len(self.readings))
+        self.assertEqual([row['Flowrate'] for row in data['results']],
+                         self.readings['Flowrate'].nlargest(5).tolist())
+
+    def test_rollups_match_groupby(self):
+        for resolution, seconds in self.series.rollups.items():
+            width = seconds * NANOSECONDS
+            readings = self.readings.assign(bucket=self.readings['ns'] // width * width)
+            grouped = readings.groupby(['Equipment Name', 'bucket'], sort=True)
+            level = self.series.rollup(resolution)
+            with self.subTest(resolution=resolution):
+                self.assertEqual(len(level), grouped.ngroups)
+                keys = [(self.series.equipment[e], t) for e, t in zip(level['equipment'], level['time'])]
+                self.assertEqual(keys, list(grouped.groups))
+                self.assertEqual(level['count'].tolist(), grouped.size().tolist())
+                for column, prefix in ROLLUP_FIELDS.items():
+                    np.testing.assert_allclose(level[f'{prefix}_min'], grouped[column].min())
+                    np.testing.assert_allclose(level[f'{prefix}_max'], grouped[column].max())
+                    np.testing.assert_allclose(level[f'{prefix}_mean'], grouped[column].mean())
+                    self.assertEqual(level[f'{prefix}_count'].tolist(),
+                                     grouped[column].count().tolist())
+
+    def test_query_returns_raw_readings_when_they_fit(self):
+        start = parse_time('2024-03-01T23:00:00Z')
+        end = parse_time('2024-03-01T23:10:00')
+        result = self.series.query('Pump-B', start, end, points=1000)
+        self.assertEqual(result['resolution'], 'raw')
+        expected = self.readings[(self.readings['Equipment Name'] == 'Pump-B')
+                                 & (self.readings['ns'] >= start) & (self.readings['ns'] <= end)]
+        expected = expected.sort_values('ns')
+        self.assertEqual(result['time'], (expected['ns'] // 10 ** 6).tolist())
+        np.testing.assert_allclose(result['series']['Pressure']['value'], expected['Pressure'])
+
+    def test_query_picks_finest_rollup_within_budget(self):
+        start = parse_time('2024-03-01T23:00:30Z')
+        result = self.series.query('Pump-A', start, None, points=300, columns=['Temperature'])
+        # About 230 one-minute buckets remain after ``start``
+        self.assertEqual(result['resolution'], '1m')
+        self.assertEqual(list(result['series']), ['Temperature'])
+        self.assertEqual(result['time'][0], parse_time('2024-03-01T23:00:00Z') // 10 ** 6)
+        after = self.readings[(self.readings['Equipment Name'] == 'Pump-A')
+                              & (self.readings['ns'] >= parse_time('2024-03-01T23:00:00Z'))]
+        self.assertEqual(int(result['count'].sum()), len(after))
+
+        result = self.series.query('Pump-A', points=10)
+        self.assertEqual(result['resolution'], '1h')
+        self.assertEqual(int(result['count'].sum()), 2600)
+
+    def test_endpoint(self):
+        url = f'/api/dataset/{self.dataset.id}/timeseries/'
+        data = self.client.get(url).json()
+        self.assertEqual([e['name'] for e in data['equipment']], ['Pump-A', 'Pump-B', 'Pump-C'])
+        self.assertEqual(data['equipment'][0]['readings'], 2600)
+        self.assertEqual(data['equipment'][0]['first'], START.value // 10 ** 6)
+
+        response = self.client.get(url, {'equipment': 'Pump-C', 'points': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resolution'], '1d')
+        self.assertEqual(self.client.get(url, {'equipment': 'Pump-Z'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
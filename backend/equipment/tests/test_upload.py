@@ -0,0 +1,57 @@
+import pandas as pd
+from django.test import override_settings
+
+from equipment.models import EquipmentDataset, EquipmentRecord, UploadJob
+
+from .base import EquipmentTestCase, SAMPLE_CSV, csv_text, csv_upload
+
+
+class UploadTests(EquipmentTestCase):
+    def upload(self, text, **data):
+        response = self.client.post('/api/upload/', {'file': csv_upload(text), **data},
+                                    format='multipart')
+        return response, UploadJob.objects.get(id=response.json()['id'])
+
+    @override_settings(EQUIPMENT_UPLOAD_CHUNK_SIZE=7)
+    def test_summary_matches_the_whole_file(self):
+        with open(SAMPLE_CSV) as f:
+            text = f.read()
+        response, job = self.upload(text)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((job.status, job.phase), (UploadJob.STATUS_COMPLETED, 'done'))
+
+        frame = pd.read_csv(SAMPLE_CSV)
+        summary = self.client.get(f'/api/summary/{job.dataset_id}/').json()['summary']
+        self.assertEqual(summary['total_count'], len(frame))
+        self.assertEqual(job.rows_processed, len(frame))
+        self.assertAlmostEqual(summary['avg_flowrate'], frame['Flowrate'].mean())
+        self.assertAlmostEqual(summary['avg_pressure'], frame['Pressure'].mean())
+        self.assertAlmostEqual(summary['avg_temperature'], frame['Temperature'].mean())
+        self.assertEqual(summary['equipment_type_distribution'],
+                         frame['Type'].value_counts().to_dict())
+        # The rows are kept in the payload only
+        self.assertEqual(job.dataset.get_payload().rows, len(frame))
+        self.assertFalse(EquipmentRecord.objects.exists())
+
+    @override_settings(EQUIPMENT_UPLOAD_CHUNK_SIZE=2)
+    def test_missing_values_are_skipped(self):
+        rows = [('P-1', 'Pump', 10, None, 100), ('P-2', None, None, 4, 100),
+                ('V-1', 'Valve', 30, 6, None)]
+        _, job = self.upload(csv_text(rows))
+        dataset = job.dataset
+        self.assertEqual(dataset.total_count, 3)
+        self.assertEqual((dataset.avg_flowrate, dataset.avg_pressure, dataset.avg_temperature),
+                         (20.0, 5.0, 100.0))
+        self.assertEqual(dataset.get_equipment_type_distribution(), {'Pump': 1, 'Valve': 1})
+
+    def test_missing_columns_fail_the_job(self):
+        with self.assertLogs('equipment.jobs', 'ERROR'):
+            _, job = self.upload('Equipment Name,Type,Flowrate\nP-1,Pump,1\n')
+        self.assertEqual(job.status, UploadJob.STATUS_FAILED)
+        self.assertEqual(job.error, 'Missing required columns: Pressure, Temperature')
+        self.assertFalse(EquipmentDataset.objects.exists())
+
+    def test_requires_a_file(self):
+        response = self.client.post('/api/upload/', {}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'No file provided'})
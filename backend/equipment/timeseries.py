@@ -0,0 +1,294 @@
+"""
+Time-series datasets: readings sorted by (equipment, time) with rollups.
+
+An upload with a ``timestamp_column`` keeps every reading's timestamp in its
+payload. Once parsed, the readings are rewritten grouped by equipment (in
+name order) and by time within each equipment, so the readings of one
+piece of equipment in a time range are a contiguous slice found by binary
+search. The payload directory then also holds:
+
+    timeseries.json    equipment names, where each one's readings and
+                       rollup buckets start, and the rollup resolutions
+    rollup.<res>.npy   one record per (equipment, bucket): bucket start,
+                       reading count and min/max/mean/count per column
+
+Rollups are built finest first (1 minute from the readings, 1 hour from
+the minutes, ...), so each level costs time proportional to the one below.
+EQUIPMENT_TIMESERIES_ROLLUPS must therefore be ordered finest first, with
+every resolution a multiple of the previous one.
+
+A range query returns raw readings when they fit the point budget, and
+otherwise the finest rollup that does. The readings are stored only in
+these arrays, never as EquipmentRecord rows: a time series can hold far
+more readings than the database should carry one row each for.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .pagination import InvalidQueryError
+from .storage import (NUMERIC_FILES, ColumnarPayload, PayloadWriter, delete_payload,
+                      new_payload_name, payload_path)
+
+
+INFO_FILE = 'timeseries.json'
+ROLLUP_STATS = ('min', 'max', 'mean')
+NANOSECONDS = 10 ** 9
+
+# CSV column -> prefix of its rollup fields
+ROLLUP_FIELDS = {column: column.lower() for column in NUMERIC_FILES}
+
+
+class InvalidReadingsError(ValueError):
+    """Raised when time-series readings lack an equipment name or a timestamp"""
+
+
+def parse_timestamps(values):
+    """Parse a column of timestamps as UTC; naive values are taken to be UTC"""
+    try:
+        timestamps = pd.to_datetime(values, utc=True)
+    except (ValueError, TypeError) as e:
+        raise InvalidReadingsError(f'Invalid timestamp: {e}')
+    if timestamps.isna().any():
+        raise InvalidReadingsError('Every reading needs a timestamp')
+    return timestamps
+
+
+def rollup_dtype():
+    fields = [('equipment', '<i4'), ('time', '<i8'), ('count', '<i8')]
+    for prefix in ROLLUP_FIELDS.values():
+        fields += [(f'{prefix}_{stat}', '<f8') for stat in ROLLUP_STATS]
+        fields.append((f'{prefix}_count', '<i8'))
+    return np.dtype(fields)
+
+
+def equipment_codes(payload):
+    """Code every row by equipment name; returns (codes, names) with names sorted"""
+    index = {}
+    codes = np.empty(payload.rows, dtype=np.int32)
+    chunk_size = settings.EQUIPMENT_UPLOAD_CHUNK_SIZE
+    for start in range(0, payload.rows, chunk_size):
+        names = payload.names(start, start + chunk_size)
+        chunk_codes, uniques = pd.factorize(np.array(names, dtype=object))
+        if (chunk_codes < 0).any():
+            raise InvalidReadingsError('Every reading needs an Equipment Name')
+        lookup = np.array([index.setdefault(name, len(index)) for name in uniques], dtype=np.int32)
+        codes[start:start + len(names)] = lookup[chunk_codes]
+
+    # Renumber so that codes follow the name order
+    names = np.array(list(index), dtype=object)
+    order = np.argsort(names, kind='stable')
+    rank = np.empty(len(names), dtype=np.int32)
+    rank[order] = np.arange(len(names), dtype=np.int32)
+    return rank[codes], names[order].tolist()
+
+
+def bucket_starts(equipment, times, seconds):
+    """Where each (equipment, ``seconds``-wide bucket) group starts, and its bucket time"""
+    width = seconds * NANOSECONDS
+    buckets = times // width * width
+    new = np.ones(len(times), dtype=bool)
+    new[1:] = (equipment[1:] != equipment[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(new)
+    return starts, buckets[starts]
+
+
+def rollup_readings(equipment, times, payload, seconds):
+    """Roll the payload's (equipment, time)-sorted readings up into ``seconds``-wide buckets"""
+    if not len(times):
+        return np.empty(0, dtype=rollup_dtype())
+    starts, bucket_times = bucket_starts(equipment, times, seconds)
+    rolled = np.empty(len(starts), dtype=rollup_dtype())
+    rolled['equipment'] = equipment[starts]
+    rolled['time'] = bucket_times
+    rolled['count'] = np.diff(np.append(starts, len(times)))
+    for column, prefix in ROLLUP_FIELDS.items():
+        values = np.asarray(payload.column(column))
+        valid = ~np.isnan(values)
+        # fmin/fmax skip NaN, so buckets without values stay NaN
+        rolled[f'{prefix}_min'] = np.fmin.reduceat(values, starts)
+        rolled[f'{prefix}_max'] = np.fmax.reduceat(values, starts)
+        counts = np.add.reduceat(valid, starts, dtype=np.int64)
+        totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolled[f'{prefix}_mean'] = np.where(counts > 0, totals / counts, np.nan)
+        rolled[f'{prefix}_count'] = counts
+    return rolled
+
+
+def rollup(level, seconds):
+    """Merge the (equipment, time)-sorted buckets of a finer rollup into ``seconds``-wide ones"""
+    if not len(level):
+        return np.empty(0, dtype=level.dtype)
+    starts, bucket_times = bucket_starts(level['equipment'], level['time'], seconds)
+    merged = np.empty(len(starts), dtype=level.dtype)
+    merged['equipment'] = level['equipment'][starts]
+    merged['time'] = bucket_times
+    merged['count'] = np.add.reduceat(level['count'], starts)
+    for prefix in ROLLUP_FIELDS.values():
+        counts = level[f'{prefix}_count']
+        merged[f'{prefix}_min'] = np.fmin.reduceat(level[f'{prefix}_min'], starts)
+        merged[f'{prefix}_max'] = np.fmax.reduceat(level[f'{prefix}_max'], starts)
+        # Means are merged weighted by the number of values behind them
+        totals = np.add.reduceat(np.where(counts > 0, level[f'{prefix}_mean'] * counts, 0.0), starts)
+        merged_counts = np.add.reduceat(counts, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            merged[f'{prefix}_mean'] = np.where(merged_counts > 0, totals / merged_counts, np.nan)
+        merged[f'{prefix}_count'] = merged_counts
+    return merged
+
+
+def equipment_starts(equipment, count):
+    """Offsets where each of ``count`` equipment codes starts in a sorted array, plus the end"""
+    return np.searchsorted(equipment, np.arange(count + 1)).tolist()
+
+
+def build_timeseries(payload):
+    """Rewrite a payload sorted by (equipment, time) and add its rollups
+
+    Returns the new payload; the unsorted one is deleted.
+    """
+    codes, names = equipment_codes(payload)
+    times = payload.timestamps
+    order = np.lexsort((times, codes))
+    codes = codes[order]
+
+    writer = PayloadWriter(new_payload_name(), timestamps=True)
+    try:
+        type_lookup = np.array(list(payload.type_names) + [None], dtype=object)
+        names = np.array(names, dtype=object)
+        type_codes = payload.type_codes
+        for start in range(0, payload.rows, settings.EQUIPMENT_UPLOAD_CHUNK_SIZE):
+            rows = order[start:start + settings.EQUIPMENT_UPLOAD_CHUNK_SIZE]
+            chunk = pd.DataFrame({
+                'Equipment Name': names[codes[start:start + len(rows)]],
+                'Type': type_lookup[type_codes[rows]],
+                **{column: payload.column(column)[rows] for column in NUMERIC_FILES},
+                'Timestamp': np.asarray(times[rows]).view('datetime64[ns]'),
+            })
+            writer.append(chunk)
+        writer.close()
+        del order
+
+        sorted_payload = ColumnarPayload(writer.name)
+        directory = payload_path(writer.name)
+        info = {
+            'equipment': names.tolist(),
+            'starts': {'raw': equipment_starts(codes, len(names))},
+            'rollups': {},
+        }
+        level = None
+        for resolution, seconds in settings.EQUIPMENT_TIMESERIES_ROLLUPS.items():
+            if level is None:
+                level = rollup_readings(codes, np.asarray(sorted_payload.timestamps),
+                                        sorted_payload, seconds)
+            else:
+                level = rollup(level, seconds)
+            np.save(os.path.join(directory, f'rollup.{resolution}.npy'), level)
+            info['rollups'][resolution] = seconds
+            info['starts'][resolution] = equipment_starts(level['equipment'], len(names))
+        with open(os.path.join(directory, INFO_FILE), 'w') as f:
+            json.dump(info, f)
+    except Exception:
+        writer.abort()
+        raise
+
+    delete_payload(payload.name)
+    return sorted_payload
+
+
+class TimeSeries:
+    """Range queries over a time-series payload and its rollups"""
+    def __init__(self, payload):
+        self.payload = payload
+        with open(os.path.join(payload.directory, INFO_FILE)) as f:
+            info = json.load(f)
+        self.equipment = info['equipment']
+        self.starts = info['starts']
+        self.rollups = info['rollups']
+
+    def rollup(self, resolution):
+        return np.load(os.path.join(self.payload.directory, f'rollup.{resolution}.npy'),
+                       mmap_mode='r')
+
+    def equipment_index(self, name):
+        # Equipment names are sorted, so a binary search finds one
+        i = int(np.searchsorted(np.array(self.equipment, dtype=object), name))
+        if i == len(self.equipment) or self.equipment[i] != name:
+            raise KeyError(name)
+        return i
+
+    def describe(self):
+        """Reading count and first and last timestamp (epoch ms) of every equipment"""
+        times = self.payload.timestamps
+        starts = self.starts['raw']
+        return [{
+            'name': name,
+            'readings': starts[i + 1] - starts[i],
+            'first': int(times[starts[i]]) // 10 ** 6,
+            'last': int(times[starts[i + 1] - 1]) // 10 ** 6,
+        } for i, name in enumerate(self.equipment) if starts[i + 1] > starts[i]]
+
+    def query(self, equipment, start=None, end=None, points=1000, columns=None):
+        """Readings or rollup buckets of one equipment within [start, end]
+
+        ``start`` and ``end`` are nanoseconds since the epoch. Raw readings
+        are returned if at most ``points`` fall in the range, otherwise the
+        finest rollup with at most ``points`` buckets (or the coarsest one).
+        """
+        i = self.equipment_index(equipment)
+        columns = columns or list(NUMERIC_FILES)
+        start = np.iinfo(np.int64).min if start is None else start
+        end = np.iinfo(np.int64).max if end is None else end
+
+        lo, hi = self.starts['raw'][i], self.starts['raw'][i + 1]
+        times = self.payload.timestamps[lo:hi]
+        first = lo + int(np.searchsorted(times, start, 'left'))
+        last = lo + int(np.searchsorted(times, end, 'right'))
+        if last - first <= points or not self.rollups:
+            return {
+                'resolution': 'raw',
+                'time': (np.asarray(self.payload.timestamps[first:last]) // 10 ** 6).tolist(),
+                'series': {column: {'value': np.asarray(self.payload.column(column)[first:last])}
+                           for column in columns},
+            }
+
+        for resolution, seconds in self.rollups.items():
+            lo, hi = self.starts[resolution][i], self.starts[resolution][i + 1]
+            level = self.rollup(resolution)[lo:hi]
+            # The bucket holding ``start`` begins before it
+            width = seconds * NANOSECONDS
+            bucket_start = start // width * width if start > np.iinfo(np.int64).min else start
+            first = int(np.searchsorted(level['time'], bucket_start, 'left'))
+            last = int(np.searchsorted(level['time'], end, 'right'))
+            if last - first <= points:
+                break
+        level = level[first:last]
+        return {
+            'resolution': resolution,
+            'time': (level['time'] // 10 ** 6).tolist(),
+            'count': np.ascontiguousarray(level['count']),
+            'series': {column: {stat: np.ascontiguousarray(level[f'{ROLLUP_FIELDS[column]}_{stat}'])
+                                for stat in ROLLUP_STATS}
+                       for column in columns},
+        }
+
+
+def parse_time(value):
+    """Nanoseconds since the epoch of an ISO 8601 time (UTC if naive) or epoch milliseconds"""
+    if value is None or value == '':
+        return None
+    try:
+        if value.lstrip('-').isdigit():
+            return int(value) * 10 ** 6
+        timestamp = pd.Timestamp(value)
+    except ValueError:
+        raise InvalidQueryError(f'Invalid time: {value}')
+    if timestamp is pd.NaT:
+        raise InvalidQueryError(f'Invalid time: {value}')
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.value
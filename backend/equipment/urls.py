@@ -5,11 +5,25 @@ urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
     path('upload/', views.upload_csv, name='upload_csv'),
+    path('upload/batch/', views.upload_batch, name='upload_batch'),
+    path('jobs/<uuid:job_id>/', views.get_upload_job, name='get_upload_job'),
+    path('batches/<uuid:batch_id>/', views.get_upload_batch, name='get_upload_batch'),
     path('summary/', views.get_summary, name='get_summary'),
     path('summary/<int:dataset_id>/', views.get_summary, name='get_summary_by_id'),
     path('history/', views.get_history, name='get_history'),
     path('dataset/<int:dataset_id>/', views.get_dataset_data, name='get_dataset_data'),
+    path('dataset/<int:dataset_id>/append/', views.append_dataset, name='append_dataset'),
+    path('dataset/<int:dataset_id>/rows/', views.get_dataset_rows, name='get_dataset_rows'),
+    path('dataset/<int:dataset_id>/chart/', views.get_chart_data, name='get_chart_data'),
+    path('dataset/<int:dataset_id>/anomalies/', views.get_anomalies, name='get_anomalies'),
+    path('dataset/<int:dataset_id>/timeseries/', views.get_timeseries, name='get_timeseries'),
+    path('compare/', views.compare_datasets, name='compare_datasets'),
+    path('dataset/<int:dataset_id>/export.csv', views.export_dataset,
+         {'export_format': 'csv'}, name='export_dataset_csv'),
+    path('dataset/<int:dataset_id>/export.ndjson', views.export_dataset,
+         {'export_format': 'ndjson'}, name='export_dataset_ndjson'),
     path('dataset/<int:dataset_id>/pdf/', views.generate_pdf_report, name='generate_pdf'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
 
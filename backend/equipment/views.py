@@ -1,22 +1,34 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.db.models import Q
-import pandas as pd
-import json
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import os
-from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from .models import EquipmentDataset
-from .serializers import EquipmentDatasetSerializer
+from urllib.parse import quote
+import numpy as np
+from .models import EquipmentDataset, UploadJob, UploadBatch, RECORD_FIELDS
+from .serializers import (EquipmentDatasetSerializer, EquipmentDatasetListSerializer,
+                          UploadJobSerializer, UploadBatchSerializer)
+from .jobs import (spool_upload, enqueue_upload, enqueue_append, batch_members, enqueue_batch,
+                   complete_duplicate, fail_stale_jobs, BatchUploadError)
+from .cache import cache_key, cache_get, cache_set, conditional_response
+from .retention import retention_policy
+from .reports import REPORT_MODES, request_report
+from .compare import COMPARE_SORTS, compare_datasets as run_comparison
+from .charts import CHART_METHODS, chart_data
+from .timeseries import TimeSeries, parse_time
+from .anomalies import RULES as ANOMALY_RULES, reasons, select_anomalies
+from .ingest import NUMERIC_COLUMNS
+from .export import EXPORT_FORMATS, parse_columns, export_stream
+from .renderers import FastJSONRenderer, PassthroughRenderer
+from .instrumentation import timed, registry
+from .pagination import (filter_payload, filter_records, paginate_payload, paginate_records,
+                         InvalidQueryError)
 
 
 @api_view(['POST'])
@@ -81,121 +93,472 @@ def upload_csv(request):
                        status=status.HTTP_400_BAD_REQUEST)
     
     file = request.FILES['file']
+    # A timestamp column turns the upload into a time series
+    timestamp_column = str(request.data.get('timestamp_column', '')).strip() or None
     
+    # Spool the file and hand it to the worker pool; parsing and storing
+    # happen in the background and are reported through the job
+    job = UploadJob.objects.create(user=request.user, filename=file.name)
     try:
-        # Read CSV file
-        df = pd.read_csv(file)
-        
-        # Validate required columns
-        required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            return Response({
-                'error': f'Missing required columns: {", ".join(missing_columns)}'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Calculate summary statistics
-        total_count = len(df)
-        avg_flowrate = df['Flowrate'].mean() if 'Flowrate' in df.columns else None
-        avg_pressure = df['Pressure'].mean() if 'Pressure' in df.columns else None
-        avg_temperature = df['Temperature'].mean() if 'Temperature' in df.columns else None
-        
-        # Equipment type distribution
-        equipment_type_dist = df['Type'].value_counts().to_dict()
-        
-        # Convert DataFrame to list of dictionaries
-        raw_data = df.to_dict('records')
-        
-        # Store in database
-        dataset = EquipmentDataset.objects.create(
-            user=request.user,
-            filename=file.name,
-            total_count=total_count,
-            avg_flowrate=avg_flowrate,
-            avg_pressure=avg_pressure,
-            avg_temperature=avg_temperature,
-            equipment_type_distribution=json.dumps(equipment_type_dist),
-            raw_data=json.dumps(raw_data)
-        )
-        
-        # Keep only last 5 datasets per user
-        datasets = EquipmentDataset.objects.filter(user=request.user).order_by('-uploaded_at')
-        if datasets.count() > 5:
-            for old_dataset in datasets[5:]:
-                old_dataset.delete()
+        with timed('spool', bytes=file.size):
+            path = spool_upload(job, file, timestamp_column)
+    except OSError as e:
+        job.delete()
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # The same file uploaded again is answered with the stored dataset
+    if complete_duplicate(job, path) is not None:
+        return Response(UploadJobSerializer(job).data, status=status.HTTP_200_OK)
+    with timed('enqueue'):
+        enqueue_upload(job, path, timestamp_column=timestamp_column)
+    
+    job.refresh_from_db()
+    return Response(UploadJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def append_dataset(request, dataset_id):
+    """Append the rows of a CSV file to an existing dataset"""
+    if 'file' not in request.FILES:
+        return Response({'error': 'No file provided'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    try:
+        dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+    except EquipmentDataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    if dataset.is_timeseries or not dataset.payload:
+        return Response({'error': 'Rows cannot be appended to this dataset'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    # Same flow as an upload: the rows are appended in the background and
+    # the job reports how many were added
+    file = request.FILES['file']
+    job = UploadJob.objects.create(user=request.user, filename=file.name)
+    try:
+        with timed('spool', bytes=file.size):
+            path = spool_upload(job, file)
+    except OSError as e:
+        job.delete()
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    with timed('enqueue'):
+        enqueue_append(job, path, dataset.id)
+    
+    job.refresh_from_db()
+    return Response(UploadJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_batch(request):
+    """Upload several CSV files or zip archives of CSV files at once"""
+    files = request.FILES.getlist('files') + request.FILES.getlist('file')
+    merge = str(request.data.get('merge', '')).lower() in ('1', 'true', 'yes')
+    try:
+        members = batch_members(files)
+    except BatchUploadError as e:
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    # One job per file; the files are parsed in parallel in the background
+    batch = UploadBatch.objects.create(user=request.user, merge=merge)
+    uploads = []
+    try:
+        for filename, open_member in members:
+            job = UploadJob.objects.create(user=request.user, filename=filename[:255], batch=batch)
+            with open_member() as file:
+                path = spool_upload(job, file)
+            # Files already stored are not processed again, unless merged
+            if merge or complete_duplicate(job, path) is None:
+                uploads.append((job.id, path))
+    except OSError as e:
+        for _, path in uploads:
+            os.remove(path)
+        batch.delete()
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if uploads:
+        enqueue_batch(batch, uploads)
+    
+    return Response(UploadBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_upload_batch(request, batch_id):
+    """Get the status of a batch upload and each of its files"""
+    try:
+        batch = UploadBatch.objects.get(id=batch_id, user=request.user)
+    except UploadBatch.DoesNotExist:
+        return Response({'error': 'Batch not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    # Jobs orphaned by a restart would otherwise be polled forever
+    fail_stale_jobs(batch.jobs.all())
+    return Response(UploadBatchSerializer(batch).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_upload_job(request, job_id):
+    """Get the status of a background upload"""
+    try:
+        job = UploadJob.objects.select_related('dataset').get(id=job_id, user=request.user)
+    except UploadJob.DoesNotExist:
+        return Response({'error': 'Job not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    # Jobs orphaned by a restart would otherwise be polled forever
+    if not job.is_finished and fail_stale_jobs(UploadJob.objects.filter(id=job.id)):
+        job.refresh_from_db()
+    return Response(UploadJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_summary(request, dataset_id=None):
+    """Get summary statistics for a specific dataset or latest"""
+    key = cache_key(request.user, 'summary', dataset_id)
+    entry = cache_get(key)
+    if entry is None:
+        if dataset_id:
+            try:
+                dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+            except EquipmentDataset.DoesNotExist:
+                return Response({'error': 'Dataset not found'}, 
+                               status=status.HTTP_404_NOT_FOUND)
+        else:
+            # Get latest dataset
+            dataset = EquipmentDataset.objects.ready().filter(user=request.user).first()
+            if not dataset:
+                return Response({'error': 'No datasets found'}, 
+                               status=status.HTTP_404_NOT_FOUND)
         
-        # Return summary
-        return Response({
+        entry = cache_set(key, {
             'id': dataset.id,
             'filename': dataset.filename,
             'uploaded_at': dataset.uploaded_at,
+            'updated_at': dataset.updated_at,
             'summary': {
-                'total_count': total_count,
-                'avg_flowrate': avg_flowrate,
-                'avg_pressure': avg_pressure,
-                'avg_temperature': avg_temperature,
-                'equipment_type_distribution': equipment_type_dist
+                'total_count': dataset.total_count,
+                'avg_flowrate': dataset.avg_flowrate,
+                'avg_pressure': dataset.avg_pressure,
+                'avg_temperature': dataset.avg_temperature,
+                'equipment_type_distribution': dataset.get_equipment_type_distribution()
             },
-            'data': raw_data
-        }, status=status.HTTP_201_CREATED)
-        
-    except Exception as e:
+            'is_timeseries': dataset.is_timeseries,
+            'statistics': dataset.get_extended_statistics(),
+            'anomalies': dataset.get_anomalies()
+        }, last_modified=dataset.updated_at)
+    
+    return conditional_response(request, entry)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_history(request):
+    """Get the user's retained datasets, newest first"""
+    key = cache_key(request.user, 'history')
+    entry = cache_get(key)
+    if entry is None:
+        datasets = EquipmentDataset.objects.ready().filter(user=request.user).order_by('-uploaded_at')
+        keep, _ = retention_policy()
+        datasets = list(datasets[:keep] if keep else datasets)
+        serializer = EquipmentDatasetListSerializer(datasets, many=True)
+        last_modified = max(d.updated_at for d in datasets) if datasets else None
+        entry = cache_set(key, serializer.data, last_modified=last_modified)
+    return conditional_response(request, entry)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dataset_data(request, dataset_id):
+    """Get full data for a specific dataset"""
+    with timed('cache_lookup'):
+        key = cache_key(request.user, 'dataset', dataset_id)
+        entry = cache_get(key)
+    if entry is None:
+        try:
+            with timed('db_query'):
+                dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+        except EquipmentDataset.DoesNotExist:
+            return Response({'error': 'Dataset not found'}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        with timed('serialize', rows=dataset.total_count):
+            data = EquipmentDatasetSerializer(dataset).data
+        with timed('cache_store'):
+            entry = cache_set(key, data, last_modified=dataset.updated_at)
+    return conditional_response(request, entry)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dataset_rows(request, dataset_id):
+    """Get one page of a dataset's rows with filtering and sorting"""
+    try:
+        dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+    except EquipmentDataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        limit = int(request.query_params.get('limit', settings.EQUIPMENT_ROWS_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.EQUIPMENT_ROWS_MAX_PAGE_SIZE))
+    ordering = request.query_params.get('ordering', 'row_index')
+    
+    cursor = request.query_params.get('cursor')
+    payload = dataset.get_payload()
+    try:
+        if payload is not None:
+            indices = filter_payload(payload, request.query_params)
+            rows, next_cursor = paginate_payload(payload, indices, ordering, cursor=cursor,
+                                                 limit=limit)
+            count = len(indices)
+        else:
+            records = filter_records(dataset.records.all(), request.query_params)
+            rows, next_cursor = paginate_records(records, ordering, cursor=cursor, limit=limit)
+            count = records.count()
+    except InvalidQueryError as e:
         return Response({'error': str(e)}, 
                        status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'count': count,
+        'next': next_cursor,
+        'ordering': ordering,
+        'results': [
+            dict(row_index=row['row_index'],
+                 **{column: row[field] for column, field in RECORD_FIELDS.items()})
+            for row in rows
+        ]
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_summary(request, dataset_id=None):
-    """Get summary statistics for a specific dataset or latest"""
-    if dataset_id:
+@renderer_classes([FastJSONRenderer, PassthroughRenderer])
+def export_dataset(request, dataset_id, export_format):
+    """Stream a dataset's rows as CSV or NDJSON"""
+    try:
+        dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+    except EquipmentDataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        columns = parse_columns(request.query_params.get('columns'))
+    except InvalidQueryError as e:
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    gzip = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    filename = f'dataset_{dataset.id}.{export_format}'
+    response = StreamingHttpResponse(
+        export_stream(dataset, export_format, columns, gzip=gzip),
+        content_type='application/gzip' if gzip else EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.gz"' if gzip else \
+        f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_chart_data(request, dataset_id):
+    """Get downsampled chart series and histograms of a dataset's numeric columns"""
+    try:
+        points = int(request.query_params.get('points', settings.EQUIPMENT_CHART_POINTS))
+        bins = int(request.query_params.get('bins', settings.EQUIPMENT_CHART_HISTOGRAM_BINS))
+    except ValueError:
+        return Response({'error': 'points and bins must be integers'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    points = max(3, min(points, settings.EQUIPMENT_CHART_MAX_POINTS))
+    bins = max(1, min(bins, settings.EQUIPMENT_CHART_MAX_HISTOGRAM_BINS))
+    
+    method = request.query_params.get('method', 'lttb')
+    if method not in CHART_METHODS:
+        return Response({'error': f'Invalid method. Choose from: {", ".join(CHART_METHODS)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    columns = [c.strip() for c in request.query_params.get('columns', '').split(',') if c.strip()]
+    columns = list(dict.fromkeys(columns)) or list(NUMERIC_COLUMNS)
+    unknown = [c for c in columns if c not in NUMERIC_COLUMNS]
+    if unknown:
+        return Response({'error': f'Invalid columns {", ".join(unknown)}. Choose from: {", ".join(NUMERIC_COLUMNS)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    key = cache_key(request.user, 'chart', f'{dataset_id}:{",".join(columns)}:{method}:{points}:{bins}')
+    entry = cache_get(key)
+    if entry is None:
         try:
-            dataset = EquipmentDataset.objects.get(id=dataset_id, user=request.user)
+            dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
         except EquipmentDataset.DoesNotExist:
             return Response({'error': 'Dataset not found'}, 
                            status=status.HTTP_404_NOT_FOUND)
-    else:
-        # Get latest dataset
-        dataset = EquipmentDataset.objects.filter(user=request.user).first()
-        if not dataset:
-            return Response({'error': 'No datasets found'}, 
-                           status=status.HTTP_404_NOT_FOUND)
+        with timed('downsample', rows=dataset.total_count):
+            data = chart_data(dataset, columns, points=points, method=method, bins=bins)
+        entry = cache_set(key, data, last_modified=dataset.updated_at)
+    return conditional_response(request, entry)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_anomalies(request, dataset_id):
+    """Get one page of the rows flagged at ingest, with the rules and columns that flagged them"""
+    try:
+        limit = int(request.query_params.get('limit', settings.EQUIPMENT_ROWS_PAGE_SIZE))
+        cursor = request.query_params.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return Response({'error': 'limit and cursor must be integers'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.EQUIPMENT_ROWS_MAX_PAGE_SIZE))
     
-    return Response({
-        'id': dataset.id,
-        'filename': dataset.filename,
-        'uploaded_at': dataset.uploaded_at,
-        'summary': {
-            'total_count': dataset.total_count,
-            'avg_flowrate': dataset.avg_flowrate,
-            'avg_pressure': dataset.avg_pressure,
-            'avg_temperature': dataset.avg_temperature,
-            'equipment_type_distribution': dataset.get_equipment_type_distribution()
+    rules = [r.strip() for r in request.query_params.get('rule', '').split(',') if r.strip()]
+    unknown = [r for r in rules if r not in ANOMALY_RULES]
+    if unknown:
+        return Response({'error': f'Invalid rule {", ".join(unknown)}. Choose from: {", ".join(ANOMALY_RULES)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    columns = [c.strip() for c in request.query_params.get('columns', '').split(',') if c.strip()]
+    unknown = [c for c in columns if c not in NUMERIC_COLUMNS]
+    if unknown:
+        return Response({'error': f'Invalid columns {", ".join(unknown)}. Choose from: {", ".join(NUMERIC_COLUMNS)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    types = [t for value in request.query_params.getlist('type') for t in value.split(',') if t]
+    
+    key = cache_key(request.user, 'anomalies',
+                    f'{dataset_id}:{",".join(rules)}:{",".join(columns)}:'
+                    f'{",".join(quote(t) for t in types)}:{cursor}:{limit}')
+    entry = cache_get(key)
+    if entry is None:
+        try:
+            dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+        except EquipmentDataset.DoesNotExist:
+            return Response({'error': 'Dataset not found'}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        payload = dataset.get_payload()
+        selected = None if payload is None else select_anomalies(payload, rules, columns, types)
+        if selected is None:
+            return Response({'error': 'Anomalies were not computed for this dataset'}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        
+        rows, flags = selected
+        # Flagged rows are sorted, so the cursor (last row index returned) is found by bisection
+        start = 0 if cursor is None else int(np.searchsorted(rows, cursor, 'right'))
+        page, page_flags = rows[start:start + limit], flags[start:start + limit]
+        with timed('serialize', rows=len(page)):
+            frame = payload.take(page).astype(object)
+            records = frame.where(frame.notna(), None).to_dict('records')
+            results = [dict(row_index=int(row_index), **record, reasons=reasons(int(row_flags)))
+                       for row_index, row_flags, record in zip(page, page_flags, records)]
+        data = {
+            'dataset_id': dataset.id,
+            'summary': dataset.get_anomalies(),
+            'count': len(rows),
+            'next': str(int(page[-1])) if start + limit < len(rows) else None,
+            'results': results,
         }
-    })
+        entry = cache_set(key, data, last_modified=dataset.updated_at)
+    return conditional_response(request, entry)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_history(request):
-    """Get last 5 uploaded datasets"""
-    datasets = EquipmentDataset.objects.filter(user=request.user).order_by('-uploaded_at')[:5]
-    serializer = EquipmentDatasetSerializer(datasets, many=True)
-    return Response(serializer.data)
+def get_timeseries(request, dataset_id):
+    """Get one equipment's readings over a time range, or rollups of them if there are too many
+
+    Without ``equipment`` the dataset's equipment and their time spans are listed.
+    """
+    try:
+        points = int(request.query_params.get('points', settings.EQUIPMENT_TIMESERIES_POINTS))
+    except ValueError:
+        return Response({'error': 'points must be an integer'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    points = max(1, min(points, settings.EQUIPMENT_TIMESERIES_MAX_POINTS))
+    
+    try:
+        start = parse_time(request.query_params.get('start'))
+        end = parse_time(request.query_params.get('end'))
+    except InvalidQueryError as e:
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    columns = [c.strip() for c in request.query_params.get('columns', '').split(',') if c.strip()]
+    columns = list(dict.fromkeys(columns)) or list(NUMERIC_COLUMNS)
+    unknown = [c for c in columns if c not in NUMERIC_COLUMNS]
+    if unknown:
+        return Response({'error': f'Invalid columns {", ".join(unknown)}. Choose from: {", ".join(NUMERIC_COLUMNS)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    equipment = request.query_params.get('equipment')
+    key = cache_key(request.user, 'timeseries',
+                    f'{dataset_id}:{quote(equipment or "")}:{start}:{end}:{points}:{",".join(columns)}')
+    entry = cache_get(key)
+    if entry is None:
+        try:
+            dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
+        except EquipmentDataset.DoesNotExist:
+            return Response({'error': 'Dataset not found'}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        if not dataset.is_timeseries:
+            return Response({'error': 'Dataset was not uploaded as a time series'}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        series = TimeSeries(dataset.get_payload())
+        if equipment is None:
+            data = {
+                'dataset_id': dataset.id,
+                'resolutions': ['raw'] + list(series.rollups),
+                'equipment': series.describe(),
+            }
+        else:
+            try:
+                with timed('timeseries_query') as stage:
+                    result = series.query(equipment, start, end, points=points, columns=columns)
+                    stage.rows = len(result['time'])
+            except KeyError:
+                return Response({'error': 'Equipment not found'}, 
+                               status=status.HTTP_404_NOT_FOUND)
+            data = {'dataset_id': dataset.id, 'equipment': equipment, 'points': points, **result}
+        entry = cache_set(key, data, last_modified=dataset.updated_at)
+    return conditional_response(request, entry)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_dataset_data(request, dataset_id):
-    """Get full data for a specific dataset"""
+def compare_datasets(request):
+    """Compare datasets against the first one, joined on equipment name"""
     try:
-        dataset = EquipmentDataset.objects.get(id=dataset_id, user=request.user)
-        serializer = EquipmentDatasetSerializer(dataset)
-        return Response(serializer.data)
-    except EquipmentDataset.DoesNotExist:
-        return Response({'error': 'Dataset not found'}, 
-                       status=status.HTTP_404_NOT_FOUND)
+        ids = [int(i) for i in request.query_params.get('ids', '').split(',') if i.strip()]
+        limit = int(request.query_params.get('limit', settings.EQUIPMENT_COMPARE_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'ids and limit must be integers'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.EQUIPMENT_COMPARE_MAX_PAGE_SIZE))
+    
+    max_datasets = settings.EQUIPMENT_COMPARE_MAX_DATASETS
+    if len(ids) < 2 or len(ids) > max_datasets or len(set(ids)) != len(ids):
+        return Response({'error': f'Provide between 2 and {max_datasets} distinct dataset ids'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    sort = request.query_params.get('sort', 'name')
+    if sort not in COMPARE_SORTS:
+        return Response({'error': f'Invalid sort. Choose from: {", ".join(COMPARE_SORTS)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    key = cache_key(request.user, 'compare', f'{",".join(map(str, ids))}:{sort}:{limit}')
+    entry = cache_get(key)
+    if entry is None:
+        datasets = EquipmentDataset.objects.ready().filter(user=request.user).in_bulk(ids)
+        if len(datasets) != len(ids):
+            return Response({'error': 'Dataset not found'}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        datasets = [datasets[i] for i in ids]
+        entry = cache_set(key, run_comparison(datasets, sort=sort, limit=limit),
+                          last_modified=max(d.updated_at for d in datasets))
+    return conditional_response(request, entry)
 
 
 @api_view(['GET'])
@@ -203,80 +566,43 @@ def get_dataset_data(request, dataset_id):
 def generate_pdf_report(request, dataset_id):
     """Generate PDF report for a dataset"""
     try:
-        dataset = EquipmentDataset.objects.get(id=dataset_id, user=request.user)
+        with timed('db_query'):
+            dataset = EquipmentDataset.objects.ready().get(id=dataset_id, user=request.user)
     except EquipmentDataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    # Create PDF
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="report_{dataset.id}.pdf"'
-    
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title = Paragraph(f"Equipment Data Report: {dataset.filename}", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Summary
-    summary_title = Paragraph("Summary Statistics", styles['Heading2'])
-    elements.append(summary_title)
-    
-    summary_data = [
-        ['Metric', 'Value'],
-        ['Total Equipment Count', str(dataset.total_count)],
-        ['Average Flowrate', f"{dataset.avg_flowrate:.2f}" if dataset.avg_flowrate else "N/A"],
-        ['Average Pressure', f"{dataset.avg_pressure:.2f}" if dataset.avg_pressure else "N/A"],
-        ['Average Temperature', f"{dataset.avg_temperature:.2f}" if dataset.avg_temperature else "N/A"],
-    ]
-    
-    summary_table = Table(summary_data)
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Equipment Type Distribution
-    dist_title = Paragraph("Equipment Type Distribution", styles['Heading2'])
-    elements.append(dist_title)
-    
-    dist = dataset.get_equipment_type_distribution()
-    dist_data = [['Equipment Type', 'Count']]
-    for eq_type, count in dist.items():
-        dist_data.append([eq_type, str(count)])
-    
-    dist_table = Table(dist_data)
-    dist_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(dist_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Footer
-    footer = Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 
-                      styles['Normal'])
-    elements.append(footer)
-    
-    doc.build(elements)
-    return response
-
+    mode = request.query_params.get('mode', 'summary')
+    if mode not in REPORT_MODES:
+        return Response({'error': f'Invalid mode. Choose from: {", ".join(REPORT_MODES)}'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    # Built in the report worker pool and cached on disk; large reports
+    # that are not ready in time are picked up by a later request
+    try:
+        with timed('report') as stage:
+            path = request_report(dataset, mode).result(timeout=settings.EQUIPMENT_REPORT_WAIT_SECONDS)
+            stage.bytes = os.path.getsize(path)
+    except FuturesTimeoutError:
+        response = Response({'status': 'pending'}, status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = str(settings.EQUIPMENT_REPORT_RETRY_AFTER)
+        return response
+    except Exception as e:
+        return Response({'error': f'Failed to generate report: {e}'}, 
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    filename = f'report_{dataset.id}.pdf' if mode == 'summary' else f'report_{dataset.id}_{mode}.pdf'
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename,
+                        content_type='application/pdf')
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes([FastJSONRenderer, PassthroughRenderer])
+def metrics(request):
+    """Expose request and stage metrics in the Prometheus text format"""
+    allowed = request.META.get('REMOTE_ADDR') in settings.EQUIPMENT_METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        return Response({'error': 'Forbidden'}, 
+                       status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
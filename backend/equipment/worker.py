@@ -0,0 +1,16 @@
+"""
+Entry point for the upload parsing processes.
+
+Kept free of model imports so that freshly spawned processes can import it
+before Django is set up.
+"""
+
+
+def init_parse_worker(overrides):
+    """Set up Django in a parsing process, mirroring the parent's settings"""
+    import django
+    from django.conf import settings
+
+    django.setup()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
@@ -1,12 +1,18 @@
 import sys
 import os
+import time
+from urllib.parse import urlencode
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QFileDialog, 
-                             QTableWidget, QTableWidgetItem, QMessageBox,
-                             QTabWidget, QGroupBox, QGridLayout, QTextEdit, QLineEdit)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                             QTableView, QHeaderView, QComboBox, QMessageBox,
+                             QTabWidget, QGroupBox, QGridLayout, QTextEdit, QLineEdit,
+                             QProgressBar)
+from PyQt5.QtCore import (Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal,
+                          QAbstractTableModel, QModelIndex, QStandardPaths)
 from PyQt5.QtGui import QFont
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -14,47 +20,602 @@ from matplotlib.figure import Figure
 import numpy as np
 
 
-class APIWorker(QThread):
-    """Worker thread for API calls"""
-    finished = pyqtSignal(dict)
+TABLE_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+# Datasets up to this many rows are downloaded whole and sorted/filtered
+# locally; larger ones are paged from /dataset/<id>/rows/ as the table scrolls
+LOCAL_TABLE_MAX_ROWS = 200000
+ROWS_PAGE_SIZE = 1000
+# Downloaded datasets are kept on disk up to this many bytes, least recently
+# used first out
+DATASET_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# API calls share this many threads and keep-alive connections
+MAX_CONCURRENT_REQUESTS = 4
+# (connect, read) timeouts of an API call in seconds
+REQUEST_TIMEOUT = (5, 120)
+# Idempotent calls are retried this often, waiting 0.5s, 1s, 2s... in between
+REQUEST_RETRIES = 3
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+# Points per line chart series and bins per histogram
+CHART_POINTS = 1000
+CHART_HISTOGRAM_BINS = 20
+# Chart redraws wait this many milliseconds for further data changes
+CHART_REDRAW_DELAY = 50
+
+
+def records_to_columns(records):
+    """Convert a list of row dicts into one NumPy array per table column"""
+    columns = {}
+    for column in TABLE_COLUMNS:
+        values = [record.get(column) for record in records]
+        if column in NUMERIC_COLUMNS:
+            columns[column] = np.array([np.nan if v is None else v for v in values],
+                                       dtype=np.float64)
+        else:
+            columns[column] = np.array(values, dtype=object)
+    return columns
+
+
+def minmax_indices(y, buckets):
+    """Indices of the lowest and highest value in each of ``buckets`` equal slices of ``y``"""
+    n = len(y)
+    if buckets * 2 >= n or buckets < 1:
+        return np.arange(n)
+    size = -(-n // buckets)
+    blocks = -(-n // size)
+    # Pad the last slice with NaN so all slices reshape into one block
+    padded = np.full(blocks * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(blocks, size)
+    offsets = np.arange(blocks) * size
+    return np.unique(np.concatenate([offsets + np.nanargmin(padded, axis=1),
+                                     offsets + np.nanargmax(padded, axis=1)]))
+
+
+def chart_data_from_columns(columns, points=CHART_POINTS, bins=CHART_HISTOGRAM_BINS):
+    """Line series and histograms of downloaded columns, shaped like the /chart/ response
+
+    Series keep the extremes of every bucket of rows, as the server's
+    ``method=minmax`` does.
+    """
+    series = {}
+    histograms = {}
+    for column in NUMERIC_COLUMNS:
+        values = columns[column]
+        rows = np.flatnonzero(~np.isnan(values))
+        y = values[rows]
+        keep = minmax_indices(y, points // 2)
+        series[column] = {'count': len(rows), 'x': rows[keep], 'y': y[keep]}
+        if len(y):
+            counts, edges = np.histogram(y, bins=bins)
+        else:
+            counts, edges = np.zeros(bins, dtype=np.int64), np.arange(bins + 1, dtype=np.float64)
+        histograms[column] = {'edges': edges, 'counts': counts,
+                              'null_count': len(values) - len(rows)}
+    return {
+        'total_count': len(columns['Equipment Name']),
+        'series': series,
+        'histograms': histograms,
+    }
+
+
+class DatasetCache:
+    """Size-bounded LRU cache of downloaded datasets on local disk
+
+    Every dataset is stored as one compressed .npz file of its column
+    arrays. index.json records each entry's owner, ETag, summary, size and
+    last use, plus the latest dataset of every user, so the app can show it
+    at start-up before (or without) hearing from the server.
+    """
+    def __init__(self, directory=None, max_bytes=DATASET_CACHE_MAX_BYTES):
+        self.directory = directory or os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.CacheLocation), 'datasets')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('entries', {})
+        index.setdefault('latest', {})
+        return index
+
+    def _save_index(self):
+        partial = f'{self.index_path}.partial'
+        with open(partial, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(partial, self.index_path)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.directory, f'{dataset_id}.npz')
+
+    def latest(self, user):
+        """Id of the dataset the user saw last, or None"""
+        return self.index['latest'].get(user)
+
+    def get(self, user, dataset_id):
+        """Return (columns, summary, etag) of a cached dataset, or None"""
+        entry = self.index['entries'].get(str(dataset_id))
+        if entry is None or entry['user'] != user:
+            return None
+        try:
+            columns = self._read(self._path(dataset_id))
+        except (OSError, ValueError, KeyError):
+            self._remove(str(dataset_id))
+            self._save_index()
+            return None
+        self.touch(user, dataset_id)
+        return columns, entry['summary'], entry['etag']
+
+    def touch(self, user, dataset_id):
+        """Mark a cached dataset as just used and as the user's latest"""
+        entry = self.index['entries'].get(str(dataset_id))
+        if entry is not None:
+            entry['last_used'] = time.time()
+        self.index['latest'][user] = dataset_id
+        self._save_index()
+
+    def put(self, user, dataset_id, columns, summary, etag):
+        path = self._path(dataset_id)
+        self._write(path, columns)
+        self.index['entries'][str(dataset_id)] = {
+            'user': user,
+            'etag': etag,
+            'summary': summary,
+            'size': os.path.getsize(path),
+            'last_used': time.time(),
+        }
+        self.index['latest'][user] = dataset_id
+        self._evict()
+        self._save_index()
+
+    def _evict(self):
+        entries = self.index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['size']
+            self._remove(key)
+
+    def _remove(self, key):
+        self.index['entries'].pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _write(path, columns):
+        arrays = {}
+        for column, values in columns.items():
+            key = column.replace(' ', '_')
+            if values.dtype == object:
+                missing = values == None  # noqa: E711
+                arrays[key] = np.where(missing, '', values).astype(str)
+                arrays[f'{key}.null'] = missing
+            else:
+                arrays[key] = values
+        partial = f'{path}.partial'
+        with open(partial, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(partial, path)
+
+    @staticmethod
+    def _read(path):
+        columns = {}
+        with np.load(path, allow_pickle=False) as data:
+            for column in TABLE_COLUMNS:
+                key = column.replace(' ', '_')
+                values = data[key]
+                if f'{key}.null' in data:
+                    values = values.astype(object)
+                    values[data[f'{key}.null']] = None
+                columns[column] = values
+        return columns
+
+
+class DatasetTableModel(QAbstractTableModel):
+    """Table model over NumPy column arrays
+
+    Cells are formatted only when the view asks for them, i.e. for the rows
+    on screen. Sorting and filtering never move the data: they compute an
+    array of row numbers in display order, and the sort order of every
+    column is computed once and reused.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = records_to_columns([])
+        self.rows = 0
+        self._order = None  # row numbers in display order, None for the natural order
+        self._sort = None  # (column, descending)
+        self._mask = None  # rows passing the filter, None for all rows
+        self._sort_orders = {}
+        self._search_names = None
+
+    def set_columns(self, columns):
+        self.beginResetModel()
+        self.columns = columns
+        self.rows = len(columns['Equipment Name'])
+        self._sort_orders = {}
+        self._search_names = None
+        self._sort = None
+        self._mask = None
+        self._update_order()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.rows if self._order is None else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(TABLE_COLUMNS)
+
+    def row_number(self, row):
+        """Row of the underlying data shown at display row ``row``"""
+        return row if self._order is None else int(self._order[row])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = TABLE_COLUMNS[index.column()]
+        if role == Qt.DisplayRole:
+            value = self.columns[column][self.row_number(index.row())]
+            if column in NUMERIC_COLUMNS:
+                return '' if np.isnan(value) else f'{value:.2f}'
+            return '' if value is None else str(value)
+        if role == Qt.TextAlignmentRole and column in NUMERIC_COLUMNS:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return TABLE_COLUMNS[section]
+        return str(self.row_number(section) + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.beginResetModel()
+        self._sort = (TABLE_COLUMNS[column], order == Qt.DescendingOrder) if column >= 0 else None
+        self._update_order()
+        self.endResetModel()
+
+    def set_filter(self, type_name=None, text=''):
+        """Show only rows of ``type_name`` whose name contains ``text``"""
+        mask = None
+        if type_name:
+            mask = self.columns['Type'] == type_name
+        if text:
+            if self._search_names is None:
+                names = self.columns['Equipment Name']
+                names = np.where(names == None, '', names).astype(str)  # noqa: E711
+                self._search_names = np.char.lower(names)
+            matches = np.char.find(self._search_names, text.lower()) >= 0
+            mask = matches if mask is None else mask & matches
+        self.beginResetModel()
+        self._mask = mask
+        self._update_order()
+        self.endResetModel()
+
+    def _sort_order(self, column, descending):
+        key = (column, descending)
+        if key not in self._sort_orders:
+            values = self.columns[column]
+            if column in NUMERIC_COLUMNS:
+                # Negating keeps missing values (NaN) last in both directions
+                order = np.argsort(-values if descending else values, kind='stable')
+            else:
+                values = np.where(values == None, '', values).astype(str)  # noqa: E711
+                order = np.argsort(values, kind='stable')
+                if descending:
+                    order = order[::-1]
+            self._sort_orders[key] = order
+        return self._sort_orders[key]
+
+    def _update_order(self):
+        order = self._sort_order(*self._sort) if self._sort is not None else None
+        if self._mask is not None:
+            order = np.flatnonzero(self._mask) if order is None else order[self._mask[order]]
+        self._order = order
+
+
+class PagedDatasetTableModel(DatasetTableModel):
+    """Table model that fetches rows page by page as the view scrolls
+
+    Sorting and filtering are left to the server's /rows/ endpoint, which
+    sorts on numeric columns and filters by type. ``fetch_page(params,
+    on_page, on_error)`` requests one page asynchronously.
+    """
+    SORT_FIELDS = {'Flowrate': 'flowrate', 'Pressure': 'pressure', 'Temperature': 'temperature'}
+
+    def __init__(self, fetch_page, parent=None):
+        super().__init__(parent)
+        self.fetch_page = fetch_page
+        self.ordering = 'row_index'
+        self.type_filter = None
+        self.total = 0
+        self._next = None
+        self._started = False
+        self._loading = False
+        # Pages of an earlier sort or filter that arrive late are dropped
+        self._generation = 0
+
+    def reload(self):
+        self.beginResetModel()
+        self.columns = records_to_columns([])
+        self.rows = 0
+        self._next = None
+        self._started = False
+        self._loading = False
+        self._generation += 1
+        self.endResetModel()
+        self.fetchMore()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._loading:
+            return False
+        return not self._started or self._next is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        params = {'ordering': self.ordering, 'limit': ROWS_PAGE_SIZE}
+        if self.type_filter:
+            params['type'] = self.type_filter
+        if self._next:
+            params['cursor'] = self._next
+        generation = self._generation
+        self.fetch_page(params,
+                        lambda page: self.on_page(generation, page),
+                        lambda error: self.on_page_error(generation))
+
+    def on_page(self, generation, page):
+        if generation != self._generation:
+            return
+        self._loading = False
+        self._started = True
+        self._next = page.get('next')
+        self.total = page.get('count', 0)
+        new = records_to_columns(page.get('results', []))
+        count = len(new['Equipment Name'])
+        if not count:
+            return
+        self.beginInsertRows(QModelIndex(), self.rows, self.rows + count - 1)
+        self._append(new, count)
+        self.endInsertRows()
+
+    def on_page_error(self, generation):
+        if generation == self._generation:
+            self._loading = False
+
+    def _append(self, new, count):
+        # Grow the arrays geometrically so scrolling through N rows copies O(N)
+        capacity = len(self.columns['Equipment Name'])
+        if self.rows + count > capacity:
+            capacity = max(2 * capacity, self.rows + count)
+            for column, values in self.columns.items():
+                grown = np.empty(capacity, dtype=values.dtype)
+                grown[:self.rows] = values[:self.rows]
+                self.columns[column] = grown
+        for column, values in new.items():
+            self.columns[column][self.rows:self.rows + count] = values
+        self.rows += count
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        field = self.SORT_FIELDS.get(TABLE_COLUMNS[column]) if column >= 0 else None
+        if field is None:
+            # The server sorts numeric columns only; anything else is row order
+            self.ordering = 'row_index'
+        else:
+            self.ordering = f'-{field}' if order == Qt.DescendingOrder else field
+        self.reload()
+
+    def set_filter(self, type_name=None, text=''):
+        self.type_filter = type_name
+        self.reload()
+
+
+class APIRequestSignals(QObject):
+    """Signals of an APIRequest, which as a QRunnable cannot have its own"""
+    finished = pyqtSignal(object)
     error = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal()
+
+
+class APIRequest(QRunnable):
+    """One API call, run on the APIClient's thread pool
 
-    def __init__(self, method, url, headers=None, data=None, files=None):
+    The response body is read in chunks, reporting ``progress(received,
+    total)`` in bytes on the wire (``total`` is 0 when the server does not
+    send a length). Once cancelled the request stops reading and emits
+    neither ``finished`` nor ``error``; ``done`` is always emitted last.
+    """
+    def __init__(self, session, method, url, headers=None, data=None, files=None):
         super().__init__()
+        # The client keeps the Python object alive until ``done``
+        self.setAutoDelete(False)
+        self.signals = APIRequestSignals()
+        self.session = session
         self.method = method
         self.url = url
         self.headers = headers or {}
         self.data = data
         self.files = files
+        self.etag = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
 
     def run(self):
         try:
-            if self.method == 'GET':
-                response = requests.get(self.url, headers=self.headers)
-            elif self.method == 'POST':
-                if self.files:
-                    response = requests.post(self.url, headers=self.headers, 
-                                            files=self.files, data=self.data)
-                else:
-                    response = requests.post(self.url, headers=self.headers, 
-                                           json=self.data)
-            
-            response.raise_for_status()
-            if response.headers.get('content-type', '').startswith('application/json'):
-                self.finished.emit(response.json())
+            if self.cancelled:
+                return
+            if self.files:
+                body = {'files': self.files, 'data': self.data}
+            else:
+                body = {'json': self.data} if self.data is not None else {}
+            with self.session.request(self.method, self.url, headers=self.headers, stream=True,
+                                      timeout=REQUEST_TIMEOUT, **body) as response:
+                response.raise_for_status()
+                content = self.read(response)
+            if content is None:
+                return
+            self.etag = response.headers.get('ETag')
+            if response.status_code == 304:
+                result = {'not_modified': True}
+            elif response.headers.get('content-type', '').startswith('application/json'):
+                result = json.loads(content)
             else:
-                self.finished.emit({'success': True, 'data': response.content})
+                result = {'success': True, 'data': content}
+            if not self.cancelled:
+                self.signals.finished.emit(result)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.error.emit(str(e))
+        finally:
+            self.close_files()
+            self.signals.done.emit()
+
+    def read(self, response):
+        """Read the whole body, or return None if cancelled meanwhile"""
+        total = int(response.headers.get('Content-Length') or 0)
+        chunks = []
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+            if self.cancelled:
+                return None
+            chunks.append(chunk)
+            # raw.tell() counts compressed bytes, like Content-Length
+            self.signals.progress.emit(response.raw.tell(), total)
+        return b''.join(chunks)
+
+    def close_files(self):
+        """Close the file objects handed over for upload"""
+        if not self.files:
+            return
+        entries = self.files.values() if isinstance(self.files, dict) else [f for _, f in self.files]
+        for entry in entries:
+            entry[1].close()
+
+
+class BackgroundTask(QRunnable):
+    """Run ``function(*args)`` on a pool thread and emit its result"""
+    def __init__(self, function, *args):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.signals = APIRequestSignals()
+        self.function = function
+        self.args = args
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.function(*self.args))
         except Exception as e:
-            self.error.emit(str(e))
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.done.emit()
+
+
+class APIClient(QObject):
+    """Runs API calls on a bounded thread pool over one shared HTTP session
+
+    The session keeps connections to the server alive between calls, asks
+    for gzip-compressed responses and retries idempotent calls that fail to
+    connect or get a 502/503/504, backing off between attempts. Calls are
+    queued once MAX_CONCURRENT_REQUESTS are running.
+
+    A call started with a ``key`` cancels the earlier call with that key,
+    so a stale response (say the previous dataset's) never reaches the
+    window. Callbacks run on the GUI thread.
+    """
+    def __init__(self, base_url, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.session = requests.Session()
+        retry = Retry(total=REQUEST_RETRIES, backoff_factor=0.5,
+                      status_forcelist=(502, 503, 504), raise_on_status=False)
+        adapter = HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(MAX_CONCURRENT_REQUESTS)
+        self.requests = set()
+        self.keyed = {}
+
+    def set_token(self, token):
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+        else:
+            self.session.headers.pop('Authorization', None)
+
+    def get(self, path, on_success, on_error=None, key=None, headers=None, on_progress=None):
+        return self.request('GET', path, on_success, on_error, key=key, headers=headers,
+                            on_progress=on_progress)
+
+    def post(self, path, on_success, on_error=None, key=None, data=None, files=None):
+        return self.request('POST', path, on_success, on_error, key=key, data=data, files=files)
+
+    def request(self, method, path, on_success, on_error=None, key=None, headers=None,
+                data=None, files=None, on_progress=None):
+        """Start a call to ``path`` (relative to the API base URL) and return it"""
+        if key is not None:
+            self.cancel(key)
+        task = APIRequest(self.session, method, f'{self.base_url}{path}', headers, data, files)
+        task.signals.finished.connect(lambda result: task.cancelled or on_success(result))
+        if on_error is not None:
+            task.signals.error.connect(lambda message: task.cancelled or on_error(message))
+        if on_progress is not None:
+            task.signals.progress.connect(
+                lambda received, total: task.cancelled or on_progress(received, total))
+        task.signals.done.connect(lambda: self._forget(task, key))
+        self.requests.add(task)
+        if key is not None:
+            self.keyed[key] = task
+        self.pool.start(task)
+        return task
+
+    def cancel(self, key):
+        """Cancel the running or queued call started with ``key``, if any"""
+        task = self.keyed.pop(key, None)
+        if task is None:
+            return
+        task.cancel()
+        if self.pool.tryTake(task):
+            # It never started, so it will not emit ``done``
+            task.close_files()
+            self.requests.discard(task)
+
+    def cancel_all(self):
+        for task in list(self.requests):
+            task.cancel()
+            if self.pool.tryTake(task):
+                task.close_files()
+                self.requests.discard(task)
+        self.keyed.clear()
+
+    def _forget(self, task, key):
+        self.requests.discard(task)
+        if key is not None and self.keyed.get(key) is task:
+            del self.keyed[key]
 
 
 class LoginDialog(QWidget):
     """Login/Register Dialog"""
     login_success = pyqtSignal(str, dict)
 
-    def __init__(self, api_base_url):
+    def __init__(self, client):
         super().__init__()
-        self.api_base_url = api_base_url
+        self.client = client
         self.token = None
         self.user = None
         self.init_ui()
@@ -123,11 +684,8 @@ class LoginDialog(QWidget):
             self.status_label.setText('Please enter username and password')
             return
         
-        self.worker = APIWorker('POST', f'{self.api_base_url}/login/', 
-                               data={'username': username, 'password': password})
-        self.worker.finished.connect(self.on_login_success)
-        self.worker.error.connect(self.on_error)
-        self.worker.start()
+        self.client.post('/login/', self.on_login_success, self.on_error, key='login',
+                         data={'username': username, 'password': password})
 
     def register(self):
         username = self.get_username()
@@ -138,12 +696,9 @@ class LoginDialog(QWidget):
             self.status_label.setText('Please enter username and password')
             return
         
-        self.worker = APIWorker('POST', f'{self.api_base_url}/register/', 
-                               data={'username': username, 'password': password, 
-                                    'email': email})
-        self.worker.finished.connect(self.on_register_success)
-        self.worker.error.connect(self.on_error)
-        self.worker.start()
+        self.client.post('/register/', self.on_register_success, self.on_error, key='login',
+                         data={'username': username, 'password': password, 
+                               'email': email})
 
     def on_login_success(self, response):
         if 'token' in response:
@@ -166,40 +721,117 @@ class LoginDialog(QWidget):
 
 
 class ChartWidget(QWidget):
-    """Widget for displaying matplotlib charts"""
+    """Widget for displaying matplotlib charts
+
+    Axes and artists are created by the first plot and only get new data
+    afterwards, so showing another dataset does not rebuild the figure. The
+    canvas redraws once the event loop is idle, or when it is next shown.
+    """
     def __init__(self):
         super().__init__()
         self.figure = Figure(figsize=(8, 6))
         self.canvas = FigureCanvas(self.figure)
+        self.artists = {}
+        self.shown = None
+        self.stale = False
         layout = QVBoxLayout()
         layout.addWidget(self.canvas)
         self.setLayout(layout)
 
+    def redraw(self):
+        # Charts on a hidden tab are drawn when they are shown
+        if self.isVisible():
+            self.canvas.draw_idle()
+        else:
+            self.stale = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.stale:
+            self.stale = False
+            self.canvas.draw_idle()
+
+    def axes(self, count=1):
+        """The figure's ``count`` side-by-side axes, created when the layout changes"""
+        if len(self.figure.axes) != count:
+            self.figure.clear()
+            self.artists = {}
+            for i in range(count):
+                self.figure.add_subplot(1, count, i + 1)
+        return self.figure.axes
+
     def plot_pie(self, labels, values, title):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
+        if self.shown == (labels, values, title):
+            return
+        self.shown = (labels, values, title)
+        # The number of wedges follows the data, so the pie is redrawn on its axes
+        ax, = self.axes()
+        ax.clear()
         ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
         ax.set_title(title)
-        self.canvas.draw()
+        self.redraw()
 
     def plot_bar(self, labels, values, title, ylabel):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        ax.bar(labels, values, color=['#667eea', '#764ba2', '#ff6384'])
+        if self.shown == (labels, values, title):
+            return
+        self.shown = (labels, values, title)
+        ax, = self.axes()
+        bars = self.artists.get('bars')
+        if bars is None or len(bars) != len(labels):
+            ax.clear()
+            self.artists['bars'] = ax.bar(labels, values, color=['#667eea', '#764ba2', '#ff6384'])
+            ax.set_ylabel(ylabel)
+        else:
+            for bar, value in zip(bars, values):
+                bar.set_height(value)
+            ax.relim()
+            ax.autoscale_view()
         ax.set_title(title)
-        ax.set_ylabel(ylabel)
-        self.canvas.draw()
-
-    def plot_line(self, x_data, y_data, labels, title):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        for i, (y, label) in enumerate(zip(y_data, labels)):
-            ax.plot(x_data[:20], y[:20], marker='o', label=label)
+        self.redraw()
+
+    def plot_line(self, series, title):
+        """Plot downsampled series, a dict of label -> {'x': [...], 'y': [...]}"""
+        ax, = self.axes()
+        new = False
+        for label, points in series.items():
+            line = self.artists.get(label)
+            if line is None:
+                self.artists[label], = ax.plot(points['x'], points['y'], linewidth=0.8, label=label)
+                new = True
+            else:
+                line.set_data(points['x'], points['y'])
+        for label, line in self.artists.items():
+            if label not in series:
+                line.set_data([], [])
+        if new:
+            ax.set_xlabel('Equipment Index')
+            ax.legend()
+            ax.grid(True)
         ax.set_title(title)
-        ax.set_xlabel('Equipment Index')
-        ax.legend()
-        ax.grid(True)
-        self.canvas.draw()
+        ax.relim()
+        ax.autoscale_view()
+        self.redraw()
+
+    def plot_histograms(self, histograms):
+        """Plot histograms, a dict of column -> {'edges': [...], 'counts': [...]}"""
+        colors = ['#667eea', '#764ba2', '#ff6384']
+        new = False
+        for i, (ax, (column, histogram)) in enumerate(zip(self.axes(len(histograms)),
+                                                          histograms.items())):
+            stairs = self.artists.get(i)
+            if stairs is None:
+                self.artists[i] = ax.stairs(histogram['counts'], histogram['edges'],
+                                            fill=True, color=colors[i % len(colors)])
+                new = True
+            else:
+                stairs.set_data(histogram['counts'], histogram['edges'])
+            ax.set_title(f'{column} Distribution')
+            ax.set_xlabel(column)
+            ax.relim()
+            ax.autoscale_view()
+        if new:
+            self.figure.tight_layout()
+        self.redraw()
 
 
 class MainWindow(QMainWindow):
@@ -211,6 +843,12 @@ class MainWindow(QMainWindow):
         self.user = None
         self.current_data = None
         self.current_summary = None
+        self.current_dataset_id = None
+        self.current_etag = None
+        self.dataset_cache = DatasetCache()
+        self.client = APIClient(self.api_base_url, self)
+        self.background_tasks = set()
+        self.chart_generation = 0
         self.init_ui()
         self.show_login()
 
@@ -225,13 +863,14 @@ class MainWindow(QMainWindow):
 
     def show_login(self):
         """Show login dialog"""
-        self.login_dialog = LoginDialog(self.api_base_url)
+        self.login_dialog = LoginDialog(self.client)
         self.login_dialog.login_success.connect(self.on_login_success)
         self.login_dialog.show()
 
     def on_login_success(self, token, user):
         self.token = token
         self.user = user
+        self.client.set_token(token)
         self.login_dialog.close()
         self.setup_dashboard()
 
@@ -247,6 +886,10 @@ class MainWindow(QMainWindow):
         title.setFont(QFont('Arial', 18, QFont.Bold))
         header_layout.addWidget(title)
         header_layout.addStretch()
+        self.download_progress = QProgressBar()
+        self.download_progress.setMaximumWidth(200)
+        self.download_progress.hide()
+        header_layout.addWidget(self.download_progress)
         user_label = QLabel(f'Welcome, {self.user["username"]}!')
         header_layout.addWidget(user_label)
         logout_btn = QPushButton('Logout')
@@ -278,7 +921,34 @@ class MainWindow(QMainWindow):
         # Data Table Tab
         self.table_tab = QWidget()
         self.table_layout = QVBoxLayout()
-        self.data_table = QTableWidget()
+        filter_layout = QHBoxLayout()
+        self.type_filter = QComboBox()
+        self.type_filter.currentIndexChanged.connect(self.apply_table_filter)
+        filter_layout.addWidget(self.type_filter)
+        self.name_filter = QLineEdit()
+        self.name_filter.setPlaceholderText('Filter by equipment name')
+        # Filter once typing pauses rather than on every keystroke
+        self.name_filter_timer = QTimer()
+        self.name_filter_timer.setSingleShot(True)
+        self.name_filter_timer.setInterval(250)
+        self.name_filter_timer.timeout.connect(self.apply_table_filter)
+        self.name_filter.textChanged.connect(self.name_filter_timer.start)
+        filter_layout.addWidget(self.name_filter)
+        self.table_status = QLabel('')
+        filter_layout.addWidget(self.table_status)
+        self.table_layout.addLayout(filter_layout)
+        self.data_table = QTableView()
+        self.data_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.data_table.verticalHeader().setDefaultSectionSize(24)
+        self.data_table.horizontalHeader().setStretchLastSection(True)
+        self.data_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.data_table.setSortingEnabled(True)
+        self.local_table_model = DatasetTableModel(self)
+        self.paged_table_model = PagedDatasetTableModel(self.fetch_rows_page, self)
+        self.paged_table_model.rowsInserted.connect(self.update_table_status)
+        self.paged_table_model.modelReset.connect(self.update_table_status)
+        self.local_table_model.modelReset.connect(self.update_table_status)
+        self.data_table.setModel(self.local_table_model)
         self.table_layout.addWidget(self.data_table)
         self.table_tab.setLayout(self.table_layout)
         tabs.addTab(self.table_tab, 'Data Table')
@@ -286,6 +956,19 @@ class MainWindow(QMainWindow):
         # Charts Tab
         self.charts_tab = QWidget()
         self.charts_layout = QVBoxLayout()
+        self.pie_chart = ChartWidget()
+        self.avg_chart = ChartWidget()
+        self.line_chart = ChartWidget()
+        self.histogram_chart = ChartWidget()
+        for chart in (self.pie_chart, self.avg_chart, self.line_chart, self.histogram_chart):
+            chart.hide()
+            self.charts_layout.addWidget(chart)
+        self.charts_layout.addStretch()
+        # Loading a dataset changes the data more than once in a row; draw once
+        self.chart_timer = QTimer()
+        self.chart_timer.setSingleShot(True)
+        self.chart_timer.setInterval(CHART_REDRAW_DELAY)
+        self.chart_timer.timeout.connect(self.refresh_charts)
         self.charts_tab.setLayout(self.charts_layout)
         tabs.addTab(self.charts_tab, 'Charts')
         
@@ -309,74 +992,201 @@ class MainWindow(QMainWindow):
 
     def upload_file(self):
         """Handle file upload"""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, 'Select CSV File', '', 'CSV Files (*.csv)'
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, 'Select CSV Files', '', 'CSV or Zip Files (*.csv *.zip)'
         )
         
-        if not file_path:
+        if not file_paths:
+            return
+        
+        if len(file_paths) > 1 or file_paths[0].lower().endswith('.zip'):
+            self.upload_batch(file_paths)
             return
         
         self.status_label.setText('Uploading...')
         
-        with open(file_path, 'rb') as f:
-            files = {'file': (os.path.basename(file_path), f, 'text/csv')}
-            self.worker = APIWorker(
-                'POST',
-                f'{self.api_base_url}/upload/',
-                headers={'Authorization': f'Token {self.token}'},
-                files=files
+        # The worker closes the file once the request is sent
+        file_path = file_paths[0]
+        files = {'file': (os.path.basename(file_path), open(file_path, 'rb'), 'text/csv')}
+        self.client.post('/upload/', self.on_upload_accepted, self.on_upload_error, files=files)
+
+    def upload_batch(self, file_paths):
+        """Upload several CSV files or zip archives as one batch"""
+        answer = QMessageBox.question(
+            self, 'Batch Upload',
+            f'Merge the {len(file_paths)} selected file(s) into a single dataset?\n'
+            'Choose No to store each CSV file as its own dataset.',
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No
+        )
+        if answer == QMessageBox.Cancel:
+            return
+        
+        self.status_label.setText(f'Uploading {len(file_paths)} files...')
+        
+        files = []
+        for file_path in file_paths:
+            content_type = 'application/zip' if file_path.lower().endswith('.zip') else 'text/csv'
+            files.append(('files', (os.path.basename(file_path), open(file_path, 'rb'), content_type)))
+        self.client.post(
+            '/upload/batch/',
+            self.on_batch_accepted,
+            self.on_upload_error,
+            data={'merge': 'true' if answer == QMessageBox.Yes else 'false'},
+            files=files
+        )
+
+    def on_batch_accepted(self, batch):
+        """Start polling the background jobs created by a batch upload"""
+        self.upload_batch_id = batch.get('id')
+        self.status_label.setText('Files received, processing...')
+        QTimer.singleShot(0, self.poll_upload_batch)
+
+    def poll_upload_batch(self):
+        self.client.get(f'/batches/{self.upload_batch_id}/', self.on_upload_batch_status,
+                        self.on_upload_error, key='upload_status')
+
+    def on_upload_batch_status(self, batch):
+        jobs = batch.get('jobs', [])
+        if batch.get('status') == 'processing':
+            done = sum(1 for job in jobs if job.get('status') in ('completed', 'failed'))
+            self.status_label.setText(f'Processing batch: {done} of {len(jobs)} files done')
+            QTimer.singleShot(1000, self.poll_upload_batch)
+            return
+        
+        completed = [job for job in jobs if job.get('status') == 'completed']
+        failed = [job for job in jobs if job.get('status') == 'failed']
+        if failed:
+            details = '\n'.join(f"{job.get('filename')}: {job.get('error')}" for job in failed)
+            QMessageBox.warning(
+                self, 'Batch Upload',
+                f'{len(completed)} of {len(jobs)} files were stored.\n\n{details}'
             )
-            self.worker.finished.connect(self.on_upload_success)
-            self.worker.error.connect(self.on_upload_error)
-            self.worker.start()
+        if completed:
+            # Show the last stored dataset (the merged one when merging)
+            self.on_upload_success(completed[-1].get('summary') or {})
+            self.status_label.setText(f'Batch upload finished: {len(completed)} of {len(jobs)} files stored')
+        else:
+            self.status_label.setText('Batch upload failed')
+
+    def on_upload_accepted(self, job):
+        """Start polling the background job created by an upload"""
+        self.upload_job_id = job.get('id')
+        self.status_label.setText('Upload received, processing...')
+        QTimer.singleShot(0, self.poll_upload_job)
 
-    def on_upload_success(self, response):
+    def poll_upload_job(self):
+        self.client.get(f'/jobs/{self.upload_job_id}/', self.on_upload_job_status,
+                        self.on_upload_error, key='upload_status')
+
+    def on_upload_job_status(self, job):
+        if job.get('status') == 'completed':
+            self.on_upload_success(job.get('summary') or {})
+        elif job.get('status') == 'failed':
+            self.on_upload_error(job.get('error', 'Unknown error'))
+        else:
+            self.status_label.setText(
+                f"Processing ({job.get('phase')}): {job.get('rows_processed', 0)} rows"
+            )
+            QTimer.singleShot(1000, self.poll_upload_job)
+
+    def on_upload_success(self, dataset):
         self.status_label.setText('Upload successful!')
-        self.current_data = response.get('data', [])
-        self.current_summary = response.get('summary', {})
-        self.update_display()
+        self.current_dataset_id = dataset.get('id')
+        self.current_data = None
+        self.current_etag = None
+        self.current_summary = {
+            'total_count': dataset.get('total_count'),
+            'avg_flowrate': dataset.get('avg_flowrate'),
+            'avg_pressure': dataset.get('avg_pressure'),
+            'avg_temperature': dataset.get('avg_temperature'),
+            'equipment_type_distribution': dataset.get('equipment_type_distribution', {})
+        }
         self.load_history()
+        self.show_dataset()
 
     def on_upload_error(self, error_msg):
         self.status_label.setText(f'Upload failed: {error_msg}')
         QMessageBox.critical(self, 'Error', f'Upload failed: {error_msg}')
 
     def load_latest_data(self):
-        """Load latest dataset"""
-        self.worker = APIWorker(
-            'GET',
-            f'{self.api_base_url}/summary/',
-            headers={'Authorization': f'Token {self.token}'}
-        )
-        self.worker.finished.connect(self.on_load_data_success)
-        self.worker.error.connect(lambda e: None)  # Silent fail if no data
-        self.worker.start()
+        """Show the cached latest dataset at once, then ask the server for the latest one"""
+        cached_id = self.dataset_cache.latest(self.user['username'])
+        if cached_id is not None:
+            self.show_cached_dataset(cached_id)
+        # Silent fail if no data or offline
+        self.client.get('/summary/', self.on_load_data_success, key='summary')
+
+    def show_cached_dataset(self, dataset_id):
+        """Display a dataset from the local cache; returns False if it is not cached"""
+        cached = self.dataset_cache.get(self.user['username'], dataset_id)
+        if cached is None:
+            return False
+        self.current_dataset_id = dataset_id
+        self.current_data, self.current_summary, self.current_etag = cached
+        self.update_display()
+        return True
 
     def on_load_data_success(self, response):
         if 'summary' in response:
             dataset_id = response.get('id')
+            if dataset_id != self.current_dataset_id and not self.show_cached_dataset(dataset_id):
+                self.current_dataset_id = dataset_id
+                self.current_data = None
+                self.current_etag = None
             self.current_summary = response.get('summary', {})
-            
-            # Load full data
-            self.worker = APIWorker(
-                'GET',
-                f'{self.api_base_url}/dataset/{dataset_id}/',
-                headers={'Authorization': f'Token {self.token}'}
-            )
-            self.worker.finished.connect(self.on_load_full_data)
-            self.worker.start()
+            self.show_dataset()
+
+    def show_dataset(self):
+        """Show the current dataset, downloading its rows if it is small enough
+
+        A dataset already shown from the local cache is revalidated with its
+        ETag and only downloaded again if it changed on the server.
+        """
+        if (self.current_summary.get('total_count') or 0) > LOCAL_TABLE_MAX_ROWS:
+            # Too large to download whole; the table pages rows from the server
+            self.client.cancel('dataset')
+            self.download_progress.hide()
+            self.current_data = None
+            self.update_display()
+            return
+        headers = {}
+        if self.current_data is not None and self.current_etag:
+            headers['If-None-Match'] = self.current_etag
+        self.download_progress.setRange(0, 0)
+        self.download_progress.show()
+        self.data_request = self.client.get(
+            f'/dataset/{self.current_dataset_id}/',
+            self.on_load_full_data,
+            lambda e: self.download_progress.hide(),
+            key='dataset',
+            headers=headers,
+            on_progress=self.on_download_progress
+        )
+
+    def on_download_progress(self, received, total):
+        if total:
+            # Scale to KiB so the bar's int range holds any size
+            self.download_progress.setRange(0, total // 1024)
+            self.download_progress.setValue(received // 1024)
 
     def on_load_full_data(self, response):
-        self.current_data = response.get('raw_data', [])
+        self.download_progress.hide()
+        user = self.user['username']
+        if response.get('not_modified'):
+            self.dataset_cache.touch(user, self.current_dataset_id)
+            return
+        self.current_data = records_to_columns(response.get('raw_data', []))
+        self.current_etag = self.data_request.etag
+        self.dataset_cache.put(user, self.current_dataset_id, self.current_data,
+                               self.current_summary, self.current_etag)
         self.update_display()
 
     def update_display(self):
         """Update all displays with current data"""
         if self.current_summary:
             self.update_summary()
-        if self.current_data:
-            self.update_table()
-            self.update_charts()
+        self.update_table()
+        self.update_charts()
 
     def update_summary(self):
         """Update summary tab"""
@@ -420,46 +1230,76 @@ class MainWindow(QMainWindow):
         self.summary_layout.addStretch()
 
     def update_table(self):
-        """Update data table"""
-        if not self.current_data:
-            return
-        
-        self.data_table.setRowCount(len(self.current_data))
-        if self.current_data:
-            columns = list(self.current_data[0].keys())
-            self.data_table.setColumnCount(len(columns))
-            self.data_table.setHorizontalHeaderLabels(columns)
-            
-            for row_idx, row_data in enumerate(self.current_data):
-                for col_idx, col_name in enumerate(columns):
-                    value = row_data.get(col_name, '')
-                    if isinstance(value, (int, float)):
-                        value = f'{value:.2f}'
-                    self.data_table.setItem(row_idx, col_idx, 
-                                          QTableWidgetItem(str(value)))
+        """Point the data table at the current dataset"""
+        self.type_filter.blockSignals(True)
+        self.type_filter.clear()
+        self.type_filter.addItem('All types', None)
+        for type_name in (self.current_summary or {}).get('equipment_type_distribution', {}):
+            self.type_filter.addItem(type_name, type_name)
+        self.type_filter.blockSignals(False)
+        self.name_filter.blockSignals(True)
+        self.name_filter.clear()
+        self.name_filter.blockSignals(False)
+        # Reset the sort arrow without making the view sort the old model
+        header = self.data_table.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.blockSignals(False)
+
+        if self.current_data is not None:
+            self.local_table_model.set_columns(self.current_data)
+            self.data_table.setModel(self.local_table_model)
+            self.name_filter.setEnabled(True)
+        elif self.current_dataset_id:
+            # The server cannot filter by name, so paged tables filter by type only
+            self.paged_table_model.ordering = 'row_index'
+            self.paged_table_model.type_filter = None
+            self.data_table.setModel(self.paged_table_model)
+            self.name_filter.setEnabled(False)
+            self.paged_table_model.reload()
+        self.update_table_status()
+
+    def apply_table_filter(self):
+        self.data_table.model().set_filter(self.type_filter.currentData(),
+                                           self.name_filter.text().strip())
+
+    def update_table_status(self):
+        model = self.data_table.model()
+        if model is self.paged_table_model:
+            self.table_status.setText(f'Loaded {model.rows} of {model.total} rows')
+        else:
+            self.table_status.setText(f'Showing {model.rowCount()} of {model.rows} rows')
+
+    def fetch_rows_page(self, params, on_page, on_error):
+        """Request one page of the current dataset's rows for the paged table"""
+        # A sort or filter change cancels the page of the previous order
+        self.client.get(f'/dataset/{self.current_dataset_id}/rows/?{urlencode(params)}',
+                        on_page, on_error, key='rows')
 
     def update_charts(self):
-        """Update charts"""
-        for i in reversed(range(self.charts_layout.count())):
-            self.charts_layout.itemAt(i).widget().setParent(None)
-        
-        if not self.current_data or not self.current_summary:
+        """Redraw the charts once the current data stops changing"""
+        self.chart_timer.start()
+
+    def refresh_charts(self):
+        """Update the charts in place with the current dataset"""
+        self.chart_generation += 1
+        if not self.current_dataset_id or not self.current_summary:
+            for chart in (self.pie_chart, self.avg_chart, self.line_chart, self.histogram_chart):
+                chart.hide()
             return
         
         # Pie chart for equipment type distribution
         dist = self.current_summary.get('equipment_type_distribution', {})
         if dist:
-            pie_chart = ChartWidget()
-            pie_chart.plot_pie(
+            self.pie_chart.plot_pie(
                 list(dist.keys()),
                 list(dist.values()),
                 'Equipment Type Distribution'
             )
-            self.charts_layout.addWidget(pie_chart)
+        self.pie_chart.setVisible(bool(dist))
         
         # Bar chart for averages
-        avg_chart = ChartWidget()
-        avg_chart.plot_bar(
+        self.avg_chart.plot_bar(
             ['Flowrate', 'Pressure', 'Temperature'],
             [
                 self.current_summary.get('avg_flowrate', 0) or 0,
@@ -469,35 +1309,56 @@ class MainWindow(QMainWindow):
             'Average Parameters',
             'Value'
         )
-        self.charts_layout.addWidget(avg_chart)
-        
-        # Line chart for flowrate and pressure
-        if self.current_data:
-            flowrate_data = [item.get('Flowrate', 0) or 0 for item in self.current_data]
-            pressure_data = [item.get('Pressure', 0) or 0 for item in self.current_data]
-            indices = list(range(len(self.current_data)))
-            
-            line_chart = ChartWidget()
-            line_chart.plot_line(
-                indices,
-                [flowrate_data[:20], pressure_data[:20]],
-                ['Flowrate', 'Pressure'],
-                'Flowrate vs Pressure (First 20 Equipment)'
-            )
-            self.charts_layout.addWidget(line_chart)
+        self.avg_chart.show()
         
-        self.charts_layout.addStretch()
+        # Line chart and histograms over the whole dataset
+        generation = self.chart_generation
+        on_loaded = lambda response: (generation == self.chart_generation
+                                      and self.on_chart_data_loaded(response))
+        on_error = lambda e: generation == self.chart_generation and self.on_chart_data_error()
+        if self.current_data is not None:
+            # The rows are already here; reduce them off the GUI thread
+            self.client.cancel('chart')
+            task = BackgroundTask(chart_data_from_columns, self.current_data)
+            task.signals.finished.connect(on_loaded)
+            task.signals.error.connect(on_error)
+            task.signals.done.connect(lambda: self.background_tasks.discard(task))
+            self.background_tasks.add(task)
+            QThreadPool.globalInstance().start(task)
+        else:
+            # Too large to download; the server downsamples it
+            self.client.get(
+                f'/dataset/{self.current_dataset_id}/chart/?points={CHART_POINTS}',
+                on_loaded,
+                on_error,
+                key='chart'
+            )
+
+    def on_chart_data_loaded(self, response):
+        series = response.get('series', {})
+        self.line_chart.plot_line(
+            {column: series[column] for column in ['Flowrate', 'Pressure'] if column in series},
+            f'Flowrate vs Pressure (All {response.get("total_count", 0)} Equipment)'
+        )
+        self.line_chart.show()
+
+        histograms = response.get('histograms', {})
+        if histograms:
+            self.histogram_chart.plot_histograms(histograms)
+        self.histogram_chart.setVisible(bool(histograms))
+
+    def on_chart_data_error(self):
+        self.line_chart.hide()
+        self.histogram_chart.hide()
 
     def load_history(self):
         """Load upload history"""
-        self.worker = APIWorker(
-            'GET',
-            f'{self.api_base_url}/history/',
-            headers={'Authorization': f'Token {self.token}'}
+        self.client.get(
+            '/history/',
+            self.on_history_loaded,
+            lambda e: self.history_list.setText('Failed to load history'),
+            key='history'
         )
-        self.worker.finished.connect(self.on_history_loaded)
-        self.worker.error.connect(lambda e: self.history_list.setText('Failed to load history'))
-        self.worker.start()
 
     def on_history_loaded(self, response):
         if isinstance(response, list):
@@ -516,6 +1377,10 @@ class MainWindow(QMainWindow):
         self.user = None
         self.current_data = None
         self.current_summary = None
+        self.current_dataset_id = None
+        self.current_etag = None
+        self.client.cancel_all()
+        self.client.set_token(None)
         for i in reversed(range(self.main_layout.count())):
             self.main_layout.itemAt(i).widget().setParent(None)
         self.show_login()
@@ -1,4 +1,5 @@
-import React from 'react';
+import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import {
   Chart as ChartJS,
   CategoryScale,
@@ -26,7 +27,48 @@ ChartJS.register(
   Legend
 );
 
-const Charts = ({ data, summary }) => {
+// Points per line series; the server downsamples the whole dataset to this
+const CHART_POINTS = 500;
+const HISTOGRAM_BINS = 20;
+
+const COLUMN_COLORS = {
+  Flowrate: 'rgba(102, 126, 234, 1)',
+  Pressure: 'rgba(118, 75, 162, 1)',
+  Temperature: 'rgba(255, 99, 132, 1)',
+};
+
+const toPoints = (series) => series.x.map((x, i) => ({ x, y: series.y[i] }));
+
+const histogramData = (column, histogram) => ({
+  labels: histogram.edges.slice(0, -1).map(edge => edge.toFixed(1)),
+  datasets: [
+    {
+      label: column,
+      data: histogram.counts,
+      backgroundColor: COLUMN_COLORS[column].replace(', 1)', ', 0.8)'),
+      barPercentage: 1.0,
+      categoryPercentage: 1.0,
+    },
+  ],
+});
+
+const Charts = ({ datasetId, token, apiBaseUrl, summary }) => {
+  const [chartData, setChartData] = useState(null);
+
+  useEffect(() => {
+    if (!datasetId) {
+      return;
+    }
+    axios.get(`${apiBaseUrl}/dataset/${datasetId}/chart/`, {
+      headers: { 'Authorization': `Token ${token}` },
+      params: { points: CHART_POINTS, bins: HISTOGRAM_BINS },
+    }).then(response => {
+      setChartData(response.data);
+    }).catch(err => {
+      console.error('Failed to load chart data:', err);
+    });
+  }, [datasetId, apiBaseUrl, token]);
+
   // Equipment Type Distribution Chart
   const typeDistribution = summary.equipment_type_distribution || {};
   const typeChartData = {
@@ -47,39 +89,39 @@ const Charts = ({ data, summary }) => {
     ],
   };
 
-  // Flowrate vs Pressure Scatter/Line Chart
-  const flowrateData = data.map(item => item.Flowrate || 0);
-  const pressureData = data.map(item => item.Pressure || 0);
-  const temperatureData = data.map(item => item.Temperature || 0);
-  const equipmentNames = data.map(item => item['Equipment Name'] || '');
-
+  // Flowrate and Pressure over the whole dataset, downsampled by the server
+  const series = chartData ? chartData.series : {};
   const parameterChartData = {
-    labels: equipmentNames.slice(0, 20), // Limit to first 20 for readability
-    datasets: [
-      {
-        label: 'Flowrate',
-        data: flowrateData.slice(0, 20),
-        borderColor: 'rgba(102, 126, 234, 1)',
-        backgroundColor: 'rgba(102, 126, 234, 0.2)',
-        yAxisID: 'y',
-      },
-      {
-        label: 'Pressure',
-        data: pressureData.slice(0, 20),
-        borderColor: 'rgba(118, 75, 162, 1)',
-        backgroundColor: 'rgba(118, 75, 162, 0.2)',
-        yAxisID: 'y1',
-      },
-    ],
+    datasets: ['Flowrate', 'Pressure'].filter(column => series[column]).map(column => ({
+      label: column,
+      data: toPoints(series[column]),
+      borderColor: COLUMN_COLORS[column],
+      backgroundColor: COLUMN_COLORS[column].replace(', 1)', ', 0.2)'),
+      borderWidth: 1,
+      pointRadius: 0,
+      yAxisID: column === 'Flowrate' ? 'y' : 'y1',
+    })),
   };
 
   const parameterChartOptions = {
     responsive: true,
+    maintainAspectRatio: false,
+    animation: false,
+    parsing: false,
+    normalized: true,
     interaction: {
-      mode: 'index',
+      mode: 'nearest',
+      axis: 'x',
       intersect: false,
     },
     scales: {
+      x: {
+        type: 'linear',
+        title: {
+          display: true,
+          text: 'Equipment Index',
+        },
+      },
       y: {
         type: 'linear',
         display: true,
@@ -104,6 +146,13 @@ const Charts = ({ data, summary }) => {
     },
   };
 
+  const histogramOptions = {
+    responsive: true,
+    maintainAspectRatio: false,
+    plugins: { legend: { display: false } },
+    scales: { y: { beginAtZero: true } },
+  };
+
   // Average Parameters Bar Chart
   const avgChartData = {
     labels: ['Flowrate', 'Pressure', 'Temperature'],
@@ -141,11 +190,20 @@ const Charts = ({ data, summary }) => {
       </div>
 
       <div className="chart-item full-width">
-        <h3>Flowrate vs Pressure (First 20 Equipment)</h3>
+        <h3>Flowrate vs Pressure (All {summary.total_count} Equipment)</h3>
         <div className="chart-wrapper">
           <Line data={parameterChartData} options={parameterChartOptions} />
         </div>
       </div>
+
+      {chartData && Object.entries(chartData.histograms).map(([column, histogram]) => (
+        <div className="chart-item" key={column}>
+          <h3>{column} Distribution</h3>
+          <div className="chart-wrapper">
+            <Bar data={histogramData(column, histogram)} options={histogramOptions} />
+          </div>
+        </div>
+      ))}
     </div>
   );
 };
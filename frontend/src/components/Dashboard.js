@@ -6,11 +6,12 @@ import History from './History';
 import './Dashboard.css';
 
 const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
-  const [currentData, setCurrentData] = useState(null);
+  const [datasetId, setDatasetId] = useState(null);
   const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
+  const [progress, setProgress] = useState('');
 
   const axiosConfig = {
     headers: {
@@ -33,14 +34,32 @@ const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
         formData,
         axiosConfig
       );
-      
-      setCurrentData(response.data.data);
-      setSummary(response.data.summary);
+
+      // The upload is processed in the background; poll until it finishes
+      let job = response.data;
+      while (job.status !== 'completed' && job.status !== 'failed') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobResponse = await axios.get(
+          `${apiBaseUrl}/jobs/${job.id}/`,
+          { headers: { 'Authorization': `Token ${token}` } }
+        );
+        job = jobResponse.data;
+        setProgress(`Processing (${job.phase}): ${job.rows_processed} rows`);
+      }
+
+      if (job.status === 'failed') {
+        setError(job.error || 'Upload failed');
+        return;
+      }
+
+      setSummary(job.summary);
+      setDatasetId(job.dataset_id);
       setSuccess('File uploaded successfully!');
     } catch (err) {
       setError(err.response?.data?.error || 'Upload failed');
     } finally {
       setLoading(false);
+      setProgress('');
     }
   };
 
@@ -53,12 +72,7 @@ const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
       
       if (response.data.summary) {
         setSummary(response.data.summary);
-        // Load full data
-        const dataResponse = await axios.get(
-          `${apiBaseUrl}/dataset/${response.data.id}/`,
-          { headers: { 'Authorization': `Token ${token}` } }
-        );
-        setCurrentData(dataResponse.data.raw_data);
+        setDatasetId(response.data.id);
       }
     } catch (err) {
       // No data yet, that's okay
@@ -69,20 +83,32 @@ const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
     loadLatestData();
   }, []);
 
-  const handleDownloadPDF = async (datasetId) => {
+  const handleDownloadPDF = async (datasetId, mode = 'summary') => {
     try {
-      const response = await axios.get(
-        `${apiBaseUrl}/dataset/${datasetId}/pdf/`,
-        {
-          headers: { 'Authorization': `Token ${token}` },
-          responseType: 'blob'
+      // Large reports are built in the background; the server answers 202
+      // with Retry-After until the PDF is ready
+      let response;
+      for (;;) {
+        response = await axios.get(
+          `${apiBaseUrl}/dataset/${datasetId}/pdf/`,
+          {
+            headers: { 'Authorization': `Token ${token}` },
+            params: { mode },
+            responseType: 'blob'
+          }
+        );
+        if (response.status !== 202) {
+          break;
         }
-      );
+        const retryAfter = parseInt(response.headers['retry-after'] || '5', 10);
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+      }
       
+      const suffix = mode === 'summary' ? '' : `_${mode}`;
       const url = window.URL.createObjectURL(new Blob([response.data]));
       const link = document.createElement('a');
       link.href = url;
-      link.setAttribute('download', `report_${datasetId}.pdf`);
+      link.setAttribute('download', `report_${datasetId}${suffix}.pdf`);
       document.body.appendChild(link);
       link.click();
       link.remove();
@@ -113,6 +139,7 @@ const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
             onUpload={handleFileUpload} 
             loading={loading}
           />
+          {progress && <p className="help-text">{progress}</p>}
           <p className="help-text">
             Upload a CSV file with columns: Equipment Name, Type, Flowrate, Pressure, Temperature
           </p>
@@ -127,15 +154,27 @@ const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
 
             <div className="card">
               <h2>Data Visualization</h2>
-              {currentData && summary && (
-                <Charts data={currentData} summary={summary} />
+              {datasetId && (
+                <Charts
+                  key={datasetId}
+                  datasetId={datasetId}
+                  token={token}
+                  apiBaseUrl={apiBaseUrl}
+                  summary={summary}
+                />
               )}
             </div>
 
             <div className="card">
               <h2>Equipment Data Table</h2>
-              {currentData && (
-                <DataTable data={currentData} />
+              {datasetId && (
+                <DataTable
+                  key={datasetId}
+                  datasetId={datasetId}
+                  token={token}
+                  apiBaseUrl={apiBaseUrl}
+                  types={Object.keys(summary.equipment_type_distribution || {})}
+                />
               )}
             </div>
           </>
@@ -147,18 +186,13 @@ const Dashboard = ({ token, user, onLogout, apiBaseUrl }) => {
             token={token}
             apiBaseUrl={apiBaseUrl}
             onSelectDataset={(datasetId) => {
+              // Charts and the table load their own rows, so only the summary is needed
               axios.get(
-                `${apiBaseUrl}/dataset/${datasetId}/`,
+                `${apiBaseUrl}/summary/${datasetId}/`,
                 { headers: { 'Authorization': `Token ${token}` } }
               ).then(response => {
-                setCurrentData(response.data.raw_data);
-                setSummary({
-                  total_count: response.data.total_count,
-                  avg_flowrate: response.data.avg_flowrate,
-                  avg_pressure: response.data.avg_pressure,
-                  avg_temperature: response.data.avg_temperature,
-                  equipment_type_distribution: response.data.equipment_type_distribution
-                });
+                setDatasetId(datasetId);
+                setSummary(response.data.summary);
               });
             }}
             onDownloadPDF={handleDownloadPDF}
@@ -1,50 +1,146 @@
-import React from 'react';
+import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import './DataTable.css';
 
-const DataTable = ({ data }) => {
-  if (!data || data.length === 0) {
-    return <div className="no-data">No data available</div>;
-  }
-
-  const columns = Object.keys(data[0]);
+const COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'];
 
-  return (
-    <div className="table-container">
-      <table>
-        <thead>
-          <tr>
-            {columns.map((col) => (
-              <th key={col}>{col}</th>
-            ))}
-          </tr>
-        </thead>
-        <tbody>
-          {data.map((row, idx) => (
-            <tr key={idx}>
-              {columns.map((col) => (
-                <td key={col}>
-                  {typeof row[col] === 'number' 
-                    ? row[col].toFixed(2) 
-                    : row[col]}
-                </td>
-              ))}
-            </tr>
-          ))}
-        </tbody>
-      </table>
-    </div>
-  );
+// Numeric columns the server can sort on, keyed by table header
+const SORT_FIELDS = {
+  Flowrate: 'flowrate',
+  Pressure: 'pressure',
+  Temperature: 'temperature',
 };
 
-export default DataTable;
+const PAGE_SIZE = 100;
 
+const DataTable = ({ datasetId, token, apiBaseUrl, types }) => {
+  const [rows, setRows] = useState([]);
+  const [count, setCount] = useState(0);
+  const [ordering, setOrdering] = useState('row_index');
+  const [typeFilter, setTypeFilter] = useState('');
+  // Cursors of the pages visited so far; the last entry is the current page
+  const [cursors, setCursors] = useState([null]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
 
+  const currentCursor = cursors[cursors.length - 1];
 
+  useEffect(() => {
+    if (!datasetId) {
+      return;
+    }
 
+    const params = { ordering, limit: PAGE_SIZE };
+    if (typeFilter) {
+      params.type = typeFilter;
+    }
+    if (currentCursor) {
+      params.cursor = currentCursor;
+    }
 
+    setLoading(true);
+    axios.get(`${apiBaseUrl}/dataset/${datasetId}/rows/`, {
+      headers: { 'Authorization': `Token ${token}` },
+      params,
+    }).then(response => {
+      setRows(response.data.results);
+      setCount(response.data.count);
+      setNextCursor(response.data.next);
+    }).catch(err => {
+      console.error('Failed to load rows:', err);
+    }).finally(() => {
+      setLoading(false);
+    });
+  }, [datasetId, ordering, typeFilter, currentCursor, apiBaseUrl, token]);
 
+  const toggleSort = (column) => {
+    const field = SORT_FIELDS[column];
+    if (!field) {
+      return;
+    }
+    setOrdering(ordering === field ? `-${field}` : field);
+    setCursors([null]);
+  };
 
+  const changeTypeFilter = (value) => {
+    setTypeFilter(value);
+    setCursors([null]);
+  };
 
+  const sortIndicator = (column) => {
+    const field = SORT_FIELDS[column];
+    if (ordering === field) return ' ▲';
+    if (ordering === `-${field}`) return ' ▼';
+    return '';
+  };
 
+  if (!datasetId) {
+    return <div className="no-data">No data available</div>;
+  }
 
+  const firstRow = (cursors.length - 1) * PAGE_SIZE + 1;
 
+  return (
+    <div>
+      <div className="table-controls">
+        <select value={typeFilter} onChange={(e) => changeTypeFilter(e.target.value)}>
+          <option value="">All types</option>
+          {(types || []).map((type) => (
+            <option key={type} value={type}>{type}</option>
+          ))}
+        </select>
+        <span className="table-range">
+          {count === 0
+            ? 'No rows'
+            : `Rows ${firstRow}-${firstRow + rows.length - 1} of ${count}`}
+        </span>
+        <button
+          className="btn btn-secondary"
+          disabled={loading || cursors.length === 1}
+          onClick={() => setCursors(cursors.slice(0, -1))}
+        >
+          Previous
+        </button>
+        <button
+          className="btn btn-secondary"
+          disabled={loading || !nextCursor}
+          onClick={() => setCursors([...cursors, nextCursor])}
+        >
+          Next
+        </button>
+      </div>
+      <div className="table-container">
+        <table>
+          <thead>
+            <tr>
+              {COLUMNS.map((col) => (
+                <th
+                  key={col}
+                  onClick={() => toggleSort(col)}
+                  className={SORT_FIELDS[col] ? 'sortable' : ''}
+                >
+                  {col}{sortIndicator(col)}
+                </th>
+              ))}
+            </tr>
+          </thead>
+          <tbody>
+            {rows.map((row) => (
+              <tr key={row.row_index}>
+                {COLUMNS.map((col) => (
+                  <td key={col}>
+                    {typeof row[col] === 'number'
+                      ? row[col].toFixed(2)
+                      : row[col]}
+                  </td>
+                ))}
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+    </div>
+  );
+};
+
+export default DataTable;
@@ -58,6 +58,12 @@ const History = ({ token, apiBaseUrl, onSelectDataset, onDownloadPDF }) => {
             >
               Download PDF
             </button>
+            <button
+              onClick={() => onDownloadPDF(item.id, 'detailed')}
+              className="btn btn-secondary"
+            >
+              Detailed PDF
+            </button>
           </div>
         </div>
       ))}